@@ -0,0 +1,248 @@
+"""
+Measure how access operations scale with the number of users, locations, and files.
+
+A synthetic project is generated, with `--users` users each granted access to `--per-user` of
+`--locations` locations. Each location is a tree of directories `--depth` levels deep, with `--width`
+subdirectories and `--files` files at each level. Operations are then run in turn, each in a fresh interpreter:
+
+- `grant`: `set_permission` for each grant to an existing user.
+- `pending_grant`: `set_permission` for each grant to a user who does not exist yet (a `--pending` share of users).
+- `pending`: `check_pending`, after those users are created (only with stand-in commands).
+- `check_full`: `check_access`, reapplying access to everything.
+- `check`: `check_access`, reapplying access only to new or changed files.
+- `revoke`: `revoke_permissions` for a `--revoke` share of users.
+
+Wall time, subprocesses launched (by command), and peak resident memory are reported for each operation.
+
+By default, stand-in `getfacl`, `setfacl`, and `id` commands (see `benchmarks/standins.py`) are used,
+with the `subprocess` ACL backend, so no ACL support or real users are needed. With `--real`, ACLs are set
+on the generated files (put `--dir` on a tmpfs, such as `/dev/shm`, to leave out disk time),
+and users are drawn from existing accounts.
+
+Results can be saved with `--json`, and compared with a later run with `--compare`, which exits
+with an error if any operation got slower (beyond `--tolerance`), launched more subprocesses, or used more memory.
+
+Usage:
+    python benchmarks/scale.py [--users 50] [--locations 10] [--real] [--json] [--compare results.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+from collections import Counter
+from contextlib import redirect_stdout
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+BENCHMARK_DIR = dirname(os.path.abspath(__file__))
+SPEC_FILE = ".benchmark.json"
+OPERATIONS = ["grant", "pending_grant", "pending", "check_full", "check", "revoke"]
+
+
+def make_tree(path: str, depth: int, width: int, files: int):
+    os.makedirs(path, exist_ok=True)
+    for index in range(files):
+        with open(join(path, f"file{index}.txt"), "w", encoding="utf-8") as opened:
+            opened.write("")
+    if depth:
+        for index in range(width):
+            make_tree(join(path, f"dir{index}"), depth - 1, width, files)
+
+
+def make_project(args: argparse.Namespace, root: str) -> "tuple[str, dict[str, str]]":
+    import file_access_manager
+
+    project = join(root, "project")
+    file_access_manager.init_manager_project(project, auto_commit=args.commit)
+    locations = []
+    for index in range(args.locations):
+        location = join(root, "data", f"group{index // 5}", f"location{index}")
+        make_tree(location, args.depth, args.width, args.files)
+        locations.append(location)
+
+    env = {**os.environ, "FILE_ACCESS_MANAGER_NO_SERVER": "1"}
+    n_pending = round(args.users * args.pending)
+    if args.real:
+        import pwd
+
+        users = sorted({entry.pw_name for entry in pwd.getpwall()})[: args.users - n_pending]
+        if len(users) < args.users - n_pending:
+            print(f"only {len(users)} existing users are available", file=sys.stderr)
+        pending_users = [f"file_access_manager_pending{index}" for index in range(n_pending)]
+    else:
+        users = [f"user{index}" for index in range(args.users - n_pending)]
+        pending_users = [f"pending_user{index}" for index in range(n_pending)]
+        bin_dir = join(root, "bin")
+        os.makedirs(bin_dir)
+        for command in ["getfacl", "setfacl", "id"]:
+            file = join(bin_dir, command)
+            with open(file, "w", encoding="utf-8") as opened:
+                opened.write(
+                    f"#!{sys.executable}\nimport sys\nsys.path.insert(0, {BENCHMARK_DIR!r})\n"
+                    f"from standins import main\nmain({command!r})\n"
+                )
+            os.chmod(file, 0o700)
+        os.makedirs(join(root, "acl_state"))
+        with open(join(root, "users.txt"), "w", encoding="utf-8") as opened:
+            opened.write("".join(user + "\n" for user in users))
+        env.update(
+            {
+                "PATH": bin_dir + os.pathsep + env.get("PATH", ""),
+                "FILE_ACCESS_MANAGER_ACL_BACKEND": "subprocess",
+                "FILE_ACCESS_MANAGER_USER_LOOKUP": "id",
+                "BENCHMARK_ACL_STATE": join(root, "acl_state"),
+                "BENCHMARK_USERS": join(root, "users.txt"),
+            }
+        )
+
+    generator = random.Random(args.seed)  # noqa: S311
+    per_user = min(args.per_user, len(locations))
+    grants = [
+        {"location": location, "user": user, "parents": 1}
+        for user in users + pending_users
+        for location in sorted(generator.sample(locations, per_user))
+    ]
+    spec = {
+        "options": dict(option.split("=", 1) for option in args.option),
+        "grants": [grant for grant in grants if grant["user"] in users],
+        "pending_grants": [grant for grant in grants if grant["user"] in pending_users],
+        "pending_users": pending_users,
+        "revoke": users[: round(len(users) * args.revoke)],
+    }
+    with open(join(project, SPEC_FILE), "w", encoding="utf-8") as opened:
+        json.dump(spec, opened)
+    return project, env
+
+
+def run_operation(name: str) -> dict:
+    launched: "Counter[str]" = Counter()
+
+    def count_subprocesses(event: str, event_args: tuple):
+        if event == "subprocess.Popen":
+            launched[os.path.basename(str(event_args[1][0]))] += 1
+
+    # subprocess events can only be counted in Python 3.8+
+    if hasattr(sys, "addaudithook"):
+        sys.addaudithook(count_subprocesses)
+    import resource
+
+    import file_access_manager
+
+    with open(SPEC_FILE, encoding="utf-8") as opened:
+        spec = json.load(opened)
+    with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull):
+        if spec["options"]:
+            file_access_manager.set_options(**spec["options"])
+        start = perf_counter()
+        if name in ["grant", "pending_grant"]:
+            for grant in spec["grants" if name == "grant" else "pending_grants"]:
+                file_access_manager.set_permission(**grant)
+        elif name == "pending":
+            file_access_manager.check_pending(pull=False)
+        elif name in ["check_full", "check"]:
+            file_access_manager.check_access(pull=False, verbose=False, full=name == "check_full")
+        elif name == "revoke":
+            for user in spec["revoke"]:
+                file_access_manager.revoke_permissions(user)
+        seconds = perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "operation": name,
+        "seconds": seconds,
+        "subprocesses": sum(launched.values()),
+        "commands": dict(launched),
+        # kilobytes on Linux, and bytes on macOS
+        "peak_mb": peak / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> "list[dict]":
+    results = []
+    with TemporaryDirectory(dir=args.dir) as root:
+        project, env = make_project(args, root)
+        with open(join(project, SPEC_FILE), encoding="utf-8") as opened:
+            spec = json.load(opened)
+        for name in OPERATIONS:
+            if name == "pending" and not args.real:
+                # pending users are created before pending access is checked
+                with open(env["BENCHMARK_USERS"], "a", encoding="utf-8") as opened:
+                    opened.write("".join(user + "\n" for user in spec["pending_users"]))
+            res = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--operation", name],
+                cwd=project,
+                env=env,
+                check=False,
+                capture_output=True,
+            )
+            if res.returncode != 0:
+                msg = f"{name} failed:\n{res.stderr.decode('utf-8')}"
+                raise RuntimeError(msg)
+            results.append(json.loads(res.stdout.decode("utf-8").strip().split("\n")[-1]))
+    return results
+
+
+def compare(results: "list[dict]", previous: "list[dict]", tolerance: float) -> "list[str]":
+    regressions = []
+    previous_results = {result["operation"]: result for result in previous}
+    for result in results:
+        before = previous_results.get(result["operation"])
+        if before is None:
+            continue
+        if result["seconds"] > before["seconds"] * (1 + tolerance):
+            regressions.append(f"{result['operation']}: {before['seconds']:.3f}s -> {result['seconds']:.3f}s")
+        if result["subprocesses"] > before["subprocesses"]:
+            regressions.append(
+                f"{result['operation']}: {before['subprocesses']} -> {result['subprocesses']} subprocesses"
+            )
+        if result["peak_mb"] > before["peak_mb"] * (1 + tolerance):
+            regressions.append(f"{result['operation']}: {before['peak_mb']:.1f} -> {result['peak_mb']:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how access operations scale.")
+    parser.add_argument("--users", type=int, default=50, help="number of users")
+    parser.add_argument("--locations", type=int, default=10, help="number of locations")
+    parser.add_argument("--per-user", type=int, default=2, help="number of locations each user is granted")
+    parser.add_argument("--depth", type=int, default=2, help="levels of directories within each location")
+    parser.add_argument("--width", type=int, default=3, help="subdirectories within each directory")
+    parser.add_argument("--files", type=int, default=5, help="files within each directory")
+    parser.add_argument("--pending", type=float, default=0.2, help="share of users who do not exist when granted")
+    parser.add_argument("--revoke", type=float, default=0.2, help="share of existing users to revoke")
+    parser.add_argument("--option", action="append", default=[], help="project option to set, as name=value")
+    parser.add_argument("--commit", action="store_true", help="commit after each action")
+    parser.add_argument("--real", action="store_true", help="set real ACLs, rather than use stand-in commands")
+    parser.add_argument("--dir", help="directory to generate the project and locations in (e.g., /dev/shm)")
+    parser.add_argument("--seed", type=int, default=1, help="seed for assigning locations to users")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--compare", help="path to JSON results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed proportional increase in time")
+    parser.add_argument("--operation", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.operation:
+        print(json.dumps(run_operation(args.operation)))
+        return
+    results = run_benchmark(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            commands = ", ".join(f"{command}: {count}" for command, count in sorted(result["commands"].items()))
+            print(
+                f"{result['operation']:<14} {result['seconds'] * 1000:10.1f} ms {result['subprocesses']:6} subprocesses"
+                f" {result['peak_mb']:7.1f} MB" + (f"  ({commands})" if commands else "")
+            )
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as opened:
+            regressions = compare(results, json.load(opened), args.tolerance)
+        if regressions:
+            print("regressions:\n" + "\n".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Stand-in `getfacl`, `setfacl`, and `id` commands, for benchmarking without ACL support or real users.
+
+ACLs are kept in a JSON file per path within the `BENCHMARK_ACL_STATE` directory, and users exist if
+they are listed in the `BENCHMARK_USERS` file. Recursive changes visit every file, as `setfacl -R` would.
+
+These are installed as executables by `benchmarks/scale.py`, which puts them first on `PATH`.
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+
+def _state_file(path: str) -> str:
+    return os.path.join(
+        os.environ["BENCHMARK_ACL_STATE"], hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest() + ".json"
+    )
+
+
+def _read_state(path: str) -> "dict[str, str]":
+    file = _state_file(path)
+    if not os.path.exists(file):
+        return {}
+    with open(file, encoding="utf-8") as opened:
+        return json.load(opened)
+
+
+def _write_state(path: str, entries: "dict[str, str]"):
+    with open(_state_file(path), "w", encoding="utf-8") as opened:
+        json.dump(entries, opened)
+
+
+def _perm_string(perms: str) -> str:
+    return "".join(perm if perm in perms else "-" for perm in "rwx")
+
+
+def getfacl(args: "list[str]") -> int:
+    path = args[-1]
+    if not os.path.exists(path):
+        sys.stderr.write(f"getfacl: {path}: No such file or directory\n")
+        return 1
+    # default entries are kept with a `default:` prefix, and listed alone with `-d`
+    default = "d" in args[0].lstrip("-")
+    entries = {
+        entry[len("default:") :] if default else entry: perms
+        for entry, perms in _read_state(path).items()
+        if entry.startswith("default:") == default
+    }
+    if default and not entries:
+        return 0
+    lines = ["user::rwx"]
+    lines += [f"{entry}:{perms}" for entry, perms in sorted(entries.items())]
+    lines += ["group::r-x", "mask::rwx", "other::---"]
+    sys.stdout.write("\n".join(lines) + "\n")
+    return 0
+
+
+def setfacl(args: "list[str]") -> int:
+    flag, specs, path = args[-3:]
+    if not os.path.exists(path):
+        sys.stderr.write(f"setfacl: {path}: No such file or directory\n")
+        return 1
+    changes: "dict[str, str]" = {}
+    default_changes: "dict[str, str]" = {}
+    for spec in specs.split(","):
+        parts = spec.split(":")
+        target_changes = changes
+        if parts[0] in ["d", "default"]:
+            parts = parts[1:]
+            target_changes = default_changes
+        kind = "group" if parts[0] in ["g", "group"] else "user"
+        if len(parts) < 2 or not parts[1]:
+            sys.stderr.write(f"setfacl: option {flag}: Invalid argument near character 1\n")
+            return 2
+        target_changes[f"{kind}:{parts[1]}"] = _perm_string(parts[2]) if len(parts) > 2 else ""
+    paths = [path]
+    if "R" in flag and os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            paths += [os.path.join(root, name) for name in dirs + files]
+    for target in paths:
+        entries = _read_state(target)
+        # as with setfacl, default entries are only set on directories
+        target_changes = {**changes}
+        if os.path.isdir(target):
+            target_changes.update({"default:" + entry: perms for entry, perms in default_changes.items()})
+        for entry, perms in target_changes.items():
+            if "x" in flag.lstrip("-R"):
+                entries.pop(entry, None)
+            else:
+                entries[entry] = perms
+        _write_state(target, entries)
+    return 0
+
+
+def id_command(args: "list[str]") -> int:
+    with open(os.environ["BENCHMARK_USERS"], encoding="utf-8") as opened:
+        users = {line.strip() for line in opened}
+    if args and args[-1] in users:
+        sys.stdout.write(f"uid=1000({args[-1]})\n")
+        return 0
+    sys.stderr.write(f"id: '{args[-1] if args else ''}': no such user\n")
+    return 1
+
+
+def main(command: str):
+    sys.exit({"getfacl": getfacl, "setfacl": setfacl, "id": id_command}[command](sys.argv[1:]))
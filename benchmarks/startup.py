@@ -0,0 +1,70 @@
+"""
+Measure cold-start time of `manage-access` subcommands.
+
+Each command is run in a fresh interpreter within a temporary project, and
+the median wall time is reported, along with whether `pandas` was imported.
+
+Usage:
+    python benchmarks/startup.py [--runs 10] [--json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+COMMANDS = [
+    ["--help"],
+    ["locations"],
+    ["config"],
+    ["pending", "--no-pull", "--no-update"],
+    ["check", "--no-pull", "--no-reapply"],
+]
+
+
+def time_command(command: "list[str]", cwd: str, runs: int):
+    times = []
+    imports_pandas = False
+    env = {**os.environ, "PYTHONPROFILEIMPORTTIME": "1"}
+    for _ in range(runs):
+        start = perf_counter()
+        res = subprocess.run(
+            [sys.executable, "-c", "from file_access_manager.cli import main; main()", *command],
+            cwd=cwd,
+            env=env,
+            check=False,
+            capture_output=True,
+        )
+        times.append(perf_counter() - start)
+        imports_pandas = imports_pandas or b"| pandas\n" in res.stderr
+    return {"command": " ".join(command), "median_seconds": median(times), "imports_pandas": imports_pandas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of manage-access subcommands.")
+    parser.add_argument("--runs", type=int, default=10, help="number of runs per command")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    with TemporaryDirectory() as temp:
+        subprocess.run(
+            [sys.executable, "-c", "from file_access_manager.cli import main; main()", "init", temp],
+            check=True,
+            capture_output=True,
+        )
+        results = [time_command(command, temp, args.runs) for command in COMMANDS]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(
+                f"{result['command']:<40} {result['median_seconds'] * 1000:8.1f} ms"
+                + ("  (imports pandas)" if result["imports_pandas"] else "")
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -23,7 +23,18 @@ def insert_cli_help(commands: List[List[str]], content: str, header: str = "## C
 
 if __name__ == "__main__":
     commands_map = {
-        "docs/functions/Access.md": [["manage-access"], ["manage-access", "pending"], ["manage-access", "check"]],
+        "docs/functions/Access.md": [
+            ["manage-access"],
+            ["manage-access", "pending"],
+            ["manage-access", "check"],
+            ["manage-access", "batch"],
+            ["manage-access", "plan"],
+            ["manage-access", "apply"],
+            ["manage-access", "serve"],
+            ["manage-access", "log"],
+            ["manage-access", "watch"],
+            ["manage-access", "owners"],
+        ],
         "docs/functions/Locations.md": [["manage-access", "locations"]],
         "docs/functions/Projects.md": [["manage-access", "init"]],
     }
@@ -1,3 +1,53 @@
-from file_access_manager.access import set_permission, revoke_permissions, check_pending, check_access
-from file_access_manager.project import init_manager_project, set_options
-from file_access_manager.locations import list_locations, add_location, remove_location
+"""Manage access to directories."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from file_access_manager.access import (
+        set_permission,
+        set_permissions_batch,
+        revoke_permissions,
+        check_pending,
+        check_access,
+    )
+    from file_access_manager.plan import plan_access, apply_plan
+    from file_access_manager.project import Project, init_manager_project, set_options, git_session
+    from file_access_manager.locations import list_locations, add_location, remove_location
+    from file_access_manager.server import serve
+    from file_access_manager.log import query_log
+    from file_access_manager.watch import watch
+    from file_access_manager.owners import owner_summary
+    from file_access_manager.pending import pending_report
+
+# functions are imported as they are first accessed, to keep command-line startup fast
+_EXPORTS = {
+    "set_permission": "access",
+    "set_permissions_batch": "access",
+    "revoke_permissions": "access",
+    "check_pending": "access",
+    "check_access": "access",
+    "plan_access": "plan",
+    "apply_plan": "plan",
+    "init_manager_project": "project",
+    "set_options": "project",
+    "git_session": "project",
+    "Project": "project",
+    "list_locations": "locations",
+    "add_location": "locations",
+    "remove_location": "locations",
+    "serve": "server",
+    "query_log": "log",
+    "watch": "watch",
+    "owner_summary": "owners",
+    "pending_report": "pending",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        from importlib import import_module
+
+        return getattr(import_module("file_access_manager." + _EXPORTS[name]), name)
+    msg = f"module 'file_access_manager' has no attribute '{name}'"
+    raise AttributeError(msg)
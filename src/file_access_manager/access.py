@@ -1,48 +1,71 @@
 """Manage user access."""
 
+import csv
+import json
 import re
 import subprocess
 import warnings
+from contextlib import ExitStack
+from dataclasses import replace
 from getpass import getuser
-from os.path import abspath, dirname, exists
+from os.path import abspath, dirname, exists, sep
 from pathlib import Path
-from shutil import which
-from time import ctime
-from typing import Union
-
-import pandas
-
+from time import time
+from typing import TYPE_CHECKING, Any, Callable, Union
+
+from file_access_manager.acl import (
+    ACL_BACKEND,
+    _cache_stats,
+    _clear_acl_cache,
+    _get_default_acl,
+    _get_principal_acl,
+    _modify_acl,
+    _principal_spec,
+)
 from file_access_manager.locations import _get_locations
+from file_access_manager.locks import PENDING_LOCK, _location_lock, _lock
+from file_access_manager.log import _log
+from file_access_manager.manifest import _apply_incremental, _apply_inherited
+from file_access_manager.metrics import _failed_process, _failed_users, _measured
+from file_access_manager.owners import _apply_owned, owner_summary
+from file_access_manager.paths import _PathTrie
+from file_access_manager.pending import _attempted, _get_queue, _is_due, _queue_key, _write_queue
 from file_access_manager.project import (
-    ACCESS_FILE,
-    ACCESS_STRUCTURE,
     GIT_PATH,
-    _check_for_project,
+    PENDING_FILE,
     _get_config,
     _git_update,
+    _in_project,
+    _inherits,
     _validate_location,
 )
+from file_access_manager.store import AccessRecord, AccessStore, _get_store, _to_frame
+from file_access_manager.users import _clear_cache, _resolve_users, _user_exists
 
-ID_PATH = which("id")
-SETFACL_PATH = which("setfacl")
-GETFACL_PATH = which("getfacl")
+if TYPE_CHECKING:
+    import pandas
 
 
+@_in_project
 def set_permission(location: str, user: str, group: Union[str, None] = None, permissions: str = "rx", parents: int = 1):
     """
     Grant a user permission, and add them to a group.
 
     Args:
         location (str): Name of a location, or path, to grant `user` `permissions` to.
-        user (str): Name of the user.
+        user (str): Name of the user, or `g:<group>` to grant access to an existing group as a whole
+            (with a single group entry, so members can be added or removed without changing files).
         group (str): User under which the access is granted. This is used to revoke access
             to sub-users when the group user's access is removed (e.g., in cases where a primary
             investigator gets access [a user within their own group],
             and assistants working for them also need access [users within the PI's group]).
         permissions (str): Permission string (e.g., "rwx").
         parents (int): Number of parent directories on which to set read and execute permissions.
+        project (Project): Project to work within, rather than the current working directory.
     """
-    access = _get_accesses()
+    _clear_cache()
+    _clear_acl_cache()
+    access = _get_store()
     defer = _get_config().get("defer", False)
     if exists(location):
         path = location
@@ -55,341 +78,688 @@ def set_permission(location: str, user: str, group: Union[str, None] = None, per
     if not group:
         group = user
     message = ""
-    if defer or not _user_exists(user):
-        pending = _get_pendings()
-        updated = _append_row(pending, user, group, path, permissions, parents)
-        if not updated.equals(pending):
-            updated.to_csv("pending_" + ACCESS_FILE, index=False)
+    if defer or not _user_exists(user, _get_config()["missing_user_ttl"]):
+        pending = _get_store(PENDING_FILE)
+        if pending.upsert(user, group, path, permissions, parents):
+            pending.flush()
             message = f"added {user} to pending access for {location} in group {group}"
-            _log(message)
+            _log(message, action="pending", user=user, group=group, location=path)
     else:
         _apply_to_parent(user, path, parents)
         res = _set_permissions(user, path, permissions)
         if res.returncode == 0:
-            updated = _append_row(access, user, group, path, permissions, parents)
-            if not updated.equals(access):
-                updated.to_csv(ACCESS_FILE, index=False)
+            if access.upsert(user, group, path, permissions, parents):
+                access.flush()
                 message = f"set permissions to {location} for {user} in group {group}"
-                _log(message)
+                _log(message, action="grant", user=user, group=group, location=path)
         else:
             print(res.stderr.decode("utf-8"))
-            _log(f"failed to set permissions for {user}")
+            _log(f"failed to set permissions for {user}", action="failed", user=user, group=group, location=path)
     if message:
         _git_update(message)
 
 
-def _get_accesses():
-    _check_for_project(ACCESS_FILE)
-    return pandas.read_csv(ACCESS_FILE, dtype=ACCESS_STRUCTURE)
+@_in_project
+def set_permissions_batch(grants: "Union[str, list[dict]]"):
+    """
+    Grant many users permission at once, writing access records and committing once.
 
+    Args:
+        grants (str | list[dict]): Path to a CSV or JSON Lines (`.jsonl`) file, or a list of dictionaries,
+            with a `location` and `user` for each grant, and optionally a `group`, `permissions`, and `parents`
+            (see `set_permission`).
+        project (Project): Project to work within, rather than the current working directory.
 
-def _get_pendings():
-    _check_for_project(ACCESS_FILE)
-    return pandas.read_csv("pending_" + ACCESS_FILE, dtype=ACCESS_STRUCTURE)
+    Returns:
+        A dictionary with lists of `granted`, `pending`, and `failed` grants.
+
+    Examples:
+        >>> file_access_manager.set_permissions_batch(
+        ...     [{"location": "location_name", "user": "user1"}, {"location": "location_name", "user": "user2"}]
+        ... )
+    """
+    if isinstance(grants, str):
+        grants = _read_grants(grants)
+    _clear_cache()
+    _clear_acl_cache()
+    config = _get_config()
+    defer = config["defer"]
+    locations = _get_locations()
+    rows: "list[dict]" = []
+    for grant in grants:
+        location = str(grant.get("location") or "")
+        user = str(grant.get("user") or "")
+        if not location or not user:
+            msg = f"each grant must have a location and user: {grant}"
+            raise RuntimeError(msg)
+        path = location if exists(location) else locations.get(location, location)
+        if not defer and not exists(path):
+            msg = f"location ({location}) does not exist"
+            raise RuntimeError(msg)
+        parents = grant.get("parents")
+        rows.append(
+            {
+                "user": user,
+                "group": str(grant.get("group") or user),
+                "location": re.sub(r"[\\/]$", "", path),
+                "permissions": str(grant.get("permissions") or "rx"),
+                "parents": 1 if parents is None or parents == "" else int(parents),
+            }
+        )
+    users_exist = {} if defer else _resolve_users([row["user"] for row in rows], config["missing_user_ttl"])
+    result: "dict[str, list[dict]]" = {"granted": [], "pending": [], "failed": []}
+    by_location: "dict[str, list[dict]]" = {}
+    for row in rows:
+        if users_exist.get(row["user"]):
+            by_location.setdefault(row["location"], []).append(row)
+        else:
+            result["pending"].append(row)
+    parent_access: "dict[str, set[str]]" = {}
+    for path, location_rows in by_location.items():
+        for row in location_rows:
+            for parent in _owned_parents(path, row["parents"]):
+                parent_access.setdefault(parent, set()).add(row["user"])
+    for parent, parent_users in parent_access.items():
+        res = _set_permissions_many(parent, dict.fromkeys(sorted(parent_users), "rx"), False)
+        if res.returncode != 0:
+            print(res.stderr.decode("utf-8"))
+            for user in sorted(parent_users):
+                _log(f"failed to set permissions on parents for {user}", action="failed", user=user, location=parent)
+    for path, location_rows in by_location.items():
+        res = _set_permissions_many(path, {row["user"]: row["permissions"] for row in location_rows})
+        if res.returncode == 0:
+            result["granted"] += location_rows
+        else:
+            print(res.stderr.decode("utf-8"))
+            for row in location_rows:
+                _log(
+                    f"failed to set permissions to {path} for {row['user']}",
+                    action="failed",
+                    user=row["user"],
+                    group=row["group"],
+                    location=path,
+                )
+            result["failed"] += location_rows
+    messages: "list[str]" = []
+    access = _get_store()
+    granted = 0
+    for row in result["granted"]:
+        if access.upsert(row["user"], row["group"], row["location"], row["permissions"], row["parents"]):
+            granted += 1
+            _log(
+                f"set permissions to {row['location']} for {row['user']} in group {row['group']}",
+                action="grant",
+                user=row["user"],
+                group=row["group"],
+                location=row["location"],
+            )
+    if granted:
+        access.flush()
+        messages.append(f"set {granted} permissions across {len(by_location)} locations")
+    pending = _get_store(PENDING_FILE)
+    added = 0
+    for row in result["pending"]:
+        if pending.upsert(row["user"], row["group"], row["location"], row["permissions"], row["parents"]):
+            added += 1
+            _log(
+                f"added {row['user']} to pending access for {row['location']} in group {row['group']}",
+                action="pending",
+                user=row["user"],
+                group=row["group"],
+                location=row["location"],
+            )
+    if added:
+        pending.flush()
+        messages.append(f"added {added} permissions to pending")
+    if result["failed"]:
+        messages.append(f"failed to set {len(result['failed'])} permissions")
+    if messages:
+        _git_update("batch: " + "; ".join(messages))
+    return result
+
+
+def _read_grants(file: str) -> "list[dict]":
+    if not exists(file):
+        msg = f"grants file ({file}) does not exist"
+        raise RuntimeError(msg)
+    with open(file, encoding="utf-8") as opened:
+        if file.endswith((".jsonl", ".ndjson")):
+            return [json.loads(line) for line in opened if line.strip()]
+        return list(csv.DictReader(opened))
 
 
 def _set_permissions(user: str, path: str, perms: str, recursive: bool = True):
-    if SETFACL_PATH:
+    return _set_permissions_many(path, {user: perms}, recursive)
+
+
+@_measured("set_permissions", _failed_process)
+def _set_permissions_many(path: str, access: "dict[str, str]", recursive: bool = True):
+    if ACL_BACKEND:
         if not _validate_location(path):
             msg = f"location {path} is not within an allowed directory"
             raise RuntimeError(msg)
-        res = subprocess.run(
-            [SETFACL_PATH, *(["-Rm"] if recursive else ["-m"]), f"u:{user}:{perms}", path],
-            check=False,
-            capture_output=True,
-        )
-        if res.returncode != 0:
-            warnings.warn(
-                f"failed to set permissions for user {user} on path {path}: {res.stderr.decode('utf-8')}",
-                stacklevel=2,
+        config = _get_config()
+        with _location_lock(path):
+            res = _modify_acl(
+                path,
+                [_principal_spec(user, perms) for user, perms in access.items()],
+                recursive,
+                False,
+                config["workers"],
+                config["worker_type"],
+                recursive and _inherits(path),
             )
-        else:
-            set_perms = _get_current_access(path)
-            if user not in set_perms or not _perms_match(set_perms[user], perms):
-                msg = "permissions were not successfully set: " + (
-                    "none were applied"
-                    if user not in set_perms
-                    else f"set permissions do not match ({perms} versus {set_perms[user]})"
+            if res.returncode != 0:
+                warnings.warn(
+                    f"failed to set permissions for {', '.join(access)} on path {path}: {res.stderr.decode('utf-8')}",
+                    stacklevel=3,
                 )
-                warnings.warn(msg, stacklevel=2)
+            else:
+                _verify_permissions(path, access)
         return res
     msg = "`setfacl` command not found"
     raise RuntimeError(msg)
 
 
-def _apply_to_parent(user: str, path: str, parents: int, update: bool = True):
-    failed = False
+def _verify_permissions(path: str, access: "dict[str, str]"):
+    set_perms = _get_current_access(path)
+    for user, perms in access.items():
+        if user not in set_perms or not _perms_match(set_perms[user], perms):
+            warnings.warn(
+                f"permissions were not successfully set for {user} on path {path}: "
+                + (
+                    "none were applied"
+                    if user not in set_perms
+                    else f"set permissions do not match ({perms} versus {set_perms[user]})"
+                ),
+                stacklevel=4,
+            )
+    return set_perms
+
+
+@_measured("reapply_location")
+def _reapply_location(location: str, access: "dict[str, str]", full: bool = False) -> "dict[str, str]":
+    if not _validate_location(location):
+        msg = f"location {location} is not within an allowed directory"
+        raise RuntimeError(msg)
+    config = _get_config()
+    with _location_lock(location):
+        if _inherits(location):
+            res = _apply_inherited(location, access, full, config["workers"], config["worker_type"])
+        else:
+            res = _apply_incremental(location, access, full, config["workers"], config["worker_type"])
+        if res.returncode != 0:
+            warnings.warn(
+                f"failed to set permissions on path {location}: {res.stderr.decode('utf-8')}",
+                stacklevel=3,
+            )
+        return _verify_permissions(location, access)
+
+
+@_measured("reapply_location")
+def _reapply_owned(location: str, access: "dict[str, str]") -> "dict[str, str]":
+    # other owners' files are left to them, so are not verified
+    if not _validate_location(location):
+        msg = f"location {location} is not within an allowed directory"
+        raise RuntimeError(msg)
+    with _location_lock(location):
+        res = _apply_owned(location, access)
+        if res.returncode != 0:
+            warnings.warn(
+                f"failed to set permissions on owned files in {location}: {res.stderr.decode('utf-8')}",
+                stacklevel=3,
+            )
+        return _get_current_access(location)
+
+
+def _owned_parents(path: str, parents: int) -> "list[str]":
+    owned: "list[str]" = []
     parent = abspath(path)
     for _ in range(parents):
+        parent = dirname(parent)
+        if not parent or Path(parent).owner() != getuser():
+            break
+        owned.append(parent)
+    return owned
+
+
+def _apply_to_parent(user: str, path: str, parents: int, update: bool = True):
+    return _apply_to_parents(path, {user: parents}, update)[user]
+
+
+@_measured("apply_to_parents", _failed_users)
+def _apply_to_parents(path: str, parents: "dict[str, int]", update: bool = True) -> "dict[str, bool]":
+    succeeded = dict.fromkeys(parents, True)
+    remaining = {user: count for user, count in parents.items() if count > 0}
+    parent = abspath(path)
+    level = 0
+    while remaining:
         parent = dirname(parent)
         if parent and (Path(parent).owner() == getuser()):
-            res = _set_permissions(user, parent, "rx", False)
-            failed = res.returncode != 0 or user not in _get_current_access(parent)
+            res = _set_permissions_many(parent, dict.fromkeys(remaining, "rx"), False)
+            set_perms = _get_current_access(parent)
+            failed = [user for user in remaining if res.returncode != 0 or user not in set_perms]
             if failed:
                 print(res.stderr.decode("utf-8"))
                 if update:
-                    _log(f"failed to set permissions on parents for {user}")
-                break
+                    for user in failed:
+                        _log(
+                            f"failed to set permissions on parents for {user}",
+                            action="failed",
+                            user=user,
+                            location=path,
+                        )
+                for user in failed:
+                    succeeded[user] = False
+                    remaining.pop(user)
         else:
-            failed = user not in _get_current_access(parent)
+            set_perms = _get_current_access(parent)
+            for user in remaining:
+                succeeded[user] = user in set_perms
             break
-    return not failed
-
-
-def _append_row(current: pandas.DataFrame, user: str, group: str, location: str, permissions: str, parents: int):
-    new_row = pandas.DataFrame(
-        {
-            "user": [user],
-            "group": [group],
-            "location": [location],
-            "permissions": [permissions],
-            "parents": [parents],
-            "date": [ctime()],
-        }
-    )
-    return (
-        pandas.concat([new_row, current], ignore_index=True)
-        .drop_duplicates(["user", "group", "location"])
-        .sort_values(["user", "group", "location"])
-    )
+        level += 1
+        remaining = {user: count for user, count in remaining.items() if count > level}
+    return succeeded
 
 
-def _log(message: str, write: bool = True):
-    if write:
-        with open("log.txt", "a", encoding="utf-8") as opened:
-            opened.write(f"{ctime()}: {message}\n")
-    else:
-        print(message)
+def _map_locations(function: "Callable[[str], Any]", locations: "list[str]", jobs: int = 1) -> dict:
+    if jobs <= 1 or len(locations) < 2:
+        return {location: function(location) for location in locations}
+    from concurrent.futures import ThreadPoolExecutor
 
+    # nested locations share files, so they are processed in order within the same job
+    groups: "list[list[str]]" = []
+    for location in sorted(locations, key=lambda location: abspath(location).split(sep)):
+        if groups and abspath(location).startswith(abspath(groups[-1][0]).rstrip(sep) + sep):
+            groups[-1].append(location)
+        else:
+            groups.append([location])
+    results: dict = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for group_results in executor.map(lambda group: [(location, function(location)) for location in group], groups):
+            results.update(group_results)
+    return {location: results[location] for location in locations}
 
-def check_pending(pull: bool = True, push: bool = False, update: bool = True):
+
+@_in_project
+def check_pending(pull: bool = True, push: bool = False, update: bool = True, jobs: int = 1):
     """
     Check any users pending access, and apply permissions if they exist.
 
+    Pending removals are processed first, then pending access is applied to each location.
+    Only entries that are due are processed: entries that fail are attempted again after the `pending_backoff` delay,
+    which doubles with each attempt (up to `pending_max_backoff`), and are removed once they have been pending
+    for `pending_expiry` days (see `pending_report`).
+
     Args:
         pull (bool): If `False`, will not pull the remote before checking pending.
         push (bool): If `True`, will push any changes made (bypassing auto_push option).
         update (bool): If `False`, will not change pending or access files.
+        jobs (int): Number of locations to apply access to at the same time.
+        project (Project): Project to work within, rather than the current working directory.
     """
     if pull and GIT_PATH and exists(".git"):
         if subprocess.run([GIT_PATH, "pull"], check=False, capture_output=True).returncode != 0:
-            warnings.warn("failed to pull before checking pending", stacklevel=2)
-    pending_file = "pending_" + ACCESS_FILE
-    if exists(pending_file):
-        lock_file = Path(".PROCESSING_PENDING")
-        if update:
-            if lock_file.is_file():
-                update = False
-            else:
-                lock_file.touch()
-        pending = _get_pendings()
-        any_updated = False
-        any_revoke = False
-        for user, access in pending.groupby("user"):
-            user_exists = _user_exists(user)
-            for group, location, permissions, parents in zip(
-                access["group"], access["location"], access["permissions"], access["parents"]
-            ):
-                updated = False
-                if pandas.isna(permissions):
-                    updated = revoke_permissions(user, "" if pandas.isna(location) else location, True, update)
-                    if not user_exists:
-                        access = _get_accesses()
-                        access[
-                            ~((access["user"] == user) & (pandas.isna(location) or (access["location"] == location)))
-                        ].to_csv(ACCESS_FILE, index=False)
-                        _log(f"removed {user} from access because they do not exist")
-                        updated = True
-                    any_revoke = True
-                elif user_exists and exists(location):
-                    _set_permissions(user, location, permissions)
-                    _apply_to_parent(user, location, parents, update)
-                    current_access = _get_accesses()
-                    added_access = _append_row(current_access, user, group, location, permissions, parents)
-                    if update and not added_access.equals(current_access):
-                        updated = True
-                        added_access.to_csv(ACCESS_FILE, index=False)
-                        _log(f"set permissions to {location} for {user} in group {group}")
+            warnings.warn("failed to pull before checking pending", stacklevel=3)
+    if exists(PENDING_FILE):
+        with ExitStack() as stack:
+            if update:
+                # while another run is processing pending, this one only applies access
+                update = stack.enter_context(_lock(PENDING_LOCK, blocking=False))
+            pending = _get_store(PENDING_FILE)
+            access = _get_store()
+            _clear_cache()
+            _clear_acl_cache()
+            config = _get_config()
+            any_revoke = False
+            messages: "list[str]" = []
+            queue = _get_queue()
+            now = time()
+            # entries that are not yet due are not looked up or attempted
+            due = [record for record in pending if _is_due(queue, record, now)]
+            users_exist = _resolve_users(sorted({record.user for record in due}), config["missing_user_ttl"])
+            for record in due:
+                user, group, location = record.key
+                if record.permissions or pending.get(user, group, location) is None:
+                    continue
+                updated, message = _revoke_permissions(user, location, True, update, access, pending)
+                if message:
+                    messages.append(message)
+                if not users_exist[user] and update:
+                    for removed in access.select(user=user, location=location or None):
+                        access.delete(user, removed.group, removed.location)
+                    _log(
+                        f"removed {user} from access because they do not exist",
+                        action="revoke",
+                        user=user,
+                        location=location,
+                    )
+                    updated = True
+                any_revoke = True
                 if updated:
-                    any_updated = True
-                    pending = pending[
-                        ~((pending["user"] == user) & (pandas.isna(location) or (access["location"] == location)))
-                    ]
-        lock_file.unlink(True)
+                    for processed in pending.select(user=user, location=location or None):
+                        pending.delete(user, processed.group, processed.location)
+            grants: "dict[str, list[AccessRecord]]" = {}
+            for record in due:
+                if (
+                    record.permissions
+                    and pending.get(*record.key) is not None
+                    and users_exist[record.user]
+                    and exists(record.location)
+                ):
+                    grants.setdefault(record.location, []).append(record)
+            results = _map_locations(
+                lambda location: _set_permissions_many(
+                    location, {record.user: record.permissions for record in grants[location]}
+                ),
+                list(grants),
+                jobs,
+            )
+            for location, records in grants.items():
+                # failed grants stay pending, to be attempted again (or expire) like other failed entries
+                if results[location].returncode != 0:
+                    continue
+                parents: "dict[str, int]" = {}
+                for record in records:
+                    parents[record.user] = max(parents.get(record.user, 0), record.parents)
+                _apply_to_parents(location, parents, update)
+                for record in records:
+                    user, group = record.user, record.group
+                    if update and access.upsert(user, group, location, record.permissions, record.parents):
+                        _log(
+                            f"set permissions to {location} for {user} in group {group}",
+                            action="grant",
+                            user=user,
+                            group=group,
+                            location=location,
+                        )
+                        for processed in pending.select(user=user, location=location):
+                            pending.delete(user, processed.group, processed.location)
+            if update:
+                expired = _schedule_pending(pending, due, queue, now, config)
+                if expired:
+                    messages.append(f"removed {expired} expired pending entries")
+                _write_queue(queue)
         if update:
-            if any_updated:
-                pending.to_csv(pending_file, index=False)
-                _git_update("processed pending permissions", push)
+            if access.changed or pending.changed:
+                access.flush()
+                pending.flush()
+                _git_update("\n\n".join(["processed pending permissions", *messages]), push)
             elif any_revoke and push:
                 _git_update(bypass=True)
     else:
         print("no pending users")
 
 
-def _user_exists(user: str):
-    return ID_PATH and subprocess.run([ID_PATH, user], check=False, capture_output=True).returncode == 0
+def _schedule_pending(
+    pending: AccessStore,
+    attempted: "list[AccessRecord]",
+    queue: "dict[str, dict[str, float]]",
+    now: float,
+    config: dict,
+) -> int:
+    # attempted entries still pending are scheduled again (or expire), and processed entries leave the queue
+    remaining = {_queue_key(record) for record in pending}
+    for key in [key for key in queue if key not in remaining]:
+        queue.pop(key)
+    expired = 0
+    for record in attempted:
+        if pending.get(*record.key) is None or not _attempted(queue, record, now, config):
+            continue
+        pending.delete(*record.key)
+        queue.pop(_queue_key(record))
+        expired += 1
+        _log(
+            f"removed {record.user} from pending"
+            + (f" access to {record.location}" if record.permissions else " removal")
+            + f" after {config['pending_expiry']} days",
+            action="expire",
+            user=record.user,
+            group=record.group,
+            location=record.location or None,
+        )
+    return expired
 
 
 def _revoke(user: str, path: str, recursive: bool = True):
+    return _revoke_many([user], path, recursive)[user]
+
+
+@_measured("revoke", _failed_users)
+def _revoke_many(users: "list[str]", path: str, recursive: bool = True) -> "dict[str, bool]":
+    succeeded = dict.fromkeys(users, True)
     if not recursive:
         set_perms = _get_current_access(path)
-        if user not in set_perms:
-            return True
-    if SETFACL_PATH:
+        users = [user for user in users if user in set_perms]
+        if not users:
+            return succeeded
+    if ACL_BACKEND:
         if not _validate_location(path):
             msg = f"location {path} is not within an allowed directory"
             raise RuntimeError(msg)
-        res = subprocess.run(
-            [SETFACL_PATH, *(["-Rx"] if recursive else ["-x"]), f"u:{user}", path],
-            check=False,
-            capture_output=True,
-        )
-        success = res.returncode == 0
-        failure_message = f"failed to revoke access to {path} from {user}: "
-        if success:
+        config = _get_config()
+        with _location_lock(path):
+            # default entries are always removed, so new files do not inherit revoked access
+            res = _modify_acl(
+                path,
+                [_principal_spec(user) for user in users],
+                recursive,
+                True,
+                config["workers"],
+                config["worker_type"],
+                recursive,
+            )
             set_perms = _get_current_access(path)
-            if user in set_perms:
-                success = False
-                warnings.warn(failure_message + "still appears in access list", stacklevel=2)
+        failure_message = f"failed to revoke access to {path} from {', '.join(users)}: "
+        if res.returncode == 0:
+            remaining = [user for user in users if user in set_perms]
+            if remaining:
+                warnings.warn(
+                    f"failed to revoke access to {path} from {', '.join(remaining)}: still appears in access list",
+                    stacklevel=3,
+                )
+            for user in remaining:
+                succeeded[user] = False
         else:
-            warnings.warn(failure_message + res.stderr.decode("utf-8"), stacklevel=2)
-        return success
+            warnings.warn(failure_message + res.stderr.decode("utf-8"), stacklevel=3)
+            for user in users:
+                succeeded[user] = False
+        return succeeded
     msg = "`setfacl` command not found"
     raise RuntimeError(msg)
 
 
+@_in_project
 def revoke_permissions(user: str, location: "Union[str, None]" = None, from_pending: bool = False, active: bool = True):
     """
     Remove access from a user.
 
     Args:
-        user (str): User to remove access from.
+        user (str): User (or `g:<group>`) to remove access from.
         location (str): Location to remove `user`s access from; if not
             specified, access from all locations will be removed.
         from_pending (bool): If `False`, will not also remove the user from pending access.
         active (bool): If `False`, will attempt removal without changing logs or access.
+        project (Project): Project to work within, rather than the current working directory.
     """
-    access = _get_accesses()
-    removed = su = access["user"] == user
-    if any(su):
+    _clear_cache()
+    _clear_acl_cache()
+    access = _get_store()
+    pending = _get_store(PENDING_FILE)
+    revoked, message = _revoke_permissions(user, location, from_pending, active, access, pending)
+    if active:
+        access.flush()
+        pending.flush()
+        if message:
+            _git_update(message)
+    return revoked
+
+
+def _plan_revocation(
+    removed: "list[AccessRecord]", retained: "list[AccessRecord]"
+) -> "tuple[dict[tuple[str, bool], list[str]], list[AccessRecord]]":
+    # users to strip from each path (recursively from removed locations, and from the directory alone for parents),
+    # along with retained access to recursively stripped locations, which is to be applied again
+    kept = _PathTrie()
+    for record in retained:
+        if record.permissions != "---":
+            kept.add(record.location, record.user)
+    stripped = _PathTrie()
+    for record in removed:
+        stripped.add(record.location, record.user)
+    plan: "dict[tuple[str, bool], set[str]]" = {}
+    for record in removed:
+        location = abspath(record.location)
+        # locations within another removed location are covered by its recursive removal
+        if not stripped.covers(dirname(location), record.user):
+            plan.setdefault((location, True), set()).add(record.user)
+        parent = location
+        for _ in range(record.parents):
+            if dirname(parent) == parent:
+                break
+            parent = dirname(parent)
+            # parents are kept if a retained location is within or contains them
+            if not (
+                kept.covers(parent, record.user)
+                or kept.contains(parent, record.user)
+                or stripped.covers(parent, record.user)
+            ):
+                plan.setdefault((parent, False), set()).add(record.user)
+    recursive = _PathTrie()
+    for (path, is_recursive), users in plan.items():
+        if is_recursive:
+            for user in users:
+                recursive.add(path, user)
+    reapply = [
+        record for record in retained if record.permissions != "---" and recursive.covers(record.location, record.user)
+    ]
+    # stripped locations within a retained location get that location's access again, before nested records
+    reapplied = {(abspath(record.location), record.user) for record in reapply}
+    for (path, is_recursive), users in plan.items():
+        if not is_recursive:
+            continue
+        for user in users:
+            if (path, user) in reapplied:
+                continue
+            containing = [
+                record
+                for record in retained
+                if record.user == user
+                and record.permissions != "---"
+                and path.startswith(abspath(record.location).rstrip(sep) + sep)
+            ]
+            if containing:
+                nearest = max(containing, key=lambda entry: len(abspath(entry.location)))
+                reapply.append(replace(nearest, location=path))
+    reapply.sort(key=lambda entry: len(abspath(entry.location)))
+    return ({key: sorted(users) for key, users in plan.items()}, reapply)
+
+
+def _revoke_permissions(
+    user: str,
+    location: "Union[str, None]",
+    from_pending: bool,
+    active: bool,
+    access: AccessStore,
+    pending: AccessStore,
+) -> "tuple[bool, str]":
+    user_access = access.select(user=user)
+    if user_access:
         path = ""
-        any_fail = False
         if location:
             locations = _get_locations()
             path = locations.get(location, location)
         if not from_pending and _get_config().get("defer", False):
-            pending = _get_pendings()
-            updated = _append_row(pending, user, user, path, "", 0)
-            if not updated.equals(pending):
-                updated.to_csv("pending_" + ACCESS_FILE, index=False)
+            if pending.upsert(user, user, path, "", 0):
                 message = f"added {user} to pending removal" + (f" from {location}" if location else "")
-                _log(message, active)
-                if active:
-                    _git_update(message)
-            return False
+                _log(message, active, action="pending", user=user, location=path)
+                return (False, message)
+            return (False, "")
         if location:
-            location_access = su & (access["location"] == path)
-            if location_access.any():
-                parents = access.loc[location_access, "parents"].max()
-                alt_access = access.loc[su & (access["location"] != path), "location"].unique()
-                parent_path = dirname(path)
-                for _ in range(parents):
-                    retain = False
-                    for alt_path in alt_access:
-                        if parent_path in alt_path:
-                            retain = True
-                            break
-                    if not retain and not _revoke(user, parent_path, False):
-                        any_fail = True
-                    parent_path = dirname(parent_path)
-                removed = removed & (access["location"] == path)
-                success = _revoke(user, path)
-                if success:
-                    _log(f"removed permissions from {user}: they can no longer access {path}", active)
-                else:
-                    any_fail = True
+            own_access = [record for record in user_access if record.location == path]
+            group_access = [
+                record for record in access.select(group=user) if record.user != user and record.location == path
+            ]
         else:
-            user_access = access[su]
-            any_parent_fail = False
-            for path, parents in zip(user_access["location"], user_access["parents"]):
-                parent = path
-                for _ in range(parents):
-                    parent = dirname(parent)
-                    if parent:
-                        success = _revoke(user, parent, False)
-                        if not success:
-                            any_parent_fail = True
-                    else:
-                        break
-                success = _revoke(user, path)
-                if not success:
-                    any_parent_fail = True
-            if not any_parent_fail:
-                _log(f"removed all permissions from {user}", active)
-            else:
-                access.loc[su, "permissions"] = "---"
-                any_fail = True
-        group_access = access[~su & (access["group"] == user)]
-        if len(group_access):
-            removed = removed | (access["group"] == user)
-            if location:
-                removed = removed & (access["location"] == path)
-                group_access = group_access[group_access["location"] == path]
-                if len(group_access):
-                    for sub_user in group_access["user"]:
-                        if not len(
-                            access[
-                                (access["user"] == sub_user) & (access["location"] == path) & (access["group"] != user)
-                            ]
-                        ):
-                            success = _revoke(sub_user, path)
-                            if success:
-                                _log(
-                                    f"removed permissions from {sub_user}:"
-                                    f"they can no longer access {path} under {user}",
-                                    active,
-                                )
-                            else:
-                                any_fail = True
-            else:
-                for sub_user, path in zip(group_access["user"], group_access["location"]):
-                    success = _revoke(sub_user, path)
-                    if success:
-                        _log(
-                            f"removed permissions from {sub_user}: they can no longer access {path} under {user}",
-                            active,
-                        )
-                    else:
-                        any_fail = True
+            own_access = user_access
+            group_access = [record for record in access.select(group=user) if record.user != user]
+        removed = own_access + group_access
+        removed_keys = {record.key for record in removed}
+        retained = [
+            record
+            for revoked_user in sorted({record.user for record in removed})
+            for record in access.select(user=revoked_user)
+            if record.key not in removed_keys
+        ]
+        plan, reapply = _plan_revocation(removed, retained)
+        failed: "set[str]" = set()
+        for (revoke_path, recursive), users in plan.items():
+            failed.update(
+                revoked_user
+                for revoked_user, success in _revoke_many(users, revoke_path, recursive).items()
+                if not success
+            )
+        for record in reapply:
+            if _set_permissions_many(record.location, {record.user: record.permissions}).returncode != 0:
+                failed.add(record.user)
+        any_fail = bool(failed)
+        if own_access and user not in failed:
+            _log(
+                (
+                    f"removed permissions from {user}: they can no longer access {path}"
+                    if location
+                    else f"removed all permissions from {user}"
+                ),
+                active,
+                action="revoke",
+                user=user,
+                location=path or None,
+            )
+        for record in group_access:
+            if record.user not in failed and record.user in plan.get((abspath(record.location), True), []):
+                _log(
+                    f"removed permissions from {record.user}: they can no longer access {record.location} under {user}",
+                    active,
+                    action="revoke",
+                    user=record.user,
+                    group=user,
+                    location=record.location,
+                )
         if any_fail:
-            if active and (access.loc[removed, "permissions"] != "---").any():
-                access.loc[removed, "permissions"] = "---"
-                access.to_csv(ACCESS_FILE, index=False)
-                _git_update(
+            if active and any(record.permissions != "---" for record in removed):
+                for record in removed:
+                    access.upsert(record.user, record.group, record.location, "---", record.parents)
+                return (
+                    False,
                     "failed to remove "
                     + (f"access to {location} ({path}) from {user}" if location else f"all access from {user}")
-                    + ", so setting blank permissions temporarily"
+                    + ", so setting blank permissions temporarily",
                 )
         else:
             if active:
-                access[~removed].to_csv(ACCESS_FILE, index=False)
-                _git_update(
-                    f"removed access to {location} ({path}) from {user}"
-                    if location
-                    else f"removed all access from {user}"
-                )
-            return True
+                for record in removed:
+                    access.delete(record.user, record.group, record.location)
+            return (
+                True,
+                f"removed access to {location} ({path}) from {user}" if location else f"removed all access from {user}",
+            )
     elif active and not from_pending:
-        pending = _get_pendings()
-        su = pending["user"] == user
-        if any(su):
-            pending[~su].to_csv("pending_" + ACCESS_FILE, index=False)
+        pending_access = pending.select(user=user)
+        if pending_access:
+            for record in pending_access:
+                pending.delete(user, record.group, record.location)
             message = f"removed {user} from pending without setting permissions"
-            _log(message)
-            _git_update(message)
-    return False
+            _log(
+                message,
+                action="revoke",
+                user=user,
+                location=_get_locations().get(location, location) if location else None,
+            )
+            return (False, message)
+    return (False, "")
 
 
+@_in_project
 def check_access(
     user: "Union[str, None]" = None,
     location: "Union[str, None]" = None,
@@ -397,6 +767,9 @@ def check_access(
     pull: bool = True,
     reapply: bool = True,
     verbose: bool = True,
+    full: bool = False,
+    jobs: int = 1,
+    as_owner: bool = False,
 ) -> "tuple[pandas.DataFrame, pandas.DataFrame]":
     """
     List and confirm access for a given user, location, and/or group, or all current and pending access.
@@ -407,83 +780,104 @@ def check_access(
         group (str): Group to check access for.
         pull (bool): If `False`, will not pull the remote before checking access.
         reapply (bool): If `False`, will not attempt to set all permissions when checking.
-        verbose (bool): If `False`, will not print subset access.
+        verbose (bool): If `False`, will not print subset access, or how many ACL reads were served from cache.
+        full (bool): If `True`, will reapply permissions to everything within each location, rather than
+            only to files that are new or have changed since the last check.
+        jobs (int): Number of locations to check at the same time.
+        as_owner (bool): If `True`, will only apply access to files owned by the current user, as listed
+            by the last scan of each location (see `owner_summary`), and print which owners still have outstanding work.
+        project (Project): Project to work within, rather than the current working directory.
 
     Returns:
         A tuple containing [0] current and [1] pending access.
     """
     if pull and GIT_PATH and exists(".git"):
         if subprocess.run([GIT_PATH, "pull"], check=False, capture_output=True).returncode != 0:
-            warnings.warn("failed to pull before checking pending", stacklevel=2)
-    access = _get_accesses()
-    pending = _get_pendings()
+            warnings.warn("failed to pull before checking pending", stacklevel=3)
+    _clear_cache()
+    _clear_acl_cache()
+    initial_stats = _cache_stats()
     if location:
         location = _get_locations().get(location, location)
-    if user:
-        access = access[access["user"] == user]
-        pending = pending[pending["user"] == user]
-    if location:
-        access = access[access["location"] == location]
-        pending = pending[pending["location"] == location]
-    if group:
-        access = access[access["group"] == group]
-        pending = pending[pending["group"] == group]
+    access = _get_store().select_indexed(user or None, group or None, location or None)
+    pending = _get_store(PENDING_FILE).select_indexed(user or None, group or None, location or None)
+    actual_permissions: "dict[tuple[str, str], Union[str, None]]" = {}
+    access_to_parents: "dict[tuple[str, str], bool]" = {}
+    default_permissions: "dict[tuple[str, str], Union[str, None]]" = {}
+    location_access: "dict[str, dict[str, AccessRecord]]" = {}
+    for record in access.values():
+        location_access.setdefault(record.location, {}).setdefault(record.user, record)
+    checked = _map_locations(
+        lambda check_location: (
+            (
+                _reapply_owned(
+                    check_location,
+                    {user: record.permissions for user, record in location_access[check_location].items()},
+                )
+                if as_owner
+                else _reapply_location(
+                    check_location,
+                    {user: record.permissions for user, record in location_access[check_location].items()},
+                    full,
+                )
+            )
+            if reapply
+            else _get_current_access(check_location)
+        ),
+        [check_location for check_location in location_access if exists(check_location)],
+        jobs,
+    )
+    for check_location, current_access in checked.items():
+        target_access = location_access[check_location]
+        parent_access = _apply_to_parents(
+            check_location, {user: record.parents for user, record in target_access.items()}, False
+        )
+        # new files inherit access from the default ACL of their directory, which is reported for inheriting locations
+        current_defaults = _get_default_acl(check_location) if _inherits(check_location) else None
+        for current_user in target_access:
+            actual_permissions[(check_location, current_user)] = current_access.get(current_user)
+            access_to_parents[(check_location, current_user)] = parent_access[current_user]
+            if current_defaults is not None:
+                default_permissions[(check_location, current_user)] = current_defaults.get(current_user)
+    access_frame = _to_frame(list(access.values()), list(access))
+    pending_frame = _to_frame(list(pending.values()), list(pending))
     if len(access):
-        access["actual_permissions"] = "None"
-        access["access_to_parents"] = False
-        for check_location in access["location"].unique():
-            if exists(check_location):
-                target_access = access[access["location"] == check_location]
-                current_access = _get_current_access(check_location)
-                for current_user in target_access["user"].unique():
-                    target_perms = target_access[target_access["user"] == current_user]
-                    if len(target_perms):
-                        current_perms = current_access.get(current_user)
-                        if reapply:
-                            res = _set_permissions(current_user, check_location, target_perms.iloc[0]["permissions"])
-                            if res.returncode == 0:
-                                current_perms = _get_current_access(check_location).get(current_user)
-                        access.loc[
-                            (access["location"] == check_location) & (access["user"] == current_user),
-                            "actual_permissions",
-                        ] = current_perms
-                        access.loc[
-                            (access["location"] == check_location) & (access["user"] == current_user),
-                            "access_to_parents",
-                        ] = _apply_to_parent(current_user, check_location, target_perms.iloc[0]["parents"], False)
+        access_frame["actual_permissions"] = [
+            actual_permissions.get((record.location, record.user), "None") for record in access.values()
+        ]
+        access_frame["access_to_parents"] = [
+            access_to_parents.get((record.location, record.user), False) for record in access.values()
+        ]
+        if default_permissions:
+            access_frame["default_permissions"] = [
+                default_permissions.get((record.location, record.user), "None") for record in access.values()
+            ]
     if verbose:
         if len(access):
             print("current access:\n")
-            print(access.to_string())
+            print(access_frame.to_string())
         if len(pending):
             print("\npending access:\n")
-            print(pending.to_string())
+            print(pending_frame.to_string())
         if len(access) == 0 and len(pending) == 0:
             print("no access not found")
-    return (access, pending)
-
-
+        stats = _cache_stats()
+        hits = stats["hits"] - initial_stats["hits"]
+        misses = stats["misses"] - initial_stats["misses"]
+        if hits or misses:
+            print(f"\nread {hits + misses} ACLs: {hits} from cache, {misses} from the filesystem")
+        if as_owner:
+            print()
+            owner_summary(location)
+    return (access_frame, pending_frame)
+
+
+@_measured("get_current_access")
 def _get_current_access(location: str) -> "dict[str, str]":
-    if GETFACL_PATH:
-        if not exists(location):
-            return {}
-        current = subprocess.run([GETFACL_PATH, "-ac", location], check=False, capture_output=True)
-        if current.returncode != 0:
-            msg = f"failed to check current access: {current.stderr.decode('utf-8')}"
-            raise RuntimeError(msg)
-        access = current.stdout.decode("utf-8")
-        if re.search("Not Supported", access):
-            msg = "ACLs are not supported on this platform"
-            raise RuntimeError(msg)
-        current_users: "dict[str, str]" = {}
-        for entry in access.split("\n"):
-            entry_parts = entry.split(":")
-            if len(entry_parts) > 2 and entry_parts[1]:
-                current_users[entry_parts[1]] = entry_parts[2]
-        return current_users
-    else:
-        msg = "`getfacl` command not found"
-        raise RuntimeError(msg)
+    if ACL_BACKEND:
+        return _get_principal_acl(location)
+    msg = "`getfacl` command not found"
+    raise RuntimeError(msg)
 
 
 def _perms_match(current: str, target: str):
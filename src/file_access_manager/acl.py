@@ -0,0 +1,487 @@
+"""Read and write POSIX Access Control Lists."""
+
+import errno
+import os
+import re
+import struct
+import subprocess
+import threading
+from collections import deque
+from shutil import which
+from typing import TYPE_CHECKING, Union
+
+from file_access_manager.users import (
+    GROUP_PREFIX,
+    USER_LOOKUP,
+    _get_gid,
+    _get_group_name,
+    _get_uid,
+    _get_user_name,
+    _is_group,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+SETFACL_PATH = which("setfacl")
+GETFACL_PATH = which("getfacl")
+
+ACCESS_XATTR = "system.posix_acl_access"
+DEFAULT_XATTR = "system.posix_acl_default"
+ACL_VERSION = 2
+ACL_UNDEFINED_ID = 0xFFFFFFFF
+ACL_USER_OBJ = 0x01
+ACL_USER = 0x02
+ACL_GROUP_OBJ = 0x04
+ACL_GROUP = 0x08
+ACL_MASK = 0x10
+ACL_OTHER = 0x20
+_HEADER = struct.Struct("<I")
+_ENTRY = struct.Struct("<HHI")
+_TAG_NAMES = {"u": ACL_USER, "user": ACL_USER, "g": ACL_GROUP, "group": ACL_GROUP}
+_UNSUPPORTED = {errno.ENOTSUP, errno.EOPNOTSUPP}
+
+
+def _select_backend() -> "Union[str, None]":
+    requested = os.environ.get("FILE_ACCESS_MANAGER_ACL_BACKEND", "").lower()
+    # native entries need user IDs
+    native = hasattr(os, "setxattr") and USER_LOOKUP == "pwd"
+    if requested == "subprocess" and SETFACL_PATH and GETFACL_PATH:
+        return "subprocess"
+    if native:
+        return "native"
+    if SETFACL_PATH and GETFACL_PATH:
+        return "subprocess"
+    return None
+
+
+ACL_BACKEND = _select_backend()
+
+# parsed ACLs by absolute path, with the inode and change time they were read at (as ACL changes
+# update the change time, entries are only reused while unchanged); writes through this module also drop them,
+# and the cache is cleared at the start of each run, so long-running processes do not keep every path read
+_ACL_CACHE: "dict[str, tuple[tuple[int, int], list[tuple[str, str, str]]]]" = {}
+CACHE_STATS = {"hits": 0, "misses": 0}
+_CACHE_LOCK = threading.Lock()
+
+
+def _perm_bits(perms: str) -> int:
+    return (4 if "r" in perms else 0) | (2 if "w" in perms else 0) | (1 if "x" in perms else 0)
+
+
+def _perm_string(bits: int) -> str:
+    return ("r" if bits & 4 else "-") + ("w" if bits & 2 else "-") + ("x" if bits & 1 else "-")
+
+
+def _decode_acl(data: bytes) -> "list[tuple[int, int, int]]":
+    if len(data) < _HEADER.size or (len(data) - _HEADER.size) % _ENTRY.size:
+        msg = "malformed ACL"
+        raise ValueError(msg)
+    if _HEADER.unpack_from(data)[0] != ACL_VERSION:
+        msg = "unsupported ACL version"
+        raise ValueError(msg)
+    return list(_ENTRY.iter_unpack(data[_HEADER.size :]))
+
+
+def _encode_acl(entries: "list[tuple[int, int, int]]") -> bytes:
+    return _HEADER.pack(ACL_VERSION) + b"".join(_ENTRY.pack(*entry) for entry in sorted(entries, key=_entry_key))
+
+
+def _entry_key(entry: "tuple[int, int, int]"):
+    return (entry[0], entry[2])
+
+
+def _entries_from_mode(mode: int) -> "list[tuple[int, int, int]]":
+    return [
+        (ACL_USER_OBJ, (mode >> 6) & 7, ACL_UNDEFINED_ID),
+        (ACL_GROUP_OBJ, (mode >> 3) & 7, ACL_UNDEFINED_ID),
+        (ACL_OTHER, mode & 7, ACL_UNDEFINED_ID),
+    ]
+
+
+def _read_entries(path: str, default: bool = False) -> "list[tuple[int, int, int]]":
+    try:
+        return _decode_acl(os.getxattr(path, DEFAULT_XATTR if default else ACCESS_XATTR))
+    except OSError as e:
+        if e.errno != errno.ENODATA:
+            raise
+    return [] if default else _entries_from_mode(os.stat(path).st_mode)
+
+
+def _with_mask(entries: "list[tuple[int, int, int]]") -> "list[tuple[int, int, int]]":
+    # like setfacl, the mask is recalculated to cover every named and group entry
+    masked = [entry for entry in entries if entry[0] != ACL_MASK]
+    if any(entry[0] in (ACL_USER, ACL_GROUP) for entry in masked):
+        mask = 0
+        for tag, perm, _ in masked:
+            if tag in (ACL_USER, ACL_GROUP, ACL_GROUP_OBJ):
+                mask |= perm
+        masked.append((ACL_MASK, mask, ACL_UNDEFINED_ID))
+    return masked
+
+
+def _write_entries(path: str, entries: "list[tuple[int, int, int]]", default: bool = False):
+    if default and not any(entry[0] in (ACL_USER, ACL_GROUP) for entry in entries):
+        try:
+            os.removexattr(path, DEFAULT_XATTR)
+        except OSError as e:
+            if e.errno != errno.ENODATA:
+                raise
+        _invalidate(path)
+        return
+    os.setxattr(path, DEFAULT_XATTR if default else ACCESS_XATTR, _encode_acl(_with_mask(entries)))
+    _invalidate(path)
+
+
+def _resolve_id(tag: int, name: str) -> "Union[int, None]":
+    if name.isdigit():
+        return int(name)
+    return _get_uid(name) if tag == ACL_USER else _get_gid(name)
+
+
+def _resolve_name(tag: int, qualifier: int) -> str:
+    return _get_user_name(qualifier) if tag == ACL_USER else _get_group_name(qualifier)
+
+
+def _parse_spec(spec: str, remove: bool = False) -> "tuple[int, int, int]":
+    parts = spec.split(":")
+    if len(parts) != (2 if remove else 3) or parts[0] not in _TAG_NAMES or not parts[1]:
+        msg = f"invalid ACL entry: {spec}"
+        raise ValueError(msg)
+    tag = _TAG_NAMES[parts[0]]
+    qualifier = _resolve_id(tag, parts[1])
+    if qualifier is None:
+        msg = f"invalid ACL entry: {spec} ({parts[1]} does not exist)"
+        raise ValueError(msg)
+    return (tag, 0 if remove else _perm_bits(parts[2]), qualifier)
+
+
+def _update_entries(current: "list[tuple[int, int, int]]", changes: "list[tuple[int, int, int]]", remove: bool = False):
+    updated = {(tag, qualifier): perm for tag, perm, qualifier in current}
+    for tag, perm, qualifier in changes:
+        if remove:
+            updated.pop((tag, qualifier), None)
+        else:
+            updated[(tag, qualifier)] = perm
+    return [(tag, perm, qualifier) for (tag, qualifier), perm in updated.items()]
+
+
+def _apply_native(
+    path: str, changes: "list[tuple[int, int, int]]", remove: bool = False, default: bool = False
+) -> "Union[str, None]":
+    try:
+        current = _read_entries(path)
+        updated = _update_entries(current, changes, remove)
+        if sorted(_with_mask(updated), key=_entry_key) != sorted(current, key=_entry_key):
+            _write_entries(path, updated)
+        if default:
+            current_default = _read_entries(path, True)
+            if current_default or not remove:
+                # like setfacl, a new default ACL starts from the owner, group, and other entries of the access ACL
+                base = current_default or [
+                    entry for entry in updated if entry[0] in (ACL_USER_OBJ, ACL_GROUP_OBJ, ACL_OTHER)
+                ]
+                updated_default = _update_entries(base, changes, remove)
+                if sorted(_with_mask(updated_default), key=_entry_key) != sorted(current_default, key=_entry_key):
+                    _write_entries(path, updated_default, True)
+    except OSError as e:
+        return f"setfacl: {path}: {e.strerror}"
+    return None
+
+
+def _apply_if_changed(
+    path: str,
+    changes: "list[tuple[int, int, int]]",
+    known: "dict[str, list[int]]",
+    updates: "Union[list[tuple[int, int, int]], None]" = None,
+    stat: "Union[os.stat_result, None]" = None,
+) -> "tuple[Union[str, None], Union[list[int], None]]":
+    try:
+        if stat is None:
+            stat = os.stat(path, follow_symlinks=False)
+        record = [stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns]
+        apply = changes if known.get(path) != record else updates
+        if apply:
+            error = _apply_native(path, apply)
+            if error:
+                return (error, None)
+            stat = os.stat(path, follow_symlinks=False)
+            record = [stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns]
+    except OSError as e:
+        return (f"setfacl: {path}: {e.strerror}", None)
+    return (None, record)
+
+
+def _apply_directory(
+    path: str,
+    changes: "list[tuple[int, int, int]]",
+    remove: bool = False,
+    known: "Union[dict[str, list[int]], None]" = None,
+    updates: "Union[list[tuple[int, int, int]], None]" = None,
+    default: bool = False,
+) -> "tuple[list[str], list[str], dict[str, list[int]]]":
+    directories: "list[str]" = []
+    errors: "list[str]" = []
+    records: "dict[str, list[int]]" = {}
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_symlink():
+                    continue
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if is_dir:
+                    directories.append(entry.path)
+                if known is None:
+                    error = _apply_native(entry.path, changes, remove, default and is_dir)
+                else:
+                    error, record = _apply_if_changed(
+                        entry.path, changes, known, updates, entry.stat(follow_symlinks=False)
+                    )
+                    if record:
+                        records[entry.path] = record
+                if error:
+                    errors.append(error)
+    except OSError as e:
+        errors.append(f"setfacl: {path}: {e.strerror}")
+    return (directories, errors, records)
+
+
+def _apply_tree(
+    path: str,
+    changes: "list[tuple[int, int, int]]",
+    remove: bool = False,
+    workers: int = 1,
+    worker_type: str = "thread",
+    known: "Union[dict[str, list[int]], None]" = None,
+    updates: "Union[list[tuple[int, int, int]], None]" = None,
+    records: "Union[dict[str, list[int]], None]" = None,
+    default: bool = False,
+) -> "list[str]":
+    errors: "list[str]" = []
+    queue = deque([path])
+    if records is None:
+        records = {}
+    if workers <= 1:
+        while queue:
+            directories, directory_errors, directory_records = _apply_directory(
+                queue.pop(), changes, remove, known, updates, default
+            )
+            queue.extend(directories)
+            errors += directory_errors
+            records.update(directory_records)
+        return errors
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+    # the record of known files is shared rather than copied to each process
+    executor_type = ProcessPoolExecutor if worker_type == "process" and known is None else ThreadPoolExecutor
+    if executor_type is ProcessPoolExecutor:
+        # writes within other processes cannot invalidate this process's cache
+        _invalidate(path, True)
+    with executor_type(max_workers=workers) as executor:
+        running: "set[Future]" = set()
+        while queue or running:
+            while queue and len(running) < workers * 4:
+                running.add(
+                    executor.submit(_apply_directory, queue.popleft(), changes, remove, known, updates, default)
+                )
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                directories, directory_errors, directory_records = future.result()
+                queue.extend(directories)
+                errors += directory_errors
+                records.update(directory_records)
+    return errors
+
+
+def _modify_acl(
+    path: str,
+    specs: "list[str]",
+    recursive: bool = True,
+    remove: bool = False,
+    workers: int = 1,
+    worker_type: str = "thread",
+    default: bool = False,
+) -> "subprocess.CompletedProcess[bytes]":
+    # with `default`, entries are also set in (or removed from) the default ACL of directories,
+    # so new files and directories within them inherit those entries
+    if ACL_BACKEND == "native":
+        args = ["native", "-x" if remove else "-m", ",".join(specs), path]
+        try:
+            changes = [_parse_spec(spec, remove) for spec in specs]
+        except ValueError as e:
+            return subprocess.CompletedProcess(args, 2, b"", f"setfacl: {e}\n".encode())
+        is_dir = os.path.isdir(path) and not os.path.islink(path)
+        error = _apply_native(path, changes, remove, default and is_dir)
+        if error and SETFACL_PATH and _is_unsupported(path):
+            return _modify_subprocess(path, specs, recursive, remove, default)
+        errors = [error] if error else []
+        if recursive and is_dir:
+            errors += _apply_tree(path, changes, remove, workers, worker_type, default=default)
+        return subprocess.CompletedProcess(args, 1 if errors else 0, b"", "".join(e + "\n" for e in errors).encode())
+    return _modify_subprocess(path, specs, recursive, remove, default)
+
+
+def _modify_subprocess(path: str, specs: "list[str]", recursive: bool, remove: bool, default: bool = False):
+    if not SETFACL_PATH:
+        msg = "`setfacl` command not found"
+        raise RuntimeError(msg)
+    flag = ("-R" if recursive else "-") + ("x" if remove else "m")
+    if default and os.path.isdir(path):
+        # when recursive, setfacl only sets default entries on directories
+        specs = specs + ["d:" + spec for spec in specs]
+    res = subprocess.run([SETFACL_PATH, flag, ",".join(specs), path], check=False, capture_output=True)
+    _invalidate(path, recursive)
+    return res
+
+
+def _apply_defaults(path: str, changes: "list[tuple[int, int, int]]") -> "list[str]":
+    # contents of directories whose default ACL already has the entries inherited them when created,
+    # so only directories are read, and entries are only applied within directories whose default ACL differs
+    errors: "list[str]" = []
+    queue = deque([path])
+    while queue:
+        directory = queue.pop()
+        try:
+            current = {(tag, qualifier): perm for tag, perm, qualifier in _read_entries(directory, True)}
+            matches = all(current.get((tag, qualifier)) == perm for tag, perm, qualifier in changes)
+            if not matches:
+                error = _apply_native(directory, changes, default=True)
+                if error:
+                    errors.append(error)
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_symlink():
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        queue.append(entry.path)
+                    elif not matches:
+                        error = _apply_native(entry.path, changes)
+                        if error:
+                            errors.append(error)
+        except OSError as e:
+            errors.append(f"setfacl: {directory}: {e.strerror}")
+    return errors
+
+
+def _is_unsupported(path: str):
+    try:
+        os.getxattr(path, ACCESS_XATTR)
+    except OSError as e:
+        return e.errno in _UNSUPPORTED
+    return False
+
+
+def _get_acl(path: str, kind: "Union[str, None]" = None) -> "dict[str, str]":
+    return {name: perms for entry_kind, name, perms in _cached_acl(path) if not kind or entry_kind == kind[0]}
+
+
+def _get_principal_acl(path: str) -> "dict[str, str]":
+    # entries keyed as access records name them: users by name, and groups as `g:<group>`
+    return {(GROUP_PREFIX + name if kind == "g" else name): perms for kind, name, perms in _cached_acl(path)}
+
+
+def _principal_spec(principal: str, perms: str = "") -> str:
+    spec = principal if _is_group(principal) else f"u:{principal}"
+    return f"{spec}:{perms}" if perms else spec
+
+
+def _cached_acl(path: str) -> "list[tuple[str, str, str]]":
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return []
+    key = os.path.abspath(path)
+    version = (stat.st_ino, stat.st_ctime_ns)
+    cached = _ACL_CACHE.get(key)
+    hit = bool(cached and cached[0] == version)
+    # locations may be checked from several threads at once
+    with _CACHE_LOCK:
+        CACHE_STATS["hits" if hit else "misses"] += 1
+    if cached and hit:
+        entries = cached[1]
+    else:
+        entries = _read_acl(path)
+        _ACL_CACHE[key] = (version, entries)
+    return entries
+
+
+def _read_acl(path: str) -> "list[tuple[str, str, str]]":
+    if ACL_BACKEND == "native":
+        try:
+            entries = _read_entries(path)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                msg = f"failed to check current access: {e}"
+                raise RuntimeError(msg) from None
+            if not GETFACL_PATH:
+                msg = "ACLs are not supported on this platform"
+                raise RuntimeError(msg) from None
+        else:
+            return [
+                ("u" if tag == ACL_USER else "g", _resolve_name(tag, qualifier), _perm_string(perm))
+                for tag, perm, qualifier in entries
+                if tag in (ACL_USER, ACL_GROUP)
+            ]
+    return _get_acl_subprocess(path)
+
+
+def _get_default_acl(path: str) -> "dict[str, str]":
+    if ACL_BACKEND == "native" and not _is_unsupported(path):
+        try:
+            entries = _read_entries(path, True)
+        except OSError:
+            return {}
+        return {
+            (GROUP_PREFIX if tag == ACL_GROUP else "") + _resolve_name(tag, qualifier): _perm_string(perm)
+            for tag, perm, qualifier in entries
+            if tag in (ACL_USER, ACL_GROUP)
+        }
+    try:
+        return {
+            (GROUP_PREFIX if kind == "g" else "") + name: perms
+            for kind, name, perms in _get_acl_subprocess(path, True)
+            if kind in ("u", "g")
+        }
+    except RuntimeError:
+        return {}
+
+
+def _get_acl_subprocess(path: str, default: bool = False) -> "list[tuple[str, str, str]]":
+    if not GETFACL_PATH:
+        msg = "`getfacl` command not found"
+        raise RuntimeError(msg)
+    current = subprocess.run([GETFACL_PATH, "-dc" if default else "-ac", path], check=False, capture_output=True)
+    if current.returncode != 0:
+        msg = f"failed to check current access: {current.stderr.decode('utf-8')}"
+        raise RuntimeError(msg)
+    access = current.stdout.decode("utf-8")
+    if re.search("Not Supported", access):
+        msg = "ACLs are not supported on this platform"
+        raise RuntimeError(msg)
+    entries: "list[tuple[str, str, str]]" = []
+    for entry in access.split("\n"):
+        entry_parts = entry.split(":")
+        if len(entry_parts) > 2 and entry_parts[1]:
+            entries.append((entry_parts[0][0], entry_parts[1], entry_parts[2]))
+    return entries
+
+
+def _invalidate(path: str, recursive: bool = False):
+    key = os.path.abspath(path)
+    _ACL_CACHE.pop(key, None)
+    if recursive:
+        prefix = key.rstrip(os.sep) + os.sep
+        for cached in [cached for cached in list(_ACL_CACHE) if cached.startswith(prefix)]:
+            _ACL_CACHE.pop(cached, None)
+
+
+def _cache_stats() -> "dict[str, int]":
+    with _CACHE_LOCK:
+        return dict(CACHE_STATS)
+
+
+def _clear_acl_cache():
+    _ACL_CACHE.clear()
+    with _CACHE_LOCK:
+        CACHE_STATS["hits"] = 0
+        CACHE_STATS["misses"] = 0
@@ -2,10 +2,50 @@
 
 import argparse
 import sys
+from typing import Union
 
-from file_access_manager.access import check_access, check_pending, revoke_permissions, set_permission
-from file_access_manager.locations import add_location, list_locations, remove_location
-from file_access_manager.project import init_manager_project, set_options
+
+def _metrics_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", action="store_true", help="print how long each part of the command took")
+    parser.add_argument(
+        "--metrics-file",
+        dest="metrics_file",
+        help="file to write run metrics to, as JSON, or in Prometheus text format if it ends in .prom",
+    )
+    return parser
+
+
+def _run(*calls: "tuple[str, dict]", profile: bool = False, metrics_file: "Union[str, None]" = None) -> list:
+    from file_access_manager.metrics import _report, _start, _stop
+    from file_access_manager.server import _call, _forward
+
+    measure = profile or bool(metrics_file)
+    response = _forward(list(calls), metrics=measure)
+    if response is None:
+        if measure:
+            _start(calls[0][0])
+        succeeded = False
+        try:
+            if len(calls) == 1:
+                results = [_call(*calls[0])]
+            else:
+                from file_access_manager.project import git_session
+
+                with git_session():
+                    results = [_call(command, kwargs) for command, kwargs in calls]
+            succeeded = True
+        finally:
+            _report(_stop(succeeded), profile, metrics_file)
+        return results
+    # sent to a running server (see `manage-access serve`)
+    print(response["output"], end="")
+    for message in response["warnings"]:
+        print(f"warning: {message}", file=sys.stderr)
+    _report(response.get("metrics", {}), profile, metrics_file)
+    if response["error"]:
+        raise RuntimeError(response["error"])
+    return response["results"]
 
 
 def main():
@@ -19,6 +59,13 @@ def main():
                     "manage-access locations",
                     "manage-access check",
                     "manage-access pending",
+                    "manage-access batch",
+                    "manage-access plan",
+                    "manage-access apply",
+                    "manage-access serve",
+                    "manage-access log",
+                    "manage-access watch",
+                    "manage-access owners",
                     "manage-access config",
                     "manage-access init\n",
                 ]
@@ -30,13 +77,29 @@ def main():
         parser.add_argument("name", nargs="?", help="name of the location")
         parser.add_argument("path", nargs="?", help="path to be named")
         parser.add_argument("-r", "--remove", dest="remove", help="name to be removed")
+        inherit = parser.add_mutually_exclusive_group()
+        inherit.add_argument(
+            "--inherit",
+            dest="inherit",
+            action="store_true",
+            default=None,
+            help="set default ACL entries within the location, so new files inherit access",
+        )
+        inherit.add_argument(
+            "--no-inherit",
+            dest="inherit",
+            action="store_false",
+            help="do not set default ACL entries within the location, regardless of the project's option",
+        )
         args = parser.parse_args(sys.argv[2:])
+        from file_access_manager.locations import add_location, list_locations, remove_location
+
         if args.remove:
             remove_location(args.remove)
         elif not args.name:
             list_locations()
         elif args.path:
-            add_location(args.name, args.path)
+            add_location(args.name, args.path, inherit=args.inherit)
         else:
             parser.print_help()
     elif possible_function == "init":
@@ -46,6 +109,8 @@ def main():
         parser.add_argument("-r", "--remote", dest="remote", help="git remote")
         parser.add_argument("-b", "--branch", dest="branch", default="main", help="git branch")
         args = parser.parse_args(sys.argv[2:])
+        from file_access_manager.project import init_manager_project
+
         init_manager_project(args.base_dir, allow_dirs=args.allow_dirs, git_remote=args.remote, git_branch=args.branch)
     elif possible_function == "config":
         parser = argparse.ArgumentParser(
@@ -72,11 +137,111 @@ def main():
             default=None,
             help="defer access setting to a separate process",
         )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            dest="workers",
+            type=int,
+            default=None,
+            help="number of workers to apply permissions within locations with",
+        )
+        parser.add_argument(
+            "-t",
+            "--worker_type",
+            dest="worker_type",
+            default=None,
+            choices=["thread", "process"],
+            help="type of worker pool to use when workers is over 1",
+        )
+        parser.add_argument(
+            "-m",
+            "--missing_user_ttl",
+            dest="missing_user_ttl",
+            type=int,
+            default=None,
+            help="seconds before a user found not to exist is looked up again",
+        )
+        parser.add_argument(
+            "-s",
+            "--store",
+            dest="store",
+            default=None,
+            choices=["csv", "sqlite"],
+            help="where access records are kept while working with them",
+        )
+        parser.add_argument(
+            "-i",
+            "--inherit",
+            dest="inherit",
+            default=None,
+            help="set default ACL entries within locations, so new files inherit access",
+        )
+        parser.add_argument(
+            "--log_max_size",
+            dest="log_max_size",
+            type=int,
+            default=None,
+            help="size in bytes at which the log is compressed and started again (0 to disable)",
+        )
+        parser.add_argument(
+            "--log_max_age",
+            dest="log_max_age",
+            type=int,
+            default=None,
+            help="days after its first entry at which the log is compressed and started again (0 to disable)",
+        )
+        parser.add_argument(
+            "--pending_backoff",
+            dest="pending_backoff",
+            type=int,
+            default=None,
+            help="seconds before a failed pending entry is attempted again, doubling with each attempt",
+        )
+        parser.add_argument(
+            "--pending_max_backoff",
+            dest="pending_max_backoff",
+            type=int,
+            default=None,
+            help="longest wait in seconds between attempts of a pending entry",
+        )
+        parser.add_argument(
+            "--pending_expiry",
+            dest="pending_expiry",
+            type=int,
+            default=None,
+            help="days after which pending entries that have not succeeded are removed (0 to keep them)",
+        )
+        parser.add_argument(
+            "--lock_timeout",
+            dest="lock_timeout",
+            type=int,
+            default=None,
+            help="seconds to wait for other processes to release records or locations (0 to wait until released)",
+        )
         args = parser.parse_args(sys.argv[2:])
-        set_options(auto_commit=args.auto_commit, auto_push=args.auto_push, defer=args.defer)
+        from file_access_manager.project import set_options
+
+        set_options(
+            auto_commit=args.auto_commit,
+            auto_push=args.auto_push,
+            defer=args.defer,
+            workers=args.workers,
+            worker_type=args.worker_type,
+            missing_user_ttl=args.missing_user_ttl,
+            store=args.store,
+            inherit=args.inherit,
+            log_max_size=args.log_max_size,
+            log_max_age=args.log_max_age,
+            pending_backoff=args.pending_backoff,
+            pending_max_backoff=args.pending_max_backoff,
+            pending_expiry=args.pending_expiry,
+            lock_timeout=args.lock_timeout,
+        )
     elif possible_function == "pending":
         parser = argparse.ArgumentParser(
-            "manage-access pending", description="Check pending users, and apply permissions if they now exist."
+            "manage-access pending",
+            description="Check pending users, and apply permissions if they now exist.",
+            parents=[_metrics_parser()],
         )
         parser.add_argument(
             "-i", "--no-pull", dest="pull", action="store_true", help="do not git pull before checking pending"
@@ -95,11 +260,171 @@ def main():
             action="store_true",
             help="do not update pending and access files",
         )
+        parser.add_argument(
+            "-j", "--jobs", dest="jobs", type=int, default=1, help="number of locations to apply access to at once"
+        )
+        parser.add_argument(
+            "-r",
+            "--report",
+            dest="report",
+            action="store_true",
+            help="list entries that have been attempted for a while, rather than processing pending",
+        )
+        parser.add_argument(
+            "-s",
+            "--stuck",
+            dest="stuck",
+            type=float,
+            default=7,
+            help="days since the first attempt after which entries are reported",
+        )
+        args = parser.parse_args(sys.argv[2:])
+        if args.report:
+            from file_access_manager.pending import pending_report
+
+            pending_report(args.stuck)
+        else:
+            _run(
+                ("pending", {"pull": not args.pull, "push": args.push, "update": not args.update, "jobs": args.jobs}),
+                profile=args.profile,
+                metrics_file=args.metrics_file,
+            )
+    elif possible_function == "batch":
+        parser = argparse.ArgumentParser(
+            "manage-access batch",
+            description="Grant access from a file of grants, with a single commit.",
+            parents=[_metrics_parser()],
+        )
+        parser.add_argument(
+            "file",
+            help="CSV or JSON Lines (.jsonl) file with location, user, and optionally group, permissions,"
+            " and parents for each grant",
+        )
+        args = parser.parse_args(sys.argv[2:])
+        result = _run(("batch", {"grants": args.file}), profile=args.profile, metrics_file=args.metrics_file)[0]
+        print(f"granted: {len(result['granted'])}, pending: {len(result['pending'])}, failed: {len(result['failed'])}")
+    elif possible_function == "plan":
+        parser = argparse.ArgumentParser(
+            "manage-access plan",
+            description="Compare recorded access with the access actually set on each location and its parents"
+            " (not on the files within locations; use manage-access check --full to reapply access within them).",
+            parents=[_metrics_parser()],
+        )
+        parser.add_argument("user", nargs="?", help="name of a user to plan access for")
+        parser.add_argument("-l", "--location", dest="location", help="name or path of a location to plan access for")
+        parser.add_argument("-o", "--output", dest="output", help="JSON file to write the plan to")
+        parser.add_argument("-j", "--json", dest="json", action="store_true", help="print the plan as JSON")
+        args = parser.parse_args(sys.argv[2:])
+        plan = _run(
+            ("plan", {"user": args.user, "location": args.location, "output": args.output, "verbose": not args.json}),
+            profile=args.profile,
+            metrics_file=args.metrics_file,
+        )[0]
+        if args.json:
+            import json
+
+            print(json.dumps(plan, indent=2))
+    elif possible_function == "apply":
+        parser = argparse.ArgumentParser(
+            "manage-access apply",
+            description="Apply only the changes needed to match recorded access.",
+            parents=[_metrics_parser()],
+        )
+        parser.add_argument("plan", nargs="?", help="JSON file with a plan written by manage-access plan")
+        parser.add_argument("-u", "--user", dest="user", help="name of a user to apply access for")
+        parser.add_argument("-l", "--location", dest="location", help="name or path of a location to apply access for")
+        args = parser.parse_args(sys.argv[2:])
+        _run(
+            ("apply", {"plan": args.plan, "user": args.user, "location": args.location}),
+            profile=args.profile,
+            metrics_file=args.metrics_file,
+        )
+    elif possible_function == "serve":
+        parser = argparse.ArgumentParser(
+            "manage-access serve",
+            description="Keep the project loaded, and process manage-access commands sent to it one at a time.",
+        )
+        parser.add_argument("-s", "--socket", dest="socket", default=None, help="path to the socket to listen on")
+        parser.add_argument("--stop", dest="stop", action="store_true", help="stop a running server")
+        args = parser.parse_args(sys.argv[2:])
+        from file_access_manager.project import SOCKET_FILE
+        from file_access_manager.server import _send, serve
+
+        if args.stop:
+            response = _send(args.socket or SOCKET_FILE, {"stop": True})
+            print(response["output"].rstrip() if response else "server is not running")
+        else:
+            serve(args.socket or SOCKET_FILE)
+    elif possible_function == "log":
+        parser = argparse.ArgumentParser("manage-access log", description="Find logged changes to access.")
+        parser.add_argument("user", nargs="?", help="name of a user to find changes for")
+        parser.add_argument("-l", "--location", dest="location", help="name or path of a location to find changes to")
+        parser.add_argument(
+            "-a", "--action", dest="action", help="type of change to find (grant, pending, revoke, failed, or apply)"
+        )
+        parser.add_argument("-d", "--days", dest="days", type=int, help="number of days back to find changes from")
+        parser.add_argument("-s", "--since", dest="since", help="date (YYYY-MM-DD) or time to find changes from")
+        parser.add_argument("-u", "--until", dest="until", help="date (YYYY-MM-DD) or time to find changes up to")
+        parser.add_argument("-j", "--json", dest="json", action="store_true", help="print entries as JSON")
+        args = parser.parse_args(sys.argv[2:])
+        from file_access_manager.log import query_log
+
+        entries = query_log(
+            args.user,
+            location=args.location,
+            action=args.action,
+            since=args.since,
+            until=args.until,
+            days=args.days,
+            verbose=not args.json,
+        )
+        if args.json:
+            import json
+
+            print(json.dumps(entries, indent=2))
+    elif possible_function == "owners":
+        parser = argparse.ArgumentParser(
+            "manage-access owners", description="Show which owners still need to apply access to their files."
+        )
+        parser.add_argument("-l", "--location", dest="location", help="name or path of a location to summarize")
+        parser.add_argument(
+            "-s", "--scan", dest="scan", action="store_true", help="scan locations for file owners first"
+        )
+        args = parser.parse_args(sys.argv[2:])
+        from file_access_manager.owners import owner_summary
+
+        owner_summary(args.location, args.scan)
+    elif possible_function == "watch":
+        parser = argparse.ArgumentParser(
+            "manage-access watch",
+            description="Apply recorded access to files and directories as they are added to locations (Linux only).",
+        )
+        parser.add_argument(
+            "-d",
+            "--delay",
+            dest="delay",
+            type=float,
+            default=1.0,
+            help="seconds to wait for more new files before applying",
+        )
+        parser.add_argument(
+            "-r",
+            "--reconcile",
+            dest="reconcile",
+            type=float,
+            default=3600,
+            help="seconds between full checks of all access (0 to disable)",
+        )
+        parser.add_argument("-q", "--quiet", dest="quiet", action="store_true", help="do not print applied paths")
         args = parser.parse_args(sys.argv[2:])
-        check_pending(not args.pull, args.push, not args.update)
+        from file_access_manager.watch import watch
+
+        watch(args.delay, args.reconcile, not args.quiet)
     elif possible_function == "check":
         parser = argparse.ArgumentParser(
-            "manage-access check", description="Check pending users, and apply permissions if they now exist."
+            "manage-access check",
+            description="Check pending users, and apply permissions if they now exist.",
+            parents=[_metrics_parser()],
         )
         parser.add_argument("user", nargs="?", help="name of a user to check access for")
         parser.add_argument("-l", "--location", dest="location", help="name or path of a location to check access to")
@@ -114,15 +439,50 @@ def main():
         parser.add_argument(
             "-a", "--no-reapply", dest="reapply", action="store_true", help="disable application during check"
         )
+        parser.add_argument(
+            "-f",
+            "--full",
+            dest="full",
+            action="store_true",
+            help="reapply to everything, rather than only to new or changed files",
+        )
+        parser.add_argument(
+            "-j", "--jobs", dest="jobs", type=int, default=1, help="number of locations to check at once"
+        )
+        parser.add_argument(
+            "-o",
+            "--as-owner",
+            dest="as_owner",
+            action="store_true",
+            help="only apply access to files you own, and show which owners still have outstanding work",
+        )
         args = parser.parse_args(sys.argv[2:])
-        check_access(args.user, args.location, args.group, not args.pull, not args.reapply)
+        _run(
+            (
+                "check",
+                {
+                    "user": args.user,
+                    "location": args.location,
+                    "group": args.group,
+                    "pull": not args.pull,
+                    "reapply": not args.reapply,
+                    "full": args.full,
+                    "jobs": args.jobs,
+                    "as_owner": args.as_owner,
+                },
+            ),
+            profile=args.profile,
+            metrics_file=args.metrics_file,
+        )
     else:
-        parser = argparse.ArgumentParser("manage-access", description="Manage access.")
+        parser = argparse.ArgumentParser("manage-access", description="Manage access.", parents=[_metrics_parser()])
         parser.add_argument("location", nargs="?", help="path, or name of a location")
-        parser.add_argument("user", nargs="?", help="name of the user to grant access to")
+        parser.add_argument(
+            "user", nargs="?", help="name of the user to grant access to, or g:<group> to grant access to a group"
+        )
         parser.add_argument("group", nargs="?", help="group to assign the user to")
         parser.add_argument("-p", "--perms", default="rx", dest="permissions", help="permissions to set to the user")
-        parser.add_argument("-r", "--remove", dest="remove", help="user to revoke access from")
+        parser.add_argument("-r", "--remove", dest="remove", nargs="+", help="user(s) to revoke access from")
         parser.add_argument(
             "-n",
             "--parents",
@@ -133,14 +493,25 @@ def main():
         )
         args = parser.parse_args(sys.argv[1:])
         if args.remove:
-            revoke_permissions(args.remove, args.location)
+            _run(
+                *[("revoke", {"user": user, "location": args.location}) for user in args.remove],
+                profile=args.profile,
+                metrics_file=args.metrics_file,
+            )
         elif args.user and args.location:
-            set_permission(
-                location=args.location,
-                user=args.user,
-                group=args.group,
-                permissions=args.permissions,
-                parents=args.parents,
+            _run(
+                (
+                    "grant",
+                    {
+                        "location": args.location,
+                        "user": args.user,
+                        "group": args.group,
+                        "permissions": args.permissions,
+                        "parents": args.parents,
+                    },
+                ),
+                profile=args.profile,
+                metrics_file=args.metrics_file,
             )
         else:
             msg = "specify at least a user and location"
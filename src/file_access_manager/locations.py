@@ -1,71 +1,121 @@
 """Manage named locations."""
 
-import json
 import warnings
 from os.path import exists
+from typing import Union
 
-from file_access_manager.project import LOCATIONS_FILE, _check_for_project, _git_update
+from file_access_manager.project import (
+    LOCATIONS_FILE,
+    _check_for_project,
+    _current_project,
+    _git_update,
+    _in_project,
+    _read_json,
+    _write_json,
+)
 
+RESERVED_NAMES = [
+    "locations",
+    "init",
+    "check",
+    "pending",
+    "config",
+    "batch",
+    "plan",
+    "apply",
+    "serve",
+    "log",
+    "watch",
+    "owners",
+]
 
+
+@_in_project
 def list_locations():
     """
     View named locations.
+
+    Args:
+        project (Project): Project to work within, rather than the current working directory.
     """
-    locations = _get_locations()
+    locations = _get_location_entries()
     if len(locations):
         message = "Named locations:"
-        for name, path in locations.items():
-            message += f"\n  - {name}: {path}"
+        for name, entry in locations.items():
+            if isinstance(entry, dict):
+                inherit = entry.get("inherit")
+                message += f"\n  - {name}: {entry['path']}" + (
+                    "" if inherit is None else " (inherits access)" if inherit else " (does not inherit access)"
+                )
+            else:
+                message += f"\n  - {name}: {entry}"
     else:
         message = "No named locations on record."
     print(message)
     return message
 
 
-def add_location(name: str, path: str):
+@_in_project
+def add_location(name: str, path: str, inherit: "Union[bool, None]" = None):
     """
     Add a named location.
 
     Args:
         name (str): Name to assign to the location.
         path (str): Path of the location.
+        inherit (bool): If `True`, default ACL entries are also set on directories within the location, so new files
+            and directories inherit access; if `False`, they are not; if `None`, the project's `inherit` option applies.
+        project (Project): Project to work within, rather than the current working directory.
     """
-    locations = _get_locations()
-    if name in locations and path == locations[name]:
+    locations = _get_location_entries()
+    entry: "Union[str, dict]" = path if inherit is None else {"path": path, "inherit": inherit}
+    if name in locations and entry == locations[name]:
         return
-    if name in ["locations", "init", "check", "pending", "config"]:
-        msg = "location name cannot match function names: locations, init, check, pending, or config"
+    if name in RESERVED_NAMES:
+        msg = (
+            "location name cannot match function names: "
+            + ", ".join(RESERVED_NAMES[:-1])
+            + f", or {RESERVED_NAMES[-1]}"
+        )
         raise ValueError(msg)
     if not exists(path):
-        warnings.warn(f"{path} does not exist", stacklevel=2)
+        warnings.warn(f"{path} does not exist", stacklevel=3)
     action = "edited" if name in locations else "created"
-    message = f"{action} named location: {name} = {path}"
-    locations[name] = path
-    with open(LOCATIONS_FILE, "w", encoding="utf-8") as opened:
-        json.dump(locations, opened, indent=2, sort_keys=True)
+    message = f"{action} named location: {name} = {path}" + (
+        "" if inherit is None else " (inherits access)" if inherit else " (does not inherit access)"
+    )
+    locations[name] = entry
+    _write_json(LOCATIONS_FILE, locations)
     print(message)
     _git_update(message)
 
 
+@_in_project
 def remove_location(name: str):
     """
     Remove a named location.
 
     Args:
         name (str): Name of the location to remove.
+        project (Project): Project to work within, rather than the current working directory.
     """
-    locations = _get_locations()
+    locations = _get_location_entries()
     if name in locations:
-        print(f"removed named location `{name}`")
+        message = f"removed named location `{name}`"
+        print(message)
         locations.pop(name)
-        with open(LOCATIONS_FILE, "w", encoding="utf-8") as opened:
-            json.dump(locations, opened, indent=2, sort_keys=True)
+        _write_json(LOCATIONS_FILE, locations)
+        _git_update(message)
     else:
         print(f"`{name}` is not a named location")
 
 
-def _get_locations():
+def _get_location_entries() -> "dict[str, Union[str, dict]]":
+    # paths, or objects with a path and location-specific settings, by name
+    _check_for_project(LOCATIONS_FILE)
+    return _read_json(LOCATIONS_FILE)
+
+
+def _get_locations() -> "dict[str, str]":
     _check_for_project(LOCATIONS_FILE)
-    with open(LOCATIONS_FILE, encoding="utf-8") as opened:
-        locations = json.load(opened)
-    return locations
+    return _current_project().locations
@@ -0,0 +1,113 @@
+"""Lock project records and locations, so separate processes can work within a project at the same time."""
+
+import errno
+import hashlib
+import json
+import os
+import socket
+import threading
+import warnings
+from contextlib import contextmanager
+from os.path import abspath, join
+from time import monotonic, sleep, time
+from typing import Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # no cov
+    fcntl = None  # type: ignore[assignment]
+
+from file_access_manager.project import LOCK_DIR, _get_config
+
+RECORDS_LOCK = "records"
+PENDING_LOCK = "pending"
+
+# locks are held by a thread, so threads of the same process wait on each other before taking the file lock
+_THREAD_LOCKS: "dict[str, threading.RLock]" = {}
+_HELD: "dict[str, int]" = {}
+_THREAD_LOCKS_LOCK = threading.Lock()
+
+
+@contextmanager
+def _lock(name: str, blocking: bool = True) -> "Iterator[bool]":
+    # yields whether the lock was acquired, which is only `False` when not `blocking`
+    file = abspath(join(LOCK_DIR, name + ".lock"))
+    with _THREAD_LOCKS_LOCK:
+        thread_lock = _THREAD_LOCKS.setdefault(file, threading.RLock())
+    if not thread_lock.acquire(blocking):
+        yield False
+        return
+    try:
+        if file in _HELD:
+            # already held by this thread
+            yield True
+            return
+        fd = _acquire(file, name, blocking)
+        if fd is None:
+            yield False
+            return
+        _HELD[file] = fd
+        try:
+            yield True
+        finally:
+            _HELD.pop(file)
+            _release(fd)
+    finally:
+        thread_lock.release()
+
+
+def _location_lock(path: str, blocking: bool = True):
+    return _lock("location-" + hashlib.sha1(abspath(path).encode("utf-8")).hexdigest(), blocking)
+
+
+def _acquire(file: str, name: str, blocking: bool) -> "Union[int, None]":
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    fd = os.open(file, os.O_RDWR | os.O_CREAT, 0o666)
+    if fcntl is not None:
+        timeout = _get_config()["lock_timeout"]
+        start = monotonic()
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError as e:
+                if e.errno in (errno.ENOLCK, errno.ENOTSUP, errno.EOPNOTSUPP):
+                    warnings.warn(f"files cannot be locked in {LOCK_DIR}, so the {name} lock is not held", stacklevel=4)
+                    break
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EACCES):
+                    os.close(fd)
+                    raise
+            if not blocking or (timeout and monotonic() - start >= timeout):
+                holder = _read_holder(fd)
+                os.close(fd)
+                if not blocking:
+                    return None
+                msg = f"timed out waiting for the {name} lock, held by {holder or 'another process'}"
+                raise RuntimeError(msg)
+            sleep(0.05)
+    # holders are cleared on release, so one left in an unlocked file is from a process that exited while holding it
+    holder = _read_holder(fd)
+    if holder:
+        warnings.warn(f"cleared a stale {name} lock left by {holder}", stacklevel=4)
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, json.dumps({"pid": os.getpid(), "host": socket.gethostname(), "time": time()}).encode(), 0)
+    return fd
+
+
+def _release(fd: int):
+    try:
+        os.ftruncate(fd, 0)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _read_holder(fd: int) -> str:
+    try:
+        holder = json.loads(os.pread(fd, 4096, 0) or b"null")
+    except ValueError:
+        return ""
+    if not isinstance(holder, dict):
+        return ""
+    return f"process {holder.get('pid')} on {holder.get('host')}"
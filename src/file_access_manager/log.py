@@ -0,0 +1,269 @@
+"""Record and query a structured log of access changes."""
+
+import atexit
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from os.path import exists, join
+from typing import Union
+
+from file_access_manager.metrics import _count_written, _measured
+from file_access_manager.project import (
+    LOG_DIR,
+    LOG_FILE,
+    LOG_INDEX_FILE,
+    _check_for_project,
+    _file_version,
+    _get_config,
+    _in_project,
+    _track,
+)
+
+_LOG_LOCK = threading.Lock()
+# entries logged since the last flush, by project directory, written together at the end of a run
+_BUFFER: "dict[str, list[str]]" = {}
+
+
+@_in_project
+def query_log(
+    user: "Union[str, None]" = None,
+    location: "Union[str, None]" = None,
+    action: "Union[str, None]" = None,
+    since: "Union[str, None]" = None,
+    until: "Union[str, None]" = None,
+    days: "Union[int, None]" = None,
+    verbose: bool = True,
+) -> "list[dict[str, str]]":
+    """
+    Find logged changes to access.
+
+    Only log files that may contain matching entries (by user, location, and date range, according to
+    the `.log_index.json` index) are read.
+
+    Args:
+        user (str): Name of a user to find entries for (as the user or the group).
+        location (str): Name or path of a location to find entries within.
+        action (str): Type of entry to find (e.g., `grant`, `pending`, `revoke`, `failed`, or `apply`).
+        since (str): Date or date and time (in ISO 8601 format; UTC if no time zone is included)
+            from which to find entries.
+        until (str): Date or date and time to find entries up to, including all of that date if only a date is given.
+        days (int): Number of days back from now to find entries from; overrides `since`.
+        verbose (bool): If `False`, will not print entries.
+        project (Project): Project to work within, rather than the current working directory.
+
+    Returns:
+        A list of entries, each a dictionary with `time` (UTC), `message`, and, where relevant, `action`,
+            `user`, `group`, and `location`.
+
+    Examples:
+        >>> file_access_manager.query_log("user1", days=90)
+    """
+    _check_for_project(LOG_FILE)
+    _flush_log()
+    if location:
+        from file_access_manager.locations import _get_locations
+
+        location = _get_locations().get(location, location).rstrip("/\\")
+    if days is not None:
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat(timespec="seconds")
+    start = _parse_time(since) if since else ""
+    end = _parse_time(until, len(until) == 10) if until else ""
+    entries: "list[dict[str, str]]" = []
+    for segment, summary in sorted(_load_index().items(), key=lambda item: item[1]["start"]):
+        if (
+            (start and summary["end"] < start)
+            or (end and summary["start"] >= end)
+            or (user and user not in summary["users"])
+            or (location and not any(_within(path, location) for path in summary["locations"]))
+        ):
+            continue
+        for entry in _read_segment(segment):
+            if (
+                (not start or entry["time"] >= start)
+                and (not end or entry["time"] < end)
+                and (not user or user in (entry.get("user"), entry.get("group")))
+                and (not location or _within(entry.get("location", ""), location))
+                and (not action or entry.get("action") == action)
+            ):
+                entries.append(entry)
+    entries.sort(key=lambda entry: entry["time"])
+    if verbose:
+        print("\n".join(f"{entry['time']}: {entry['message']}" for entry in entries) or "no matching log entries")
+    return entries
+
+
+def _log(message: str, write: bool = True, **fields: "Union[str, None]"):
+    if write:
+        entry = {"time": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        entry.update({name: value for name, value in fields.items() if value})
+        entry["message"] = message
+        with _LOG_LOCK:
+            _BUFFER.setdefault(os.getcwd(), []).append(json.dumps(entry) + "\n")
+    else:
+        print(message)
+
+
+@_measured("write_log")
+def _flush_log():
+    with _LOG_LOCK:
+        buffered = _BUFFER.pop(os.getcwd(), None)
+        if not buffered:
+            return
+        lines = "".join(buffered)
+        config = _get_config()
+        if exists(LOG_FILE) and _should_rotate(config["log_max_size"], config["log_max_age"]):
+            _rotate()
+        previous = _file_version(LOG_FILE) if exists(LOG_FILE) else None
+        _track(LOG_FILE)
+        with open(LOG_FILE, "a", encoding="utf-8") as opened:
+            opened.write(lines)
+        _count_written(len(lines.encode("utf-8")))
+        _update_index(previous, [json.loads(line) for line in lines.splitlines()])
+
+
+def _discard_log():
+    with _LOG_LOCK:
+        _BUFFER.pop(os.getcwd(), None)
+
+
+def _flush_all():
+    initial_dir = os.getcwd()
+    for directory in list(_BUFFER):
+        if exists(directory):
+            os.chdir(directory)
+            _flush_log()
+    os.chdir(initial_dir)
+
+
+def _should_rotate(max_size: int, max_age: int) -> bool:
+    size = os.path.getsize(LOG_FILE)
+    if not size:
+        return False
+    if max_size and size >= max_size:
+        return True
+    if max_age:
+        with open(LOG_FILE, encoding="utf-8") as opened:
+            first = json.loads(opened.readline())["time"]
+        return datetime.now(timezone.utc) - datetime.fromisoformat(first) > timedelta(days=max_age)
+    return False
+
+
+def _rotate():
+    with open(LOG_FILE, encoding="utf-8") as opened:
+        content = opened.read()
+    stamp = json.loads(content.split("\n", 1)[0])["time"][:19].replace("-", "").replace(":", "")
+    os.makedirs(LOG_DIR, exist_ok=True)
+    archive = join(LOG_DIR, f"log-{stamp}.jsonl.gz")
+    suffix = 1
+    while exists(archive):
+        archive = join(LOG_DIR, f"log-{stamp}-{suffix}.jsonl.gz")
+        suffix += 1
+    _track(archive)
+    with open(archive, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as compressed:
+        compressed.write(content.encode("utf-8"))
+    _track(LOG_FILE)
+    with open(LOG_FILE, "w", encoding="utf-8"):
+        pass
+    if exists(LOG_INDEX_FILE):
+        # the archive has the contents last indexed for the current log
+        index = _read_index()
+        summary = index.pop(LOG_FILE, None)
+        if summary and summary["version"][1] == len(content.encode("utf-8")):
+            summary["version"] = list(_file_version(archive))
+            index[archive] = summary
+        _write_index(index)
+
+
+def _segments() -> "list[str]":
+    archives = sorted(join(LOG_DIR, file) for file in os.listdir(LOG_DIR)) if exists(LOG_DIR) else []
+    return [file for file in archives if file.endswith(".jsonl.gz")] + ([LOG_FILE] if exists(LOG_FILE) else [])
+
+
+def _read_segment(segment: str) -> "list[dict[str, str]]":
+    if segment.endswith(".gz"):
+        with gzip.open(segment, "rt", encoding="utf-8") as opened:
+            return [json.loads(line) for line in opened if line.strip()]
+    with open(segment, encoding="utf-8") as opened:
+        return [json.loads(line) for line in opened if line.strip()]
+
+
+def _summarize(entries: "list[dict[str, str]]", summary: "Union[dict, None]" = None) -> dict:
+    if summary is None:
+        summary = {"start": "", "end": "", "users": [], "locations": []}
+    users = set(summary["users"])
+    locations = set(summary["locations"])
+    for entry in entries:
+        if not summary["start"] or entry["time"] < summary["start"]:
+            summary["start"] = entry["time"]
+        summary["end"] = max(summary["end"], entry["time"])
+        users.update(entry[name] for name in ["user", "group"] if name in entry)
+        if "location" in entry:
+            locations.add(entry["location"])
+    summary["users"] = sorted(users)
+    summary["locations"] = sorted(locations)
+    return summary
+
+
+def _read_index() -> dict:
+    try:
+        with open(LOG_INDEX_FILE, encoding="utf-8") as opened:
+            return json.load(opened)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(index: dict):
+    with open(LOG_INDEX_FILE + ".tmp", "w", encoding="utf-8") as opened:
+        json.dump(index, opened)
+    os.replace(LOG_INDEX_FILE + ".tmp", LOG_INDEX_FILE)
+
+
+def _load_index() -> dict:
+    # segments are only read again if they have changed since they were indexed (e.g., after a pull)
+    index = _read_index()
+    segments = _segments()
+    changed = set(index) != set(segments)
+    index = {segment: summary for segment, summary in index.items() if segment in segments}
+    for segment in segments:
+        version = list(_file_version(segment))
+        if segment not in index or index[segment]["version"] != version:
+            index[segment] = _summarize(_read_segment(segment))
+            index[segment]["version"] = version
+            changed = True
+    if changed:
+        _write_index(index)
+    return index
+
+
+def _update_index(previous: "Union[tuple[int, int], None]", entries: "list[dict[str, str]]"):
+    if not exists(LOG_INDEX_FILE):
+        return
+    index = _read_index()
+    summary = index.get(LOG_FILE)
+    if previous is None:
+        summary = _summarize([])
+    elif summary is None or summary["version"] != list(previous):
+        # left to be indexed in full when next queried
+        return
+    index[LOG_FILE] = _summarize(entries, summary)
+    index[LOG_FILE]["version"] = list(_file_version(LOG_FILE))
+    _write_index(index)
+
+
+def _parse_time(time: str, end_of_day: bool = False) -> str:
+    parsed = datetime.fromisoformat(time)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end_of_day:
+        parsed += timedelta(days=1)
+    return parsed.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
+def _within(path: str, location: str) -> bool:
+    return path == location or path.startswith(location + "/")
+
+
+# entries logged by actions that do not commit are written when the process exits
+atexit.register(_flush_all)
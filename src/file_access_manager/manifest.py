@@ -0,0 +1,92 @@
+"""Track files within locations, so access is only reapplied to what has changed."""
+
+import hashlib
+import json
+import os
+import subprocess
+from os.path import abspath, exists, isdir, islink, join
+
+from file_access_manager.acl import (
+    ACL_BACKEND,
+    SETFACL_PATH,
+    _apply_defaults,
+    _apply_if_changed,
+    _apply_tree,
+    _is_unsupported,
+    _modify_acl,
+    _parse_spec,
+    _principal_spec,
+)
+from file_access_manager.metrics import _count_written
+from file_access_manager.project import MANIFEST_DIR
+
+
+def _manifest_file(location: str):
+    return join(MANIFEST_DIR, hashlib.sha1(abspath(location).encode("utf-8")).hexdigest() + ".json")
+
+
+def _get_manifest(location: str) -> dict:
+    file = _manifest_file(location)
+    if exists(file):
+        try:
+            with open(file, encoding="utf-8") as opened:
+                return json.load(opened)
+        except ValueError:
+            pass
+    return {}
+
+
+def _write_manifest(location: str, manifest: dict):
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    file = _manifest_file(location)
+    with open(file + ".tmp", "w", encoding="utf-8") as opened:
+        json.dump({"location": abspath(location), **manifest}, opened)
+        _count_written(opened.tell())
+    os.replace(file + ".tmp", file)
+
+
+def _apply_incremental(
+    location: str, access: "dict[str, str]", full: bool = False, workers: int = 1, worker_type: str = "thread"
+) -> "subprocess.CompletedProcess[bytes]":
+    specs = [_principal_spec(user, perms) for user, perms in sorted(access.items())]
+    if ACL_BACKEND != "native":
+        return _modify_acl(location, specs, True, False, workers, worker_type)
+    manifest = {} if full else _get_manifest(location)
+    previous = manifest.get("access", {})
+    args = ["native", "-m", ",".join(specs), location]
+    try:
+        changes = [_parse_spec(spec) for spec in specs]
+        updates = [
+            _parse_spec(_principal_spec(user, perms)) for user, perms in access.items() if previous.get(user) != perms
+        ]
+    except ValueError as e:
+        return subprocess.CompletedProcess(args, 2, b"", f"setfacl: {e}\n".encode())
+    known: "dict[str, list[int]]" = manifest.get("files", {})
+    records: "dict[str, list[int]]" = {}
+    error, record = _apply_if_changed(location, changes, known, updates)
+    if error and SETFACL_PATH and _is_unsupported(location):
+        return _modify_acl(location, specs, True, False, workers, worker_type)
+    errors = [error] if error else []
+    if record:
+        records[location] = record
+    if isdir(location) and not islink(location):
+        errors += _apply_tree(location, changes, False, workers, worker_type, known, updates, records)
+    # files that failed have no record, so they will receive all entries on the next pass
+    _write_manifest(location, {"access": access, "files": records})
+    return subprocess.CompletedProcess(args, 1 if errors else 0, b"", "".join(e + "\n" for e in errors).encode())
+
+
+def _apply_inherited(
+    location: str, access: "dict[str, str]", full: bool = False, workers: int = 1, worker_type: str = "thread"
+) -> "subprocess.CompletedProcess[bytes]":
+    # files inherit access from the default ACL of their directory, so only directories are checked
+    specs = [_principal_spec(user, perms) for user, perms in sorted(access.items())]
+    if full or ACL_BACKEND != "native" or not isdir(location) or _is_unsupported(location):
+        return _modify_acl(location, specs, True, False, workers, worker_type, True)
+    args = ["native", "-m", ",".join(specs), location]
+    try:
+        changes = [_parse_spec(spec) for spec in specs]
+    except ValueError as e:
+        return subprocess.CompletedProcess(args, 2, b"", f"setfacl: {e}\n".encode())
+    errors = _apply_defaults(location, changes)
+    return subprocess.CompletedProcess(args, 1 if errors else 0, b"", "".join(e + "\n" for e in errors).encode())
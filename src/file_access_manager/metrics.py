@@ -0,0 +1,217 @@
+"""Measure where time is spent within a run."""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter, time
+from typing import Any, Callable, Iterator, Union
+
+# upper bounds (in seconds) of latency histogram buckets, after which is an unbounded bucket
+BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0]
+
+_LOCK = threading.Lock()
+_METRICS: "Union[dict, None]" = None
+_HOOKED = False
+
+
+def _start(command: str):
+    global _METRICS, _HOOKED  # noqa: PLW0603
+    _METRICS = {
+        "command": command,
+        "started": time(),
+        "start": perf_counter(),
+        "operations": {},
+        "subprocesses": {},
+        "bytes_written": 0,
+    }
+    # subprocess launches can only be seen from Python 3.8
+    if not _HOOKED and hasattr(sys, "addaudithook"):
+        sys.addaudithook(_count_subprocess)
+        _HOOKED = True
+
+
+def _stop(succeeded: bool = True) -> dict:
+    global _METRICS  # noqa: PLW0603
+    if _METRICS is None:
+        return {}
+    metrics = _METRICS
+    _METRICS = None
+    start = metrics.pop("start")
+    metrics["duration"] = perf_counter() - start
+    metrics["succeeded"] = succeeded
+    metrics["failures"] = sum(operation["failures"] for operation in metrics["operations"].values())
+    return metrics
+
+
+def _failed_process(result: "subprocess.CompletedProcess") -> int:
+    return int(result.returncode != 0)
+
+
+def _failed_users(result: "dict[str, bool]") -> int:
+    return sum(not succeeded for succeeded in result.values())
+
+
+def _measured(name: str, failures: "Union[Callable[[Any], int], None]" = None):
+    def decorate(function: "Callable") -> "Callable":
+        @wraps(function)
+        def measured(*args, **kwargs):
+            if _METRICS is None:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            failed = 1
+            try:
+                result = function(*args, **kwargs)
+                failed = failures(result) if failures else 0
+            finally:
+                _record(name, perf_counter() - start, failed)
+            return result
+
+        return measured
+
+    return decorate
+
+
+@contextmanager
+def _measure(name: str) -> "Iterator[None]":
+    if _METRICS is None:
+        yield
+        return
+    start = perf_counter()
+    failed = 1
+    try:
+        yield
+        failed = 0
+    finally:
+        _record(name, perf_counter() - start, failed)
+
+
+def _record(name: str, seconds: float, failed: int = 0):
+    with _LOCK:
+        if _METRICS is None:
+            return
+        if name not in _METRICS["operations"]:
+            _METRICS["operations"][name] = {
+                "calls": 0,
+                "seconds": 0.0,
+                "max": 0.0,
+                "failures": 0,
+                "buckets": [0] * (len(BUCKETS) + 1),
+            }
+        operation = _METRICS["operations"][name]
+        operation["calls"] += 1
+        operation["seconds"] += seconds
+        operation["max"] = max(operation["max"], seconds)
+        operation["failures"] += failed
+        operation["buckets"][next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))] += 1
+
+
+def _count_written(size: int):
+    if _METRICS is not None:
+        with _LOCK:
+            _METRICS["bytes_written"] += size
+
+
+def _count_subprocess(event: str, args: tuple):
+    if event == "subprocess.Popen" and _METRICS is not None:
+        command = os.path.basename(str(args[1][0] if isinstance(args[1], (list, tuple)) else args[1]).split(" ")[0])
+        with _LOCK:
+            _METRICS["subprocesses"][command] = _METRICS["subprocesses"].get(command, 0) + 1
+
+
+def _report(metrics: dict, profile: bool = False, metrics_file: "Union[str, None]" = None):
+    if not metrics:
+        return
+    if profile:
+        print(_summary(metrics), file=sys.stderr)
+    if metrics_file:
+        _write_metrics(metrics, metrics_file)
+
+
+def _summary(metrics: dict) -> str:
+    lines = [f"{metrics['command']} took {metrics['duration']:.3f} seconds", ""]
+    lines.append(f"{'operation':<20} {'calls':>7} {'total (s)':>10} {'mean (ms)':>10} {'max (ms)':>10} {'failed':>7}")
+    for name, operation in sorted(metrics["operations"].items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(
+            f"{name:<20} {operation['calls']:>7} {operation['seconds']:>10.3f}"
+            f" {operation['seconds'] / operation['calls'] * 1000:>10.2f} {operation['max'] * 1000:>10.2f}"
+            f" {operation['failures']:>7}"
+        )
+    subprocesses = ", ".join(f"{command}: {count}" for command, count in sorted(metrics["subprocesses"].items()))
+    lines.append("")
+    lines.append(
+        f"subprocesses: {sum(metrics['subprocesses'].values())}" + (f" ({subprocesses})" if subprocesses else "")
+    )
+    lines.append(f"bytes written: {metrics['bytes_written']}")
+    return "\n".join(lines)
+
+
+def _write_metrics(metrics: dict, file: str):
+    with open(file + ".tmp", "w", encoding="utf-8") as opened:
+        if file.endswith(".prom"):
+            opened.write(_prometheus(metrics))
+        else:
+            json.dump(metrics, opened, indent=2)
+    # replaced at once, so a collector never reads a partial file
+    os.replace(file + ".tmp", file)
+
+
+def _prometheus(metrics: dict) -> str:
+    prefix = "file_access_manager_"
+    command = f'command="{metrics["command"]}"'
+    lines = []
+
+    def add(name: str, kind: str, description: str, values: "list[tuple[str, Union[int, float]]]"):
+        lines.append(f"# HELP {prefix}{name} {description}")
+        lines.append(f"# TYPE {prefix}{name} {kind}")
+        lines.extend(f"{prefix}{name}{{{labels}}} {value}" for labels, value in values)
+
+    add("run_duration_seconds", "gauge", "Duration of the last run.", [(command, metrics["duration"])])
+    add("run_timestamp_seconds", "gauge", "When the last run started.", [(command, metrics["started"])])
+    add(
+        "run_succeeded", "gauge", "Whether the last run finished without error.", [(command, int(metrics["succeeded"]))]
+    )
+    add("run_failures", "gauge", "Failed operations in the last run.", [(command, metrics["failures"])])
+    add(
+        "run_bytes_written",
+        "gauge",
+        "Bytes written to project files in the last run.",
+        [(command, metrics["bytes_written"])],
+    )
+    add(
+        "run_subprocesses",
+        "gauge",
+        "Subprocesses launched in the last run.",
+        [(f'{command},subprocess="{name}"', count) for name, count in sorted(metrics["subprocesses"].items())],
+    )
+    operations = sorted(metrics["operations"].items())
+    add(
+        "operation_calls",
+        "gauge",
+        "Calls of each operation in the last run.",
+        [(f'{command},operation="{name}"', operation["calls"]) for name, operation in operations],
+    )
+    add(
+        "operation_failures",
+        "gauge",
+        "Failed calls of each operation in the last run.",
+        [(f'{command},operation="{name}"', operation["failures"]) for name, operation in operations],
+    )
+    histogram: "list[tuple[str, Union[int, float]]]" = []
+    for name, operation in operations:
+        labels = f'{command},operation="{name}"'
+        cumulative = 0
+        for bound, count in zip([*BUCKETS, "+Inf"], operation["buckets"]):
+            cumulative += count
+            histogram.append((f'{labels},le="{bound}"', cumulative))
+    lines.append(f"# HELP {prefix}operation_duration_seconds Duration of each operation call in the last run.")
+    lines.append(f"# TYPE {prefix}operation_duration_seconds histogram")
+    lines.extend(f"{prefix}operation_duration_seconds_bucket{{{labels}}} {value}" for labels, value in histogram)
+    for name, operation in operations:
+        labels = f'{command},operation="{name}"'
+        lines.append(f"{prefix}operation_duration_seconds_sum{{{labels}}} {operation['seconds']}")
+        lines.append(f"{prefix}operation_duration_seconds_count{{{labels}}} {operation['calls']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,165 @@
+"""Partition locations by the owners of their files, so each owner only applies access to what they own."""
+
+import hashlib
+import json
+import os
+import subprocess
+from collections import deque
+from os.path import abspath, exists, isdir, join
+from time import time
+from typing import Union
+
+from file_access_manager.acl import ACL_BACKEND, _apply_native, _modify_acl, _parse_spec, _principal_spec
+from file_access_manager.metrics import _count_written, _measured
+from file_access_manager.project import ACCESS_FILE, OWNERS_DIR, _check_for_project, _in_project, _inherits
+from file_access_manager.users import _get_user_name
+
+
+@_in_project
+def owner_summary(
+    location: "Union[str, None]" = None, scan: bool = False, verbose: bool = True
+) -> "dict[str, dict[str, int]]":
+    """
+    Show which owners still need to apply access to their files within locations.
+
+    Access Control Lists can only be changed by the owner of each file, so in locations with mixed ownership,
+    each owner applies access to their own files with `check_access(as_owner=True)` (`manage-access check --as-owner`).
+    This lists the owners whose files have not received their location's current access since they were last scanned.
+
+    Args:
+        location (str): Name or path of a location to summarize; all locations with recorded access if not specified.
+        scan (bool): If `True`, will scan locations for the owners of their files first, rather than using
+            the last scan (locations that have not been scanned are always scanned).
+        verbose (bool): If `False`, will not print the summary.
+        project (Project): Project to work within, rather than the current working directory.
+
+    Returns:
+        A dictionary with an entry for each owner with outstanding work, containing the number of their paths
+        waiting for access within each location.
+
+    Examples:
+        >>> file_access_manager.owner_summary(scan=True)
+    """
+    from file_access_manager.locations import _get_locations
+    from file_access_manager.store import _get_store
+
+    _check_for_project(ACCESS_FILE)
+    if location:
+        location = _get_locations().get(location, location).rstrip("\\/")
+    location_access: "dict[str, dict[str, str]]" = {}
+    for record in _get_store():
+        if record.permissions != "---" and (not location or record.location == location):
+            location_access.setdefault(record.location, {}).setdefault(record.user, record.permissions)
+    summary: "dict[str, dict[str, int]]" = {}
+    for path, access in sorted(location_access.items()):
+        if not exists(path):
+            continue
+        owners = _get_owners(path, scan)["owners"]
+        for uid, paths in owners.items():
+            if paths and _get_status(path, uid) != _status(access, paths):
+                summary.setdefault(_get_user_name(int(uid)), {})[path] = len(paths)
+    if verbose:
+        if summary:
+            print("owners with outstanding work:")
+            for owner, locations in sorted(summary.items()):
+                for path, count in sorted(locations.items()):
+                    print(f"  - {owner}: {count} paths in {path}")
+        else:
+            print("no outstanding work")
+    return summary
+
+
+def _owners_file(location: str, uid: str = "") -> str:
+    name = hashlib.sha1(abspath(location).encode("utf-8")).hexdigest()
+    return join(OWNERS_DIR, name + (f".{uid}" if uid else "") + ".json")
+
+
+def _read(file: str) -> dict:
+    if exists(file):
+        try:
+            with open(file, encoding="utf-8") as opened:
+                return json.load(opened)
+        except ValueError:
+            pass
+    return {}
+
+
+def _write(file: str, content: dict):
+    os.makedirs(OWNERS_DIR, exist_ok=True)
+    with open(file + ".tmp", "w", encoding="utf-8") as opened:
+        json.dump(content, opened)
+        _count_written(opened.tell())
+    os.replace(file + ".tmp", file)
+
+
+@_measured("scan_owners")
+def _scan_owners(location: str) -> dict:
+    # each path is stat'ed once, and listed (relative to the location) under the user ID of its owner
+    owners: "dict[str, list[str]]" = {}
+    root = abspath(location)
+    owners[str(os.lstat(root).st_uid)] = [""]
+    queue = deque([root])
+    while queue:
+        directory = queue.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_symlink():
+                        continue
+                    try:
+                        uid = str(entry.stat(follow_symlinks=False).st_uid)
+                    except OSError:
+                        continue
+                    owners.setdefault(uid, []).append(os.path.relpath(entry.path, root))
+                    if entry.is_dir(follow_symlinks=False):
+                        queue.append(entry.path)
+        except OSError:
+            continue
+    scan = {"location": root, "time": time(), "owners": {uid: sorted(paths) for uid, paths in owners.items()}}
+    _write(_owners_file(location), scan)
+    return scan
+
+
+def _get_owners(location: str, scan: bool = False) -> dict:
+    current = {} if scan else _read(_owners_file(location))
+    return current if current else _scan_owners(location)
+
+
+def _status(access: "dict[str, str]", paths: "list[str]") -> dict:
+    # work is done once the owner's current paths have received the location's current access
+    return {"access": access, "paths": hashlib.sha1("\n".join(paths).encode("utf-8")).hexdigest()}
+
+
+def _get_status(location: str, uid: str) -> dict:
+    status = _read(_owners_file(location, uid))
+    status.pop("time", None)
+    return status
+
+
+@_measured("apply_owned")
+def _apply_owned(location: str, access: "dict[str, str]") -> "subprocess.CompletedProcess[bytes]":
+    uid = str(os.getuid())
+    paths = _get_owners(location)["owners"].get(uid, [])
+    specs = [_principal_spec(user, perms) for user, perms in sorted(access.items())]
+    inherit = _inherits(location)
+    args = ["native" if ACL_BACKEND == "native" else "setfacl", "-m", ",".join(specs), location]
+    errors: "list[str]" = []
+    if ACL_BACKEND == "native":
+        try:
+            changes = [_parse_spec(spec) for spec in specs]
+        except ValueError as e:
+            return subprocess.CompletedProcess(args, 2, b"", f"setfacl: {e}\n".encode())
+        for path in paths:
+            full_path = join(location, path) if path else location
+            error = _apply_native(full_path, changes, default=inherit and isdir(full_path))
+            if error:
+                errors.append(error)
+    else:
+        for path in paths:
+            full_path = join(location, path) if path else location
+            res = _modify_acl(full_path, specs, False, default=inherit)
+            if res.returncode != 0:
+                errors.append(res.stderr.decode("utf-8").strip())
+    if not errors:
+        _write(_owners_file(location, uid), {"time": time(), **_status(access, paths)})
+    return subprocess.CompletedProcess(args, 1 if errors else 0, b"", "".join(e + "\n" for e in errors).encode())
@@ -0,0 +1,49 @@
+"""Index paths by their components."""
+
+from os import sep
+from os.path import abspath
+
+
+class _PathTrie:
+    """
+    Paths held by keys (e.g., users), stored by their components, so ancestors and descendants
+    of a path can be found in one walk from the root.
+    """
+
+    def __init__(self):
+        # each node is (children, keys holding that path, keys holding that path or any path within it)
+        self.root: "tuple[dict, set, set]" = ({}, set(), set())
+
+    def add(self, path: str, key: str = ""):
+        node = self.root
+        node[2].add(key)
+        for part in _parts(path):
+            node = node[0].setdefault(part, ({}, set(), set()))
+            node[2].add(key)
+        node[1].add(key)
+
+    # whether `key` holds `path`, or a directory containing it
+    def covers(self, path: str, key: str = "") -> bool:
+        node = self.root
+        if key in node[1]:
+            return True
+        for part in _parts(path):
+            if part not in node[0]:
+                return False
+            node = node[0][part]
+            if key in node[1]:
+                return True
+        return False
+
+    # whether `key` holds `path`, or a path within it
+    def contains(self, path: str, key: str = "") -> bool:
+        node = self.root
+        for part in _parts(path):
+            if part not in node[0]:
+                return False
+            node = node[0][part]
+        return key in node[2]
+
+
+def _parts(path: str) -> "list[str]":
+    return [part for part in abspath(path).split(sep) if part]
@@ -0,0 +1,108 @@
+"""Schedule attempts at pending access, backing off from entries that keep failing."""
+
+import json
+import os
+from datetime import datetime, timezone
+from os.path import exists
+from time import time
+from typing import Union
+
+from file_access_manager.metrics import _count_written
+from file_access_manager.project import ACCESS_FILE, PENDING_QUEUE_FILE, _check_for_project, _in_project
+from file_access_manager.store import AccessRecord
+
+
+@_in_project
+def pending_report(stuck: float = 7, verbose: bool = True) -> "list[dict[str, Union[str, int]]]":
+    """
+    Report pending entries that have been attempted without success for some time.
+
+    Each run of `check_pending` attempts pending entries that are due, and schedules failed entries
+    to be attempted again after a delay that doubles with each attempt (see the `pending_backoff` option).
+
+    Args:
+        stuck (float): Number of days since the first attempt after which an entry is reported.
+        verbose (bool): If `False`, will not print the report.
+        project (Project): Project to work within, rather than the current working directory.
+
+    Returns:
+        A list of entries, each with the `user`, `group`, `location`, and `permissions` of the pending record,
+        the number of `attempts`, and the times of the `first_attempt`, `last_attempt`, and `next_attempt`.
+
+    Examples:
+        >>> file_access_manager.pending_report(stuck=30)
+    """
+    from file_access_manager.project import PENDING_FILE
+    from file_access_manager.store import _get_store
+
+    _check_for_project(ACCESS_FILE)
+    queue = _get_queue()
+    now = time()
+    report: "list[dict[str, Union[str, int]]]" = []
+    for record in _get_store(PENDING_FILE):
+        state = queue.get(_queue_key(record))
+        if state and now - state["first"] >= stuck * 86400:
+            report.append(
+                {
+                    "user": record.user,
+                    "group": record.group,
+                    "location": record.location,
+                    "permissions": record.permissions,
+                    "attempts": int(state["attempts"]),
+                    "first_attempt": _format_time(state["first"]),
+                    "last_attempt": _format_time(state["last"]),
+                    "next_attempt": _format_time(state["next"]),
+                }
+            )
+    if verbose:
+        if report:
+            print(f"pending entries attempted for over {stuck:g} days:")
+            for entry in report:
+                action = f"{entry['permissions']} to {entry['location']}" if entry["permissions"] else "removal"
+                print(
+                    f"  - {entry['user']} ({action}): {entry['attempts']} attempts since {entry['first_attempt']},"
+                    f" next at {entry['next_attempt']}"
+                )
+        else:
+            print("no stuck pending entries")
+    return report
+
+
+def _queue_key(record: AccessRecord) -> str:
+    return "\t".join(record.key)
+
+
+def _get_queue() -> "dict[str, dict[str, float]]":
+    if exists(PENDING_QUEUE_FILE):
+        try:
+            with open(PENDING_QUEUE_FILE, encoding="utf-8") as opened:
+                return json.load(opened)
+        except ValueError:
+            pass
+    return {}
+
+
+def _write_queue(queue: "dict[str, dict[str, float]]"):
+    with open(PENDING_QUEUE_FILE + ".tmp", "w", encoding="utf-8") as opened:
+        json.dump(queue, opened, indent=2, sort_keys=True)
+        _count_written(opened.tell())
+    os.replace(PENDING_QUEUE_FILE + ".tmp", PENDING_QUEUE_FILE)
+
+
+def _is_due(queue: "dict[str, dict[str, float]]", record: AccessRecord, now: float) -> bool:
+    state = queue.get(_queue_key(record))
+    return state is None or state["next"] <= now
+
+
+def _attempted(queue: "dict[str, dict[str, float]]", record: AccessRecord, now: float, config: dict) -> bool:
+    # schedules the next attempt, and returns whether the entry has been pending for longer than `pending_expiry`
+    state = queue.setdefault(_queue_key(record), {"first": now, "attempts": 0})
+    state["attempts"] += 1
+    state["last"] = now
+    delay = config["pending_backoff"] * 2 ** (state["attempts"] - 1) if config["pending_backoff"] else 0
+    state["next"] = now + min(delay, config["pending_max_backoff"])
+    return bool(config["pending_expiry"]) and now - state["first"] >= config["pending_expiry"] * 86400
+
+
+def _format_time(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec="seconds")
@@ -0,0 +1,237 @@
+"""Compare recorded access with the access actually set, and apply only the differences."""
+
+import json
+import os
+from os.path import dirname, exists
+from typing import Union
+
+from file_access_manager.access import _owned_parents, _perms_match, _revoke_many, _set_permissions_many
+from file_access_manager.acl import ACL_BACKEND, _clear_acl_cache, _get_principal_acl
+from file_access_manager.locations import _get_locations
+from file_access_manager.log import _log
+from file_access_manager.project import _git_update, _in_project
+from file_access_manager.store import AccessRecord, _get_store
+from file_access_manager.users import _clear_cache, _is_group
+
+PLAN_SECTIONS = ["add", "change", "remove", "parents"]
+
+
+@_in_project
+def plan_access(
+    user: "Union[str, None]" = None,
+    location: "Union[str, None]" = None,
+    output: "Union[str, None]" = None,
+    verbose: bool = True,
+) -> "dict[str, list[dict[str, str]]]":
+    """
+    Compare recorded access with the access currently set on each location, without changing anything.
+
+    Only the entries of each location itself (and its parents) are compared, not those of the files and
+    directories within it; `check_access` (with `full=True`) reapplies recorded access within locations.
+
+    Args:
+        user (str): User to plan access for.
+        location (str): Name or path of a location to plan access for.
+        output (str): Path to a JSON file to write the plan to, which can be reviewed and passed to `apply_plan`.
+        verbose (bool): If `False`, will not print the plan.
+        project (Project): Project to work within, rather than the current working directory.
+
+    Returns:
+        A dictionary with lists of changes, each with a `location`, `user`, and `permissions` and/or `current`
+        permissions:
+            - `add`: Users with recorded access who have no entry on the location.
+            - `change`: Users whose entry on the location does not match their recorded permissions.
+            - `remove`: Users with an entry on the location but no recorded access to it (or to a location containing
+                it, or within it by parent access), or whose removal previously failed (recorded as `---`).
+            - `parents`: Users missing read and execute permission on parent directories within their parent access.
+
+    Examples:
+        >>> file_access_manager.plan_access(output="plan.json")
+    """
+    if not ACL_BACKEND:
+        msg = "`getfacl` command not found"
+        raise RuntimeError(msg)
+    _clear_cache()
+    _clear_acl_cache()
+    if location:
+        location = _get_locations().get(location, location).rstrip("\\/")
+    records = list(_get_store())
+    # group entries are only managed for groups granted access, leaving others (e.g., set by hand) as they are
+    managed_groups = {record.user for record in records if _is_group(record.user)}
+    targets: "dict[str, dict[str, str]]" = {}
+    for record in records:
+        targets.setdefault(record.location, {}).setdefault(record.user, record.permissions)
+    plan: "dict[str, list[dict[str, str]]]" = {section: [] for section in PLAN_SECTIONS}
+    for path, target in sorted(targets.items()):
+        if (location and path != location) or not exists(path):
+            continue
+        current = {
+            principal: permissions
+            for principal, permissions in _get_principal_acl(path).items()
+            if not _is_group(principal) or principal in managed_groups
+        }
+        for target_user, permissions in sorted(target.items()):
+            if (user and target_user != user) or permissions == "---":
+                continue
+            if target_user not in current:
+                plan["add"].append({"location": path, "user": target_user, "permissions": permissions})
+            elif not _perms_match(current[target_user], permissions):
+                plan["change"].append(
+                    {
+                        "location": path,
+                        "user": target_user,
+                        "permissions": permissions,
+                        "current": current[target_user],
+                    }
+                )
+        for current_user, permissions in sorted(current.items()):
+            if user and current_user != user:
+                continue
+            if not any(record.user == current_user and _covers(record, path) for record in records):
+                plan["remove"].append({"location": path, "user": current_user, "current": permissions})
+    for record in records:
+        if (
+            (user and record.user != user)
+            or (location and record.location != location)
+            or record.permissions == "---"
+            or not exists(record.location)
+        ):
+            continue
+        for parent in _owned_parents(record.location, record.parents):
+            permissions = _get_principal_acl(parent).get(record.user, "")
+            entry = {"location": parent, "user": record.user, "permissions": "rx", "current": permissions}
+            if not ("r" in permissions and "x" in permissions) and entry not in plan["parents"]:
+                plan["parents"].append(entry)
+    if output:
+        with open(output, "w", encoding="utf-8") as opened:
+            json.dump(plan, opened, indent=2)
+    if verbose:
+        _print_plan(plan)
+    return plan
+
+
+@_in_project
+def apply_plan(
+    plan: "Union[str, dict[str, list[dict[str, str]]], None]" = None,
+    user: "Union[str, None]" = None,
+    location: "Union[str, None]" = None,
+    verbose: bool = True,
+) -> "dict[str, list[dict[str, str]]]":
+    """
+    Apply only the changes needed to bring actual access in line with recorded access.
+
+    Args:
+        plan (str | dict): A plan returned from `plan_access`, or a path to one written to a JSON file;
+            if not specified, a plan will be made for `user` and `location`.
+        user (str): User to plan access for, if `plan` is not specified.
+        location (str): Name or path of a location to plan access for, if `plan` is not specified.
+        verbose (bool): If `False`, will not print the results.
+        project (Project): Project to work within, rather than the current working directory.
+
+    Returns:
+        A dictionary with lists of `applied` and `failed` changes.
+
+    Examples:
+        >>> file_access_manager.apply_plan("plan.json")
+    """
+    _clear_cache()
+    _clear_acl_cache()
+    changes: "dict[str, list[dict[str, str]]]"
+    if plan is None:
+        changes = plan_access(user, location, verbose=False)
+    elif isinstance(plan, str):
+        if not exists(plan):
+            msg = f"plan file ({plan}) does not exist"
+            raise RuntimeError(msg)
+        with open(plan, encoding="utf-8") as opened:
+            changes = json.load(opened)
+    else:
+        changes = plan
+    result: "dict[str, list[dict[str, str]]]" = {"applied": [], "failed": []}
+    updates: "dict[str, list[dict[str, str]]]" = {}
+    for entry in changes.get("add", []) + changes.get("change", []):
+        updates.setdefault(entry["location"], []).append(entry)
+    for path, entries in updates.items():
+        res = _set_permissions_many(path, {entry["user"]: entry["permissions"] for entry in entries})
+        _record(result, entries, res.returncode == 0, "set permissions to {location} for {user}: {permissions}")
+    removals: "dict[str, list[dict[str, str]]]" = {}
+    for entry in changes.get("remove", []):
+        removals.setdefault(entry["location"], []).append(entry)
+    records: "list[AccessRecord]" = []
+    if removals:
+        records = [record for record in _get_store() if record.permissions != "---"]
+    for path, entries in removals.items():
+        users = [entry["user"] for entry in entries]
+        revoked = _revoke_many(users, path)
+        # removals are recursive, so recorded access within the location is applied again
+        nested = sorted(
+            (record for record in records if record.user in users and record.location.startswith(path + os.sep)),
+            key=lambda record: len(record.location),
+        )
+        for record in nested:
+            if _set_permissions_many(record.location, {record.user: record.permissions}).returncode != 0:
+                revoked[record.user] = False
+        for entry in entries:
+            _record(
+                result,
+                [entry],
+                revoked[entry["user"]],
+                "removed unrecorded permissions from {user}: they can no longer access {location}",
+            )
+    parents: "dict[str, list[dict[str, str]]]" = {}
+    for entry in changes.get("parents", []):
+        parents.setdefault(entry["location"], []).append(entry)
+    for path, entries in parents.items():
+        res = _set_permissions_many(path, {entry["user"]: "rx" for entry in entries}, False)
+        _record(result, entries, res.returncode == 0, "set permissions to parent {location} for {user}: rx")
+    summary = ""
+    if result["applied"] or result["failed"]:
+        summary = f"applied {len(result['applied'])} changes" + (
+            f", {len(result['failed'])} failed" if result["failed"] else ""
+        )
+        _git_update(f"{summary} to match recorded access")
+    if verbose:
+        print(summary or "no changes to apply")
+    return result
+
+
+def _record(result: "dict[str, list[dict[str, str]]]", entries: "list[dict[str, str]]", success: bool, message: str):
+    for entry in entries:
+        _log(
+            message.format(**entry) if success else "failed to apply plan: " + message.format(**entry),
+            action="apply" if success else "failed",
+            user=entry["user"],
+            location=entry["location"],
+        )
+    result["applied" if success else "failed"] += entries
+
+
+def _covers(record: AccessRecord, path: str) -> bool:
+    if record.permissions == "---":
+        return False
+    if path == record.location or path.startswith(record.location + os.sep):
+        return True
+    parent = record.location
+    for _ in range(record.parents):
+        parent = dirname(parent)
+        if parent == path:
+            return True
+    return False
+
+
+def _print_plan(plan: "dict[str, list[dict[str, str]]]"):
+    if not any(plan.values()):
+        print("no changes needed")
+        return
+    for entry in plan["add"]:
+        print(f"+ {entry['user']}: {entry['permissions']} on {entry['location']}")
+    for entry in plan["change"]:
+        print(f"~ {entry['user']}: {entry['current']} -> {entry['permissions']} on {entry['location']}")
+    for entry in plan["remove"]:
+        print(f"- {entry['user']}: {entry['current']} on {entry['location']}")
+    for entry in plan["parents"]:
+        print(f"+ {entry['user']}: rx on parent {entry['location']}")
+    print(
+        f"\n{len(plan['add'])} to add, {len(plan['change'])} to change,"
+        f" {len(plan['remove'])} to remove, {len(plan['parents'])} parents to update"
+    )
@@ -1,20 +1,145 @@
 """Project initialization and management."""
 
 import json
+import os
 import subprocess
-from os import chdir, getcwd, makedirs
-from os.path import abspath, exists
+from contextlib import contextmanager
+from functools import wraps
+from os import chdir, getcwd, makedirs, sep
+from os.path import abspath, exists, join
 from pathlib import Path
 from shutil import which
-from typing import Union
+from typing import Any, Callable, Iterator, Union
 
-import pandas
+from file_access_manager.metrics import _count_written, _measured
+from file_access_manager.paths import _PathTrie
 
 ACCESS_FILE = "access.csv"
+PENDING_FILE = "pending_" + ACCESS_FILE
 ACCESS_STRUCTURE = {"user": str, "group": str, "location": str, "permissions": str, "parents": int, "date": str}
 LOCATIONS_FILE = "locations.json"
 ALLOW_DIRS_FILE = ".allowed_directories"
+MANIFEST_DIR = ".manifests"
+OWNERS_DIR = ".owners"
+LOCK_DIR = ".locks"
+MISSING_USERS_FILE = ".missing_users.json"
+PENDING_QUEUE_FILE = ".pending_queue.json"
+DATABASE_FILE = ".access.db"
+SOCKET_FILE = ".manage_access.sock"
+LOG_FILE = "log.jsonl"
+LOG_DIR = "logs"
+LOG_INDEX_FILE = ".log_index.json"
 GIT_PATH = which("git")
+CONFIG_FILE = "config.json"
+CONFIG_DEFAULTS: "dict[str, Union[bool, int, str]]" = {
+    "auto_commit": True,
+    "auto_push": False,
+    "defer": False,
+    "workers": 1,
+    "worker_type": "thread",
+    "missing_user_ttl": 0,
+    "store": "csv",
+    "inherit": False,
+    "log_max_size": 1048576,
+    "log_max_age": 0,
+    "pending_backoff": 0,
+    "pending_max_backoff": 86400,
+    "pending_expiry": 0,
+    "lock_timeout": 0,
+}
+
+# files written since the last commit, to be staged with it
+_WRITTEN: "set[str]" = set()
+# messages and original file contents collected within a `git_session`
+_SESSION: "Union[dict, None]" = None
+# contents of project files, by absolute path, with the modification time and size they were read at
+_CACHED: "dict[str, tuple[tuple[int, int], Any]]" = {}
+# projects by directory, including those created for the current working directory
+_PROJECTS: "dict[str, Project]" = {}
+
+
+class Project:
+    """
+    An access management project, with its options, named locations, and allowed directories
+    read once, and only read again when their files change.
+
+    Functions run within the current working directory by default. Pass a project to them (as `project`),
+    or use it as a context manager, to run them within that project instead.
+
+    Args:
+        base_dir (str): Path to the project's directory.
+
+    Examples:
+        >>> project = file_access_manager.Project("/path/to/access_record")
+        >>> file_access_manager.set_permission("location_name", "user1", project=project)
+        >>> with project, file_access_manager.git_session():
+        ...     file_access_manager.revoke_permissions("user1")
+    """
+
+    def __init__(self, base_dir: str = "."):
+        self.base_dir = abspath(base_dir)
+        self._entered_from: "list[str]" = []
+        _PROJECTS.setdefault(self.base_dir, self)
+
+    @property
+    def config(self) -> "dict[str, Union[bool, int, str]]":
+        try:
+            return {**CONFIG_DEFAULTS, **_load_cached(join(self.base_dir, CONFIG_FILE), _read_json)}
+        except FileNotFoundError:
+            return CONFIG_DEFAULTS.copy()
+
+    @property
+    def locations(self) -> "dict[str, str]":
+        return {
+            name: entry["path"] if isinstance(entry, dict) else entry
+            for name, entry in _load_cached(join(self.base_dir, LOCATIONS_FILE), _read_json).items()
+        }
+
+    def inherits(self, path: str) -> bool:
+        # a location's own setting overrides the project's, and a nested location's overrides its parent's
+        target = abspath(path)
+        inherit: "Union[bool, None]" = None
+        depth = -1
+        for entry in _load_cached(join(self.base_dir, LOCATIONS_FILE), _read_json).values():
+            if isinstance(entry, dict) and entry.get("inherit") is not None:
+                location = abspath(entry["path"])
+                if (target == location or target.startswith(location.rstrip(sep) + sep)) and len(location) > depth:
+                    inherit = bool(entry["inherit"])
+                    depth = len(location)
+        return bool(self.config["inherit"]) if inherit is None else inherit
+
+    def allows(self, path: str) -> bool:
+        try:
+            allowed: "Union[_PathTrie, None]" = _load_cached(join(self.base_dir, ALLOW_DIRS_FILE), _index_allowed_dirs)
+        except FileNotFoundError:
+            return True
+        return allowed is None or allowed.covers(path)
+
+    def __enter__(self) -> "Project":
+        self._entered_from.append(getcwd())
+        chdir(self.base_dir)
+        return self
+
+    def __exit__(self, *args: Any):
+        chdir(self._entered_from.pop())
+
+
+def _current_project() -> Project:
+    directory = getcwd()
+    project = _PROJECTS.get(directory)
+    return Project(directory) if project is None else project
+
+
+def _in_project(function: "Callable") -> "Callable":
+    # adds a `project` argument to run the function within
+    @wraps(function)
+    def run(*args: Any, project: "Union[Project, None]" = None, **kwargs: Any):
+        if project is None:
+            return function(*args, **kwargs)
+        with project:
+            return function(*args, **kwargs)
+
+    return run
 
 
 def init_manager_project(
@@ -61,24 +186,28 @@ def init_manager_project(
         # first-time git setup
         fresh = True
         subprocess.run([GIT_PATH, "checkout", "-b", git_branch], check=False, capture_output=True)
+        _track(".gitignore")
         with open(".gitignore", "w", encoding="utf-8") as opened:
             opened.write(".*\n!.gitignore")
-    set_options(auto_commit=auto_commit, auto_push=auto_push, defer=defer)
+    _set_options({"auto_commit": auto_commit, "auto_push": auto_push, "defer": defer})
     if locations:
         if exists(LOCATIONS_FILE):
             with open(LOCATIONS_FILE, encoding="utf-8") as opened:
                 locations = {**json.load(opened), **locations}
-        with open(LOCATIONS_FILE, "w", encoding="utf-8") as opened:
-            json.dump(locations, opened, indent=2, sort_keys=True)
+        _write_json(LOCATIONS_FILE, locations)
     elif not exists(LOCATIONS_FILE):
+        _track(LOCATIONS_FILE)
         with open(LOCATIONS_FILE, "w", encoding="utf-8") as opened:
             opened.write("{}")
-    Path.touch(Path("log.txt"), exist_ok=True)
-    if not exists(ACCESS_FILE):
-        pandas.DataFrame(columns=list(ACCESS_STRUCTURE.keys())).to_csv(ACCESS_FILE, index=False)
-    if not exists("pending_" + ACCESS_FILE):
-        pandas.DataFrame(columns=list(ACCESS_STRUCTURE.keys())).to_csv("pending_" + ACCESS_FILE, index=False)
+    _track(LOG_FILE)
+    Path.touch(Path(LOG_FILE), exist_ok=True)
+    for name in [ACCESS_FILE, PENDING_FILE]:
+        if not exists(name):
+            _track(name)
+            with open(name, "w", encoding="utf-8") as opened:
+                opened.write(",".join(ACCESS_STRUCTURE) + "\n")
     if not exists("README.md"):
+        _track("README.md")
         with open("README.md", "w", encoding="utf-8") as opened:
             opened.write(
                 "\n\n".join(
@@ -101,7 +230,8 @@ def init_manager_project(
     chdir(initial_dir)
 
 
-def set_options(**kwargs: Union[bool, str]):
+@_in_project
+def set_options(**kwargs: Union[bool, int, str, None]):
     """
     Set Project Options
 
@@ -112,43 +242,202 @@ def set_options(**kwargs: Union[bool, str]):
             - `auto_push`: If `True`, will not git push each access actions; defaults to `False`.
             - `defer`: If `True`, will always initially add users to pending without checking if they
                 exist, leaving permission setting to a separate process; defaults to `False`.
+            - `workers`: Number of workers used to apply permissions within locations; defaults to `1`.
+            - `worker_type`: Type of worker pool used when `workers` is over `1`: `thread` or `process`;
+                defaults to `thread`.
+            - `missing_user_ttl`: Number of seconds for which a user found not to exist is not looked up again;
+                defaults to `0` (always looked up).
+            - `store`: Where access records are kept while working with them: `csv` (loaded into memory), or `sqlite`
+                (an indexed database, regenerating the CSV files after changes); defaults to `csv`.
+            - `inherit`: If `True`, default ACL entries are also set on directories within locations, so new files
+                and directories inherit access when created; defaults to `False`. This can be set for individual
+                locations with `add_location`.
+            - `log_max_size`: Size in bytes at which `log.jsonl` is compressed into the `logs` directory, and started
+                again; defaults to `1048576` (1 MiB), and `0` disables rotation by size.
+            - `log_max_age`: Number of days after its first entry at which `log.jsonl` is rotated; defaults to `0`
+                (not rotated by age).
+            - `pending_backoff`: Number of seconds to wait before attempting a pending entry again after it fails,
+                doubling with each attempt; defaults to `0` (attempted on every run).
+            - `pending_max_backoff`: Longest wait in seconds between attempts of a pending entry; defaults to `86400`.
+            - `pending_expiry`: Number of days after its first attempt at which a pending entry that has not
+                succeeded is removed; defaults to `0` (kept until it succeeds).
+            - `lock_timeout`: Number of seconds to wait for another process to finish with access records
+                or a location before failing; defaults to `0` (waits until they are released).
 
     Examples:
         >>> file_access_manager.set_options(defer=True)
     """
-    file = "config.json"
+    current, changed = _set_options(kwargs)
+    if changed:
+        _git_update("set options: " + ", ".join(f"{name}={current[name]}" for name in changed))
+    return current
+
+
+def _set_options(options: "dict[str, Union[bool, int, str, None]]") -> "tuple[dict, list[str]]":
     current = _get_config()
-    for name, value in kwargs.items():
-        if name not in ["auto_commit", "auto_push", "defer"]:
+    changed: "list[str]" = []
+    for name, value in options.items():
+        if name not in CONFIG_DEFAULTS:
             msg = f"{name} is not a recognized option"
             raise RuntimeError(msg)
         if value is not None:
-            current[name] = value if isinstance(value, bool) else value.lower() == "true"
-    with open(file, "w", encoding="utf-8") as opened:
-        json.dump(current, opened, indent=2, sort_keys=True)
-    return current
+            value = _parse_option(name, value)
+            if current[name] != value:
+                current[name] = value
+                changed.append(name)
+    _write_config(current)
+    return (current, changed)
+
+
+def _write_config(config: dict):
+    _write_json(CONFIG_FILE, config)
+
+
+def _parse_option(name: str, value: "Union[bool, int, str]"):
+    default = CONFIG_DEFAULTS[name]
+    if isinstance(default, bool):
+        return value if isinstance(value, bool) else str(value).lower() == "true"
+    if isinstance(default, int):
+        return int(value)
+    value = str(value).lower()
+    if name == "worker_type" and value not in ["thread", "process"]:
+        msg = "worker_type must be `thread` or `process`"
+        raise RuntimeError(msg)
+    if name == "store" and value not in ["csv", "sqlite"]:
+        msg = "store must be `csv` or `sqlite`"
+        raise RuntimeError(msg)
+    return value
 
 
 def _get_config():
-    file = "config.json"
-    if not exists(file):
-        config = {"auto_commit": True, "auto_push": False, "defer": False}
-        with open(file, "w", encoding="utf-8") as opened:
-            json.dump(config, opened, indent=2, sort_keys=True)
+    return _current_project().config
+
+
+def _load_cached(file: str, read: "Callable[[str], Any]") -> Any:
+    # only read again if the file has changed
+    key = abspath(file)
+    version = _file_version(file)
+    cached = _CACHED.get(key)
+    if cached is None or cached[0] != version:
+        cached = (version, read(file))
+        _CACHED[key] = cached
+    return cached[1]
+
+
+def _read_json(file: str) -> Any:
+    with open(file, encoding="utf-8") as opened:
+        return json.load(opened)
+
+
+def _write_json(file: str, content: Any):
+    _track(file)
+    with open(file, "w", encoding="utf-8") as opened:
+        json.dump(content, opened, indent=2, sort_keys=True)
+    version = _file_version(file)
+    _count_written(version[1])
+    _CACHED[abspath(file)] = (version, json.loads(json.dumps(content)))
+
+
+def _file_version(file: str) -> "tuple[int, int]":
+    stat = os.stat(file)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+@contextmanager
+def git_session(push: bool = False) -> "Iterator[None]":
+    """
+    Collect the changes from all actions within the session into a single commit.
+
+    Only files written by this package are staged, and the commit is made (and pushed, if `push` is `True` or
+    the `auto_push` option is set) once the session ends. If an error is raised within the session,
+    access records, locations, options, and logs are restored to their state before the session, and nothing
+    is committed. Permissions already set on files are not reverted (see `plan_access`).
+
+    Args:
+        push (bool): If `True`, will commit and push at the end of the session (bypassing the
+            `auto_commit` and `auto_push` options).
+
+    Examples:
+        >>> with file_access_manager.git_session():
+        ...     file_access_manager.revoke_permissions("user1")
+        ...     file_access_manager.revoke_permissions("user2")
+    """
+    global _SESSION  # noqa: PLW0603
+    if _SESSION is not None:
+        # nested sessions are part of the outer session
+        yield
+        return
+    from file_access_manager.log import _discard_log, _flush_log
+
+    _flush_log()
+    _SESSION = {"messages": [], "files": {}, "push": push}
+    try:
+        yield
+    except BaseException:
+        session, _SESSION = _SESSION, None
+        _discard_log()
+        for file, content in session["files"].items():
+            if content is None:
+                if exists(file):
+                    os.remove(file)
+            else:
+                with open(file, "wb") as opened:
+                    opened.write(content)
+            _CACHED.pop(abspath(file), None)
+        _WRITTEN.difference_update(session["files"])
+        raise
+    session, _SESSION = _SESSION, None
+    messages = session["messages"]
+    if len(messages) > 1:
+        _git_update(f"{len(messages)} changes\n\n" + "\n".join("- " + message for message in messages), session["push"])
     else:
-        with open(file, encoding="utf-8") as opened:
-            config = json.load(opened)
-    return config
+        _git_update(messages[0] if messages else None, session["push"])
 
 
+def _track(file: str):
+    _WRITTEN.add(file)
+    if _SESSION is not None and file not in _SESSION["files"]:
+        if exists(file):
+            with open(file, "rb") as opened:
+                _SESSION["files"][file] = opened.read()
+        else:
+            _SESSION["files"][file] = None
+
+
+@_measured("git_update")
 def _git_update(message: Union[str, None] = None, bypass: bool = False):
+    if _SESSION is not None:
+        if message:
+            _SESSION["messages"].append(message)
+        _SESSION["push"] = _SESSION["push"] or bypass
+        return
+    from file_access_manager.locks import RECORDS_LOCK, _lock
+    from file_access_manager.log import _flush_log
+
     config = _get_config()
-    if exists(".git") and GIT_PATH:
-        if message and (config["auto_commit"] or bypass):
-            subprocess.run([GIT_PATH, "add", "-A"], check=False)
+    # the log and git index are shared with other processes
+    with _lock(RECORDS_LOCK):
+        # buffered log entries are written once per commit
+        _flush_log()
+        if exists(".git") and GIT_PATH and message and (config["auto_commit"] or bypass):
+            written = sorted(file for file in _WRITTEN if exists(file))
+            if written:
+                subprocess.run([GIT_PATH, "add", "--", *written], check=False)
             subprocess.run([GIT_PATH, "commit", "-m", message], check=False)
-        if config["auto_push"] or bypass:
-            subprocess.run([GIT_PATH, "push"], check=False)
+            _WRITTEN.clear()
+    if exists(".git") and GIT_PATH and (config["auto_push"] or bypass):
+        subprocess.run([GIT_PATH, "push"], check=False)
+
+
+def _index_allowed_dirs(file: str) -> "Union[_PathTrie, None]":
+    with open(file, encoding="utf-8") as opened:
+        allowed_dirs = [line.rstrip() for line in opened.readlines() if line.strip()]
+    if not allowed_dirs:
+        return None
+    index = _PathTrie()
+    for allowed in allowed_dirs:
+        index.add(allowed)
+    return index
 
 
 def _check_for_project(file: str):
@@ -158,15 +447,8 @@ def _check_for_project(file: str):
 
 
 def _validate_location(path: str):
-    allowed_dirs: "list[str]" = []
-    if exists(ALLOW_DIRS_FILE):
-        with open(ALLOW_DIRS_FILE, encoding="utf-8") as file:
-            for line in file.readlines():
-                allowed_dirs.append(abspath(line.rstrip()))
-    if not allowed_dirs:
-        return True
-    normed = abspath(path)
-    for allowed in allowed_dirs:
-        if normed.startswith(allowed):
-            return True
-    return False
+    return _current_project().allows(path)
+
+
+def _inherits(path: str) -> bool:
+    return _current_project().inherits(path)
@@ -0,0 +1,166 @@
+"""Serve access actions from a long-running process, over a Unix domain socket."""
+
+import io
+import json
+import os
+import queue
+import socket
+import threading
+import warnings
+from contextlib import redirect_stdout
+from importlib import import_module
+from os.path import exists
+from typing import Any, Union
+
+from file_access_manager.metrics import _start, _stop
+from file_access_manager.project import ACCESS_FILE, SOCKET_FILE, _check_for_project, git_session
+
+COMMANDS = {
+    "grant": ("access", "set_permission"),
+    "batch": ("access", "set_permissions_batch"),
+    "revoke": ("access", "revoke_permissions"),
+    "pending": ("access", "check_pending"),
+    "check": ("access", "check_access"),
+    "plan": ("plan", "plan_access"),
+    "apply": ("plan", "apply_plan"),
+}
+
+
+def serve(socket_file: str = SOCKET_FILE):
+    """
+    Keep the project loaded, and process requests from `manage-access` commands one at a time.
+
+    While running, access records, locations, options, and read ACLs are kept in memory (and reloaded if their
+    files change), and `manage-access` commands run within the project are sent to this process.
+    Only the user running the server can connect to it.
+
+    Args:
+        socket_file (str): Path to the socket to listen on, relative to the project.
+
+    Examples:
+        >>> file_access_manager.serve()
+    """
+    _check_for_project(ACCESS_FILE)
+    if exists(socket_file):
+        if _send(socket_file, {"calls": []}) is not None:
+            msg = f"a server is already running on {socket_file}"
+            raise RuntimeError(msg)
+        os.remove(socket_file)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # the socket is created without group or other permissions, so no other user can connect before it is listening
+    umask = os.umask(0o177)
+    try:
+        server.bind(socket_file)
+    finally:
+        os.umask(umask)
+    server.listen()
+    requests: "queue.Queue[tuple[dict, queue.Queue]]" = queue.Queue()
+    threading.Thread(target=_accept, args=(server, requests), daemon=True).start()
+    print(f"serving on {socket_file}")
+    try:
+        # requests are processed in turn, so only one action writes at a time
+        while True:
+            request, reply = requests.get()
+            if request.get("stop"):
+                reply.put({"results": [], "output": "stopped server\n", "warnings": [], "error": None})
+                break
+            reply.put(_handle(request))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if exists(socket_file):
+            os.remove(socket_file)
+
+
+def _accept(server: socket.socket, requests: "queue.Queue[tuple[dict, queue.Queue]]"):
+    while True:
+        try:
+            connection, _ = server.accept()
+        except OSError:
+            break
+        threading.Thread(target=_respond, args=(connection, requests), daemon=True).start()
+
+
+def _respond(connection: socket.socket, requests: "queue.Queue[tuple[dict, queue.Queue]]"):
+    with connection:
+        try:
+            request = json.loads(_receive(connection))
+        except ValueError as e:
+            response: dict = {"results": [], "output": "", "warnings": [], "error": f"invalid request: {e}"}
+        else:
+            reply: queue.Queue = queue.Queue()
+            requests.put((request, reply))
+            response = reply.get()
+        connection.sendall(json.dumps(response).encode("utf-8") + b"\n")
+
+
+def _handle(request: dict) -> dict:
+    response: dict = {"results": [], "output": "", "warnings": [], "error": None}
+    calls = request.get("calls", [])
+    if request.get("metrics") and calls:
+        _start(calls[0][0])
+    output = io.StringIO()
+    with warnings.catch_warnings(record=True) as caught, redirect_stdout(output):
+        warnings.simplefilter("always")
+        try:
+            with git_session():
+                for command, kwargs in calls:
+                    response["results"].append(_serialize(_call(command, kwargs)))
+        except Exception as e:
+            response["error"] = str(e)
+    response["metrics"] = _stop(response["error"] is None)
+    response["output"] = output.getvalue()
+    response["warnings"] = [str(warning.message) for warning in caught]
+    return response
+
+
+def _call(command: str, kwargs: dict) -> Any:
+    if command not in COMMANDS:
+        msg = f"unrecognized command: {command}"
+        raise RuntimeError(msg)
+    module, name = COMMANDS[command]
+    return getattr(import_module("file_access_manager." + module), name)(**kwargs)
+
+
+def _serialize(result: Any) -> Any:
+    if isinstance(result, (list, tuple)):
+        return [_serialize(value) for value in result]
+    if isinstance(result, dict):
+        return {key: _serialize(value) for key, value in result.items()}
+    if hasattr(result, "to_dict"):
+        return result.to_dict(orient="records")
+    return result
+
+
+def _forward(
+    calls: "list[tuple[str, dict]]", socket_file: str = SOCKET_FILE, metrics: bool = False
+) -> "Union[dict, None]":
+    if not exists(socket_file) or os.environ.get("FILE_ACCESS_MANAGER_NO_SERVER"):
+        return None
+    return _send(socket_file, {"calls": calls, "metrics": metrics})
+
+
+def _send(socket_file: str, request: dict) -> "Union[dict, None]":
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_file)
+    except OSError:
+        # not running (e.g., left over from a server that was killed)
+        client.close()
+        return None
+    with client:
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        return json.loads(_receive(client))
+
+
+def _receive(connection: socket.socket) -> str:
+    chunks: "list[bytes]" = []
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b"\n"):
+            break
+    return b"".join(chunks).decode("utf-8")
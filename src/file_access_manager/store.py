@@ -0,0 +1,368 @@
+"""Keep access records in memory."""
+
+import csv
+import os
+import re
+from dataclasses import dataclass
+from time import ctime
+from typing import TYPE_CHECKING, Iterator, Union
+
+from file_access_manager.locks import RECORDS_LOCK, _lock
+from file_access_manager.metrics import _count_written, _measure, _measured
+from file_access_manager.project import (
+    ACCESS_FILE,
+    ACCESS_STRUCTURE,
+    DATABASE_FILE,
+    _check_for_project,
+    _get_config,
+    _track,
+)
+
+if TYPE_CHECKING:
+    import sqlite3
+
+    import pandas
+
+_STORES: "dict[str, AccessStore]" = {}
+_CONNECTIONS: "dict[str, sqlite3.Connection]" = {}
+
+
+@dataclass
+class AccessRecord:
+    """A single access entry."""
+
+    __slots__ = ("date", "group", "location", "parents", "permissions", "user")
+    user: str
+    group: str
+    location: str
+    permissions: str
+    parents: int
+    date: str
+
+    @property
+    def key(self) -> "tuple[str, str, str]":
+        return (self.user, self.group, self.location)
+
+    def to_row(self) -> "list[Union[str, int]]":
+        return [self.user, self.group, self.location, self.permissions, self.parents, self.date]
+
+
+class AccessStore:
+    """
+    Access records, keyed by user, group, and location.
+
+    Records are loaded once, changed in memory, and written back to their file with `flush`.
+    If another process has written the file since it was loaded, changes are made to its current records.
+
+    Args:
+        file (str): Path to the access file (e.g., `access.csv` or `pending_access.csv`).
+    """
+
+    def __init__(self, file: str = ACCESS_FILE):
+        _check_for_project(ACCESS_FILE)
+        self.file = file
+        self.changed = False
+        # changes since the last flush, with `None` for deleted records
+        self.changes: "dict[tuple[str, str, str], Union[AccessRecord, None]]" = {}
+        self.signature = _file_signature(file)
+        with _measure("read_records"):
+            self.records: "dict[tuple[str, str, str], AccessRecord]" = {
+                record.key: record for record in _read_records(file)
+            }
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self) -> "Iterator[AccessRecord]":
+        return iter(list(self.records.values()))
+
+    def get(self, user: str, group: str, location: str) -> "Union[AccessRecord, None]":
+        """Get a single record, if it exists."""
+        return self.records.get((user, group, location))
+
+    def select(
+        self, user: "Union[str, None]" = None, group: "Union[str, None]" = None, location: "Union[str, None]" = None
+    ) -> "list[AccessRecord]":
+        """Get all records matching any specified user, group, and location."""
+        return [
+            record
+            for record in self.records.values()
+            if (user is None or record.user == user)
+            and (group is None or record.group == group)
+            and (location is None or record.location == location)
+        ]
+
+    def select_indexed(
+        self, user: "Union[str, None]" = None, group: "Union[str, None]" = None, location: "Union[str, None]" = None
+    ) -> "dict[int, AccessRecord]":
+        """Get matching records (as in `select`), keyed by their position within all sorted records."""
+        selected = {record.key for record in self.select(user, group, location)}
+        return {index: self.records[key] for index, key in enumerate(sorted(self.records)) if key in selected}
+
+    def upsert(self, user: str, group: str, location: str, permissions: str, parents: int) -> bool:
+        """Add or update a record, returning `True` if anything changed."""
+        current = self.records.get((user, group, location))
+        if current and current.permissions == permissions and current.parents == parents:
+            return False
+        record = AccessRecord(user, group, location, permissions, parents, ctime())
+        self.records[record.key] = record
+        self.changes[record.key] = record
+        self.changed = True
+        return True
+
+    def delete(self, user: str, group: str, location: str) -> bool:
+        """Remove a record, returning `True` if it existed."""
+        if self.records.pop((user, group, location), None) is None:
+            return False
+        self.changes[(user, group, location)] = None
+        self.changed = True
+        return True
+
+    def flush(self):
+        """Write records to their file, if any have changed."""
+        if self.changed:
+            with _lock(RECORDS_LOCK):
+                if _file_signature(self.file) != self.signature:
+                    self._merge()
+                _write_records(self.file, [self.records[key] for key in sorted(self.records)])
+                self.signature = _file_signature(self.file)
+            self.changes.clear()
+            self.changed = False
+
+    def _merge(self):
+        with _measure("read_records"):
+            self.records = {record.key: record for record in _read_records(self.file)}
+        for key, record in self.changes.items():
+            if record is None:
+                self.records.pop(key, None)
+            else:
+                self.records[key] = record
+
+
+class SQLiteAccessStore(AccessStore):
+    """
+    Access records kept in a SQLite database, indexed by user, group, and location.
+
+    Table names come from the access file name, and all values are passed as parameters.
+    Stores using the same database share a connection, so changes to one table do not lock the others.
+
+    The database is refreshed from the access file whenever that file has changed (e.g., after a pull),
+    and the access file is regenerated from the database, sorted by user, group, and location, with `flush`.
+
+    Args:
+        file (str): Path to the access file (e.g., `access.csv` or `pending_access.csv`).
+        database (str): Path to the database file.
+    """
+
+    def __init__(self, file: str = ACCESS_FILE, database: str = DATABASE_FILE):
+        _check_for_project(ACCESS_FILE)
+        self.file = file
+        self.changed = False
+        self.changes: "dict[tuple[str, str, str], Union[AccessRecord, None]]" = {}
+        self.table = re.sub(r"\W", "_", os.path.splitext(os.path.basename(file))[0])
+        self.connection = _connect(database)
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.table}" (user TEXT, "group" TEXT, location TEXT, permissions TEXT,'
+            ' parents INTEGER, date TEXT, PRIMARY KEY (user, "group", location))'
+        )
+        self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}_group" ON "{self.table}" ("group")')
+        self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}_location" ON "{self.table}" (location)')
+        self.connection.execute("CREATE TABLE IF NOT EXISTS sources (file TEXT PRIMARY KEY, signature TEXT)")
+        self.connection.commit()
+        self.signature = _file_signature(file)
+        recorded = self.connection.execute("SELECT signature FROM sources WHERE file = ?", (file,)).fetchone()
+        if recorded is None or recorded[0] != self.signature:
+            self._load()
+            self._record_signature()
+
+    def __len__(self):
+        return self.connection.execute(f'SELECT COUNT(*) FROM "{self.table}"').fetchone()[0]  # noqa: S608
+
+    def __iter__(self) -> "Iterator[AccessRecord]":
+        return iter(self._query())
+
+    def get(self, user: str, group: str, location: str) -> "Union[AccessRecord, None]":
+        """Get a single record, if it exists."""
+        records = self._query(user, group, location)
+        return records[0] if records else None
+
+    def select(
+        self, user: "Union[str, None]" = None, group: "Union[str, None]" = None, location: "Union[str, None]" = None
+    ) -> "list[AccessRecord]":
+        """Get all records matching any specified user, group, and location."""
+        return self._query(user, group, location)
+
+    def select_indexed(
+        self, user: "Union[str, None]" = None, group: "Union[str, None]" = None, location: "Union[str, None]" = None
+    ) -> "dict[int, AccessRecord]":
+        """Get matching records (as in `select`), keyed by their position within all sorted records."""
+        import sqlite3
+
+        if sqlite3.sqlite_version_info >= (3, 25, 0):
+            position = 'ROW_NUMBER() OVER (ORDER BY user, "group", location) - 1 AS position, '
+        else:
+            # window functions were added in SQLite 3.25, so earlier versions count the records sorted before each
+            table = f'"{self.table}"'
+            position = (
+                f"(SELECT COUNT(*) FROM {table} AS preceding WHERE preceding.user < {table}.user"  # noqa: S608
+                f' OR (preceding.user = {table}.user AND (preceding."group" < {table}."group"'
+                f' OR (preceding."group" = {table}."group" AND preceding.location < {table}.location)))) AS position, '
+            )
+        return {row[0]: AccessRecord(*row[1:]) for row in self._query(user, group, location, position)}
+
+    def upsert(self, user: str, group: str, location: str, permissions: str, parents: int) -> bool:
+        """Add or update a record, returning `True` if anything changed."""
+        current = self.get(user, group, location)
+        if current and current.permissions == permissions and current.parents == parents:
+            return False
+        record = AccessRecord(user, group, location, permissions, parents, ctime())
+        self._upsert(record)
+        self.changes[record.key] = record
+        self.changed = True
+        return True
+
+    def delete(self, user: str, group: str, location: str) -> bool:
+        """Remove a record, returning `True` if it existed."""
+        deleted = self._delete((user, group, location))
+        if deleted:
+            self.changes[(user, group, location)] = None
+            self.changed = True
+        return deleted
+
+    def flush(self):
+        """Write records to their file, if any have changed."""
+        if self.changed:
+            with _lock(RECORDS_LOCK):
+                if _file_signature(self.file) != self.signature:
+                    self._load()
+                    for key, record in self.changes.items():
+                        if record is None:
+                            self._delete(key)
+                        else:
+                            self._upsert(record)
+                _write_records(self.file, self._query())
+                self._record_signature()
+            self.changes.clear()
+            self.changed = False
+
+    def discard(self):
+        """Drop unwritten changes, by having the table reloaded from its file when next opened."""
+        if self.changed:
+            self.connection.execute("DELETE FROM sources WHERE file = ?", (self.file,))
+            self.connection.commit()
+            self.changes.clear()
+            self.changed = False
+
+    def _load(self):
+        with _measure("read_records"):
+            self.connection.execute(f'DELETE FROM "{self.table}"')  # noqa: S608
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO "{self.table}" VALUES (?, ?, ?, ?, ?, ?)',  # noqa: S608
+                (record.to_row() for record in _read_records(self.file)),
+            )
+
+    def _upsert(self, record: AccessRecord):
+        self.connection.execute(
+            f'INSERT OR REPLACE INTO "{self.table}" VALUES (?, ?, ?, ?, ?, ?)',  # noqa: S608
+            record.to_row(),
+        )
+
+    def _delete(self, key: "tuple[str, str, str]") -> bool:
+        return (
+            self.connection.execute(
+                f'DELETE FROM "{self.table}" WHERE user = ? AND "group" = ? AND location = ?',  # noqa: S608
+                key,
+            ).rowcount
+            > 0
+        )
+
+    def _query(
+        self,
+        user: "Union[str, None]" = None,
+        group: "Union[str, None]" = None,
+        location: "Union[str, None]" = None,
+        position: str = "",
+    ) -> list:
+        conditions: "list[str]" = []
+        values: "list[str]" = []
+        for column, value in [("user", user), ('"group"', group), ("location", location)]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        columns = 'user, "group", location, permissions, parents, date'
+        query = f'SELECT {position}{columns} FROM "{self.table}"'  # noqa: S608
+        if position:
+            query = f"SELECT * FROM ({query})"  # noqa: S608
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += ' ORDER BY user, "group", location'
+        rows = self.connection.execute(query, values).fetchall()
+        return rows if position else [AccessRecord(*row) for row in rows]
+
+    def _record_signature(self):
+        self.signature = _file_signature(self.file)
+        self.connection.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (self.file, self.signature))
+        self.connection.commit()
+
+
+def _get_store(file: str = ACCESS_FILE) -> AccessStore:
+    store_type = SQLiteAccessStore if _get_config()["store"] == "sqlite" else AccessStore
+    key = os.path.abspath(file)
+    store = _STORES.get(key)
+    # loaded stores are reused while their file is unchanged, and they have no unwritten changes
+    if store is None or type(store) is not store_type or store.changed or store.signature != _file_signature(file):
+        if isinstance(store, SQLiteAccessStore):
+            store.discard()
+        store = store_type(file)
+        _STORES[key] = store
+    return store
+
+
+def _connect(database: str) -> "sqlite3.Connection":
+    import sqlite3
+
+    key = os.path.abspath(database)
+    if key not in _CONNECTIONS or not os.path.exists(database):
+        # requests may be handled by a different thread than the one that opened the database (as in `serve`)
+        _CONNECTIONS[key] = sqlite3.connect(database, check_same_thread=False)
+    return _CONNECTIONS[key]
+
+
+def _file_signature(file: str) -> str:
+    if not os.path.exists(file):
+        return ""
+    stat = os.stat(file)
+    return f"{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _read_records(file: str) -> "Iterator[AccessRecord]":
+    if os.path.exists(file):
+        with open(file, encoding="utf-8", newline="") as opened:
+            for row in csv.DictReader(opened):
+                yield AccessRecord(
+                    row["user"],
+                    row["group"],
+                    row["location"],
+                    row["permissions"],
+                    int(float(row["parents"] or 0)),
+                    row["date"],
+                )
+
+
+@_measured("write_records")
+def _write_records(file: str, records: "list[AccessRecord]"):
+    _track(file)
+    with open(file + ".tmp", "w", encoding="utf-8", newline="") as opened:
+        writer = csv.writer(opened, lineterminator="\n")
+        writer.writerow(ACCESS_STRUCTURE.keys())
+        writer.writerows(record.to_row() for record in records)
+        _count_written(opened.tell())
+    os.replace(file + ".tmp", file)
+
+
+def _to_frame(records: "list[AccessRecord]", index: "Union[list[int], None]" = None) -> "pandas.DataFrame":
+    import pandas
+
+    return pandas.DataFrame(
+        [record.to_row() for record in records], index=index, columns=list(ACCESS_STRUCTURE)
+    ).astype(ACCESS_STRUCTURE)
@@ -0,0 +1,144 @@
+"""Resolve users and groups."""
+
+import json
+import os
+import subprocess
+from os.path import exists
+from shutil import which
+from time import time
+from typing import Iterable, Union
+
+try:
+    import grp
+    import pwd
+except ImportError:  # no cov
+    grp = None  # type: ignore[assignment]
+    pwd = None  # type: ignore[assignment]
+
+from file_access_manager.metrics import _measured
+from file_access_manager.project import MISSING_USERS_FILE
+
+ID_PATH = which("id")
+# users can be looked up with `id` rather than the user database (e.g., to use a stand-in `id` command)
+USER_LOOKUP = "id" if pwd is None or os.environ.get("FILE_ACCESS_MANAGER_USER_LOOKUP", "").lower() == "id" else "pwd"
+# access can be granted to a group as a whole, recorded as `g:<group>` in place of a user
+GROUP_PREFIX = "g:"
+
+_UIDS: "dict[str, int]" = {}
+_USER_NAMES: "dict[int, str]" = {}
+_GIDS: "dict[str, int]" = {}
+_GROUP_NAMES: "dict[int, str]" = {}
+_MISSING: "Union[dict[str, float], None]" = None
+
+
+def _get_uid(user: str) -> "Union[int, None]":
+    # only found users are remembered (until the cache is cleared at the start of each run),
+    # as missing users may be created at any point
+    if user not in _UIDS:
+        if USER_LOOKUP == "id":
+            # without a user database, only existence can be checked
+            if not ID_PATH or subprocess.run([ID_PATH, user], check=False, capture_output=True).returncode != 0:
+                return None
+            _UIDS[user] = -1
+        else:
+            try:
+                entry = pwd.getpwnam(user)
+            except KeyError:
+                return None
+            _UIDS[user] = entry.pw_uid
+            _USER_NAMES[entry.pw_uid] = entry.pw_name
+    return _UIDS[user]
+
+
+def _get_user_name(uid: int) -> str:
+    if uid not in _USER_NAMES:
+        try:
+            _USER_NAMES[uid] = pwd.getpwuid(uid).pw_name
+        except KeyError:
+            _USER_NAMES[uid] = str(uid)
+    return _USER_NAMES[uid]
+
+
+def _get_gid(group: str) -> "Union[int, None]":
+    if group not in _GIDS:
+        try:
+            entry = grp.getgrnam(group)
+        except KeyError:
+            return None
+        _GIDS[group] = entry.gr_gid
+        _GROUP_NAMES[entry.gr_gid] = entry.gr_name
+    return _GIDS[group]
+
+
+def _get_group_name(gid: int) -> str:
+    if gid not in _GROUP_NAMES:
+        try:
+            _GROUP_NAMES[gid] = grp.getgrgid(gid).gr_name
+        except KeyError:
+            _GROUP_NAMES[gid] = str(gid)
+    return _GROUP_NAMES[gid]
+
+
+def _get_missing() -> "dict[str, float]":
+    global _MISSING  # noqa: PLW0603
+    if _MISSING is None:
+        _MISSING = {}
+        if exists(MISSING_USERS_FILE):
+            try:
+                with open(MISSING_USERS_FILE, encoding="utf-8") as opened:
+                    _MISSING = json.load(opened)
+            except ValueError:
+                pass
+    return _MISSING
+
+
+def _write_missing(missing: "dict[str, float]"):
+    with open(MISSING_USERS_FILE + ".tmp", "w", encoding="utf-8") as opened:
+        json.dump(missing, opened, indent=2, sort_keys=True)
+    os.replace(MISSING_USERS_FILE + ".tmp", MISSING_USERS_FILE)
+
+
+@_measured("resolve_users")
+def _resolve_users(users: "Iterable[str]", ttl: float = 0) -> "dict[str, bool]":
+    missing = _get_missing() if ttl > 0 else {}
+    now = time()
+    resolved: "dict[str, bool]" = {}
+    changed = False
+    for user in users:
+        if user in resolved:
+            continue
+        if user in _UIDS or (_is_group(user) and user[len(GROUP_PREFIX) :] in _GIDS):
+            resolved[user] = True
+        elif now - missing.get(user, 0) < ttl:
+            # recently missing, so not looked up again until the ttl passes
+            resolved[user] = False
+        else:
+            resolved[user] = (_get_gid(user[len(GROUP_PREFIX) :]) if _is_group(user) else _get_uid(user)) is not None
+            if not resolved[user]:
+                missing[user] = now
+                changed = True
+            elif user in missing:
+                missing.pop(user)
+                changed = True
+    if changed and ttl > 0:
+        for user in [user for user, checked in missing.items() if now - checked >= ttl]:
+            missing.pop(user)
+        _write_missing(missing)
+    return resolved
+
+
+def _is_group(principal: str) -> bool:
+    return principal.startswith(GROUP_PREFIX)
+
+
+def _user_exists(user: str, ttl: float = 0) -> bool:
+    return _resolve_users([user], ttl)[user]
+
+
+def _clear_cache():
+    global _MISSING  # noqa: PLW0603
+    _UIDS.clear()
+    _USER_NAMES.clear()
+    _GIDS.clear()
+    _GROUP_NAMES.clear()
+    _MISSING = None
@@ -0,0 +1,208 @@
+"""Apply access to files as they are added to locations, through Linux inotify."""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import warnings
+from os.path import abspath, dirname, exists, isdir, islink, join
+from time import monotonic
+from typing import Union
+
+from file_access_manager.project import ACCESS_FILE, _check_for_project, _file_version, _in_project
+
+IN_CREATE = 0x00000100
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+@_in_project
+def watch(delay: float = 1.0, reconcile: float = 3600, verbose: bool = True):
+    """
+    Apply recorded access to files and directories as they are created in (or moved into) locations.
+
+    Each directory within each location in `access.csv` is watched, and access is applied to new paths
+    once no more have appeared for `delay` seconds, so bursts (such as an extracted archive) are applied together.
+    Watches are updated as directories are added, and when access records change. Access is also checked
+    in full (as with `check_access`) every `reconcile` seconds, and after events are missed, to catch anything
+    the watches could not see (e.g., changes on other hosts of a network filesystem).
+
+    This requires Linux. Runs until interrupted.
+
+    Args:
+        delay (float): Seconds to wait for more new paths before applying access.
+        reconcile (float): Seconds between full checks; `0` to disable them.
+        verbose (bool): If `False`, will not print paths as access is applied to them.
+        project (Project): Project to work within, rather than the current working directory.
+
+    Examples:
+        >>> file_access_manager.watch(reconcile=6 * 60 * 60)
+    """
+    try:
+        _watch(delay, reconcile, verbose)
+    except KeyboardInterrupt:
+        pass
+
+
+def _watch(delay: float, reconcile: float, verbose: bool, stop: "Union[threading.Event, None]" = None):
+    _check_for_project(ACCESS_FILE)
+    if not sys.platform.startswith("linux"):
+        msg = "watching locations requires Linux inotify"
+        raise RuntimeError(msg)
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        msg = f"failed to start watching: {os.strerror(ctypes.get_errno())}"
+        raise RuntimeError(msg)
+    state: dict = {"libc": libc, "fd": fd, "watches": {}, "access": {}, "version": None, "full": False}
+    try:
+        _refresh(state, verbose)
+        if verbose:
+            print(f"watching {len(state['watches'])} directories within {len(state['access'])} locations")
+        next_reconcile = monotonic() + reconcile if reconcile else None
+        created: "set[str]" = set()
+        apply_at: "Union[float, None]" = None
+        while stop is None or not stop.is_set():
+            deadlines = [deadline for deadline in (apply_at, next_reconcile) if deadline is not None]
+            timeout = max(0.0, min(deadlines) - monotonic()) if deadlines else None
+            # a stop event is checked at least once a second
+            if stop is not None:
+                timeout = 1.0 if timeout is None else min(timeout, 1.0)
+            readable, _, _ = select.select([fd], [], [], timeout)
+            if readable:
+                created.update(_read_events(state))
+                if created:
+                    apply_at = monotonic() + delay
+            if state["full"] or (next_reconcile is not None and monotonic() >= next_reconcile):
+                state["full"] = False
+                created.clear()
+                apply_at = None
+                _reconcile(state, verbose)
+                next_reconcile = monotonic() + reconcile if reconcile else None
+            elif apply_at is not None and monotonic() >= apply_at:
+                _apply_created(state, created, verbose)
+                created.clear()
+                apply_at = None
+    finally:
+        os.close(fd)
+
+
+def _refresh(state: dict, verbose: bool):
+    # watches are rebuilt when access records change, as locations or their access may have changed
+    version = _file_version(ACCESS_FILE)
+    if version == state["version"]:
+        return
+    from file_access_manager.store import _get_store
+
+    access: "dict[str, dict[str, str]]" = {}
+    for record in _get_store().select():
+        if record.permissions != "---" and exists(record.location):
+            access.setdefault(abspath(record.location), {})[record.user] = record.permissions
+    if state["version"] is not None and verbose:
+        print("access records changed, so updating watches")
+    state["version"] = version
+    state["access"] = access
+    for wd in list(state["watches"]):
+        state["libc"].inotify_rm_watch(state["fd"], wd)
+    state["watches"] = {}
+    for location in access:
+        _add_watches(state, location)
+
+
+def _add_watches(state: dict, path: str):
+    if not isdir(path) or islink(path):
+        return
+    for root, dirs, _ in os.walk(path):
+        wd = state["libc"].inotify_add_watch(state["fd"], os.fsencode(root), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                warnings.warn(
+                    "inotify watch limit reached (see /proc/sys/fs/inotify/max_user_watches),"
+                    " so some directories are only covered by full checks",
+                    stacklevel=2,
+                )
+                return
+            continue
+        state["watches"][wd] = root
+        dirs[:] = [name for name in dirs if not islink(join(root, name))]
+
+
+def _read_events(state: dict) -> "set[str]":
+    created: "set[str]" = set()
+    try:
+        buffer = os.read(state["fd"], 65536)
+    except BlockingIOError:
+        return created
+    offset = 0
+    while offset < len(buffer):
+        wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+        name = buffer[offset + EVENT_HEADER.size : offset + EVENT_HEADER.size + length].rstrip(b"\0")
+        offset += EVENT_HEADER.size + length
+        if mask & IN_Q_OVERFLOW:
+            # events were dropped, so everything is checked
+            state["full"] = True
+        elif mask & IN_IGNORED:
+            state["watches"].pop(wd, None)
+        elif mask & (IN_CREATE | IN_MOVED_TO) and wd in state["watches"]:
+            created.add(join(state["watches"][wd], os.fsdecode(name)))
+    return created
+
+
+def _apply_created(state: dict, created: "set[str]", verbose: bool):
+    from file_access_manager.access import _set_permissions_many
+    from file_access_manager.acl import _clear_acl_cache
+
+    # each burst is applied as its own run, so ACLs read for earlier bursts are not kept
+    _clear_acl_cache()
+    _refresh(state, verbose)
+    # paths within a new directory are covered by its recursive application
+    paths = sorted(path for path in created if exists(path))
+    new_dirs = [path for path in paths if isdir(path) and not islink(path)]
+    applied = 0
+    for path in paths:
+        parent = dirname(path)
+        if any(parent == new_dir or parent.startswith(new_dir + os.sep) for new_dir in new_dirs):
+            continue
+        access = _target_access(state["access"], path)
+        if not access:
+            continue
+        is_dir = path in new_dirs
+        if is_dir:
+            _add_watches(state, path)
+        if _set_permissions_many(path, access, is_dir).returncode == 0:
+            applied += 1
+            if verbose:
+                print(f"applied access to {path}")
+    if verbose and applied > 1:
+        print(f"applied access to {applied} new paths")
+
+
+def _target_access(location_access: "dict[str, dict[str, str]]", path: str) -> "dict[str, str]":
+    # entries of nested locations take precedence, as they are applied after their parents when checking
+    access: "dict[str, str]" = {}
+    for location in sorted(location_access, key=len):
+        if path == location or path.startswith(location.rstrip(os.sep) + os.sep):
+            access.update(location_access[location])
+    return access
+
+
+def _reconcile(state: dict, verbose: bool):
+    from file_access_manager.access import check_access
+
+    _refresh(state, verbose)
+    if verbose:
+        print("checking all access")
+    check_access(pull=False, verbose=False)
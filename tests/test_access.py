@@ -0,0 +1,231 @@
+from os import chdir, getcwd, makedirs
+from os.path import abspath, exists, join
+from tempfile import TemporaryDirectory
+
+import pytest
+
+import file_access_manager
+from file_access_manager import acl
+from file_access_manager.access import _apply_to_parents, _map_locations, _plan_revocation, _revoke_many
+from file_access_manager.project import PENDING_FILE
+from file_access_manager.store import AccessRecord, AccessStore
+
+USERS = ["54321", "54322", "54323"]
+SYSTEM_USERS = ["daemon", "bin"]
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_multiple_users():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"))
+        chdir(join(temp, "project"))
+        location = join(temp, "data", "location")
+        makedirs(location)
+        res = acl._modify_acl(location, [f"u:{user}:rx" for user in USERS])
+        if res.returncode != 0:
+            chdir(initial_dir)
+            pytest.skip(res.stderr.decode("utf-8"))
+
+        # parents are updated once per level, for every user needing that level
+        assert _apply_to_parents(location, {USERS[0]: 2, USERS[1]: 1, USERS[2]: 0}) == dict.fromkeys(USERS, True)
+        assert acl._get_acl(join(temp, "data")) == {USERS[0]: "r-x", USERS[1]: "r-x"}
+        assert acl._get_acl(temp) == {USERS[0]: "r-x"}
+
+        assert _revoke_many(USERS[:2], location) == {USERS[0]: True, USERS[1]: True}
+        assert acl._get_acl(location) == {USERS[2]: "r-x"}
+        assert _revoke_many(USERS, join(temp, "data"), False) == dict.fromkeys(USERS, True)
+        assert acl._get_acl(join(temp, "data")) == {}
+        chdir(initial_dir)
+
+
+def test_map_locations():
+    locations = ["/data/set", "/data/set2", "/data/set/sub", "/other"]
+    assert _map_locations(len, locations) == {location: len(location) for location in locations}
+    assert list(_map_locations(len, locations, 3)) == locations
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_plan_revocation():
+    def record(user: str, location: str, parents: int = 1, group: str = "") -> AccessRecord:
+        return AccessRecord(user, group or user, location, "rx", parents, "")
+
+    removed = [
+        record("user1", "/data/set/a", 2),
+        record("user1", "/data/set/b", 2),
+        record("user1", "/data/set/b/c"),
+        record("user2", "/data/set/a", 2, "user1"),
+    ]
+    retained = [record("user1", "/data/set2"), record("user2", "/data/set/a/e")]
+    plan, reapply = _plan_revocation(removed, retained)
+    assert plan == {
+        # nested locations are covered by their parent's recursive removal
+        ("/data/set/a", True): ["user1", "user2"],
+        ("/data/set/b", True): ["user1"],
+        # a shared parent is stripped once, and not kept for a sibling with the same prefix (/data/set2),
+        # but /data is kept for that sibling, and /data/set is kept for a location within it
+        ("/data/set", False): ["user1"],
+    }
+    assert [(entry.user, entry.location) for entry in reapply] == [("user2", "/data/set/a/e")]
+
+    # a location within a retained location is still stripped, and gets the retained access again
+    removed = [AccessRecord("user1", "user1", "/data/a", "rwx", 0, "")]
+    retained = [record("user1", "/data"), record("user1", "/data/a/b"), record("user1", "/other")]
+    plan, reapply = _plan_revocation(removed, retained)
+    assert plan == {("/data/a", True): ["user1"]}
+    assert [(entry.location, entry.permissions) for entry in reapply] == [("/data/a", "rx"), ("/data/a/b", "rx")]
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_revoke_within_retained():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"), auto_commit=False)
+        chdir(join(temp, "project"))
+        location = join(temp, "data")
+        makedirs(join(location, "a"))
+        with open(join(location, "a", "file.txt"), "w", encoding="utf-8") as opened:
+            opened.write("")
+        if acl._modify_acl(location, [f"u:{SYSTEM_USERS[0]}:rx"]).returncode != 0:
+            chdir(initial_dir)
+            pytest.skip("ACLs are not supported in the temporary directory")
+        file_access_manager.set_permission(location, SYSTEM_USERS[0], parents=0)
+        file_access_manager.set_permission(join(location, "a"), SYSTEM_USERS[0], permissions="rwx", parents=0)
+        assert acl._get_acl(join(location, "a", "file.txt")) == {SYSTEM_USERS[0]: "rwx"}
+
+        # revoking the nested location leaves the containing location's access
+        assert file_access_manager.revoke_permissions(SYSTEM_USERS[0], join(location, "a"))
+        assert acl._get_acl(join(location, "a")) == {SYSTEM_USERS[0]: "r-x"}
+        assert acl._get_acl(join(location, "a", "file.txt")) == {SYSTEM_USERS[0]: "r-x"}
+        assert [record.location for record in AccessStore()] == [location]
+        chdir(initial_dir)
+
+
+def test_check_jobs(capsys):
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"))
+        chdir(join(temp, "project"))
+        access = AccessStore()
+        for index, user in enumerate(USERS):
+            location = join(temp, "data", f"location{index}")
+            makedirs(location)
+            access.upsert(user, user, location, "rx", 1)
+        access.flush()
+        if acl._modify_acl(temp, [f"u:{USERS[0]}:rx"], False).returncode != 0:
+            chdir(initial_dir)
+            pytest.skip("ACLs are not supported in the temporary directory")
+        current, _ = file_access_manager.check_access(pull=False, jobs=3)
+        assert "ACLs: " in capsys.readouterr().out
+        assert current["actual_permissions"].to_list() == ["r-x"] * len(USERS)
+        assert current["access_to_parents"].all()
+        assert acl._get_acl(join(temp, "data")) == dict.fromkeys(USERS, "r-x")
+
+        # ACLs read in earlier runs are not kept
+        assert acl._get_acl(temp) == {USERS[0]: "r-x"}
+        assert abspath(temp) in acl._ACL_CACHE
+        file_access_manager.check_access(pull=False, verbose=False)
+        assert abspath(temp) not in acl._ACL_CACHE
+        chdir(initial_dir)
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_sqlite_pending():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"))
+        chdir(join(temp, "project"))
+        file_access_manager.set_options(store="sqlite")
+        location = join(temp, "data", "location")
+        makedirs(location)
+        if acl._modify_acl(location, [f"u:{SYSTEM_USERS[0]}:rx"]).returncode != 0:
+            chdir(initial_dir)
+            pytest.skip("ACLs are not supported in the temporary directory")
+        access = AccessStore()
+        access.upsert(SYSTEM_USERS[0], SYSTEM_USERS[0], location, "rx", 0)
+        access.flush()
+        pending = AccessStore(PENDING_FILE)
+        pending.upsert(SYSTEM_USERS[0], SYSTEM_USERS[0], "", "", 0)
+        pending.upsert(SYSTEM_USERS[1], SYSTEM_USERS[1], location, "rx", 0)
+        pending.flush()
+
+        # the pending removal and grant both change the access and pending tables
+        file_access_manager.check_pending(pull=False)
+        assert not len(AccessStore(PENDING_FILE))
+        assert [record.user for record in AccessStore()] == [SYSTEM_USERS[1]]
+        assert acl._get_acl(location) == {SYSTEM_USERS[1]: "r-x"}
+        file_access_manager.revoke_permissions(SYSTEM_USERS[1])
+        assert not len(AccessStore())
+        assert not exists(".PROCESSING_PENDING")
+        chdir(initial_dir)
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_inherit():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"), auto_commit=False)
+        chdir(join(temp, "project"))
+        location = join(temp, "data", "location")
+        makedirs(join(location, "sub"))
+        if acl._modify_acl(location, [f"u:{SYSTEM_USERS[0]}:rx"]).returncode != 0:
+            chdir(initial_dir)
+            pytest.skip("ACLs are not supported in the temporary directory")
+        acl._modify_acl(location, [f"u:{SYSTEM_USERS[0]}"], remove=True)
+        file_access_manager.add_location("data", location, inherit=True)
+        file_access_manager.set_permission("data", SYSTEM_USERS[0])
+        assert acl._get_default_acl(join(location, "sub")) == {SYSTEM_USERS[0]: "r-x"}
+
+        # new files inherit access without it being applied
+        with open(join(location, "sub", "file.txt"), "w", encoding="utf-8") as opened:
+            opened.write("")
+        assert acl._get_acl(join(location, "sub", "file.txt")) == {SYSTEM_USERS[0]: "r-x"}
+
+        # directories missing default entries are repaired by checks, along with their files
+        acl._modify_acl(join(location, "sub"), [f"u:{SYSTEM_USERS[0]}"], remove=True, default=True)
+        assert acl._get_default_acl(join(location, "sub")) == {}
+        current, _ = file_access_manager.check_access(pull=False, verbose=False)
+        assert acl._get_default_acl(join(location, "sub")) == {SYSTEM_USERS[0]: "r-x"}
+        assert acl._get_acl(join(location, "sub", "file.txt")) == {SYSTEM_USERS[0]: "r-x"}
+        assert list(current["default_permissions"]) == ["r-x"]
+
+        # revoking access removes default entries
+        file_access_manager.revoke_permissions(SYSTEM_USERS[0])
+        assert acl._get_default_acl(join(location, "sub")) == {}
+        assert acl._get_acl(join(location, "sub", "file.txt")) == {}
+        chdir(initial_dir)
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_group_principal():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"), auto_commit=False)
+        chdir(join(temp, "project"))
+        location = join(temp, "data", "location")
+        makedirs(join(location, "sub"))
+        if acl._modify_acl(location, [f"g:{SYSTEM_USERS[1]}:rx"]).returncode != 0:
+            chdir(initial_dir)
+            pytest.skip("ACLs are not supported in the temporary directory")
+
+        # a group is granted access with a single group entry, separately from a user of the same name
+        file_access_manager.set_permission(location, "g:" + SYSTEM_USERS[0])
+        file_access_manager.set_permission(location, SYSTEM_USERS[0])
+        assert acl._get_acl(join(location, "sub"), "g") == {SYSTEM_USERS[0]: "r-x", SYSTEM_USERS[1]: "r-x"}
+        assert acl._get_acl(join(location, "sub"), "u") == {SYSTEM_USERS[0]: "r-x"}
+        assert [record.user for record in AccessStore()] == [SYSTEM_USERS[0], "g:" + SYSTEM_USERS[0]]
+        current, _ = file_access_manager.check_access(pull=False, verbose=False)
+        assert list(current["actual_permissions"]) == ["r-x", "r-x"]
+
+        # entries of groups without recorded access are left alone
+        assert not any(file_access_manager.plan_access(verbose=False).values())
+
+        file_access_manager.revoke_permissions("g:" + SYSTEM_USERS[0])
+        assert acl._get_acl(join(location, "sub"), "g") == {SYSTEM_USERS[1]: "r-x"}
+        assert acl._get_acl(join(location, "sub"), "u") == {SYSTEM_USERS[0]: "r-x"}
+        assert [record.user for record in AccessStore()] == [SYSTEM_USERS[0]]
+
+        # missing groups are added to pending
+        file_access_manager.set_permission(location, "g:file_access_manager_missing_group")
+        assert [record.user for record in AccessStore(PENDING_FILE)] == ["g:file_access_manager_missing_group"]
+        chdir(initial_dir)
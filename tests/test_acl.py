@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import chmod, makedirs, stat
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from file_access_manager import acl
+
+UID = "54321"
+
+
+def test_encoding():
+    entries = [
+        (acl.ACL_OTHER, 5, acl.ACL_UNDEFINED_ID),
+        (acl.ACL_USER, 5, 54321),
+        (acl.ACL_USER_OBJ, 7, acl.ACL_UNDEFINED_ID),
+        (acl.ACL_GROUP_OBJ, 5, acl.ACL_UNDEFINED_ID),
+    ]
+    encoded = acl._encode_acl(entries)
+    assert len(encoded) == 4 + 8 * len(entries)
+    decoded = acl._decode_acl(encoded)
+    assert decoded == sorted(entries, key=acl._entry_key)
+    with pytest.raises(ValueError):
+        acl._decode_acl(encoded[:-1])
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_native_backend():
+    with TemporaryDirectory() as temp:
+        makedirs(join(temp, "sub"))
+        with open(join(temp, "sub", "file.txt"), "w", encoding="utf-8") as opened:
+            opened.write("")
+        try:
+            res = acl._modify_acl(temp, [f"u:{UID}:rx"])
+        except OSError:
+            pytest.skip("ACLs are not supported in the temporary directory")
+        if res.returncode != 0:
+            pytest.skip(res.stderr.decode("utf-8"))
+        for path in [temp, join(temp, "sub"), join(temp, "sub", "file.txt")]:
+            assert acl._get_acl(path) == {UID: "r-x"}
+        assert acl._modify_acl(temp, [f"u:{UID}"], remove=True).returncode == 0
+        assert acl._get_acl(join(temp, "sub", "file.txt")) == {}
+        assert acl._modify_acl(temp, ["u:"]).returncode != 0
+        for worker_type in ["thread", "process"]:
+            assert acl._modify_acl(temp, [f"u:{UID}:rwx"], workers=2, worker_type=worker_type).returncode == 0
+            assert acl._get_acl(join(temp, "sub", "file.txt")) == {UID: "rwx"}
+            assert acl._modify_acl(temp, [f"u:{UID}"], remove=True, workers=2, worker_type=worker_type).returncode == 0
+            assert acl._get_acl(join(temp, "sub")) == {}
+
+        # a mask narrowed by chmod is recalculated when entries are applied again, as with setfacl
+        file = join(temp, "sub", "file.txt")
+        assert acl._modify_acl(file, [f"u:{UID}:rx"], False).returncode == 0
+        chmod(file, stat(file).st_mode & ~0o070)
+        masks = [perm for tag, perm, _ in acl._read_entries(file) if tag == acl.ACL_MASK]
+        assert masks == [0]
+        assert acl._modify_acl(file, [f"u:{UID}:rx"], False).returncode == 0
+        masks = [perm for tag, perm, _ in acl._read_entries(file) if tag == acl.ACL_MASK]
+        assert masks == [acl._perm_bits("rx")]
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_cache():
+    with TemporaryDirectory() as temp:
+        acl._clear_acl_cache()
+        assert acl._get_acl(temp) == {}
+        assert acl._get_acl(temp) == {}
+        assert acl.CACHE_STATS == {"hits": 1, "misses": 1}
+        res = acl._modify_acl(temp, [f"u:{UID}:rx"], False)
+        if res.returncode != 0:
+            pytest.skip(res.stderr.decode("utf-8"))
+        assert acl._get_acl(temp) == {UID: "r-x"}
+        assert acl.CACHE_STATS["misses"] == 2
+
+        # unchanged entries are not written, so stay cached
+        assert acl._modify_acl(temp, [f"u:{UID}:rx"], False).returncode == 0
+        assert acl._get_acl(temp, "u") == {UID: "r-x"}
+        assert acl._get_acl(temp, "g") == {}
+        assert acl.CACHE_STATS == {"hits": 3, "misses": 2}
+
+        # reads from several threads are all counted
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(acl._get_acl, [temp] * 200))
+        assert acl._cache_stats() == {"hits": 203, "misses": 2}
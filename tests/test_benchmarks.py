@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+from os.path import dirname, join
+
+SCALE_BENCHMARK = join(dirname(dirname(__file__)), "benchmarks", "scale.py")
+
+
+def test_scale_benchmark():
+    res = subprocess.run(
+        [
+            sys.executable,
+            SCALE_BENCHMARK,
+            *[
+                "--users",
+                "3",
+                "--locations",
+                "2",
+                "--depth",
+                "1",
+                "--width",
+                "1",
+                "--files",
+                "1",
+                "--revoke",
+                "1",
+                "--json",
+            ],
+        ],
+        check=False,
+        capture_output=True,
+    )
+    assert res.returncode == 0, res.stderr.decode("utf-8")
+    results = {result["operation"]: result for result in json.loads(res.stdout)}
+    assert list(results) == ["grant", "pending_grant", "pending", "check_full", "check", "revoke"]
+    if sys.version_info >= (3, 8):
+        # stand-in commands are counted
+        assert results["grant"]["commands"]["setfacl"] > 0
+        assert results["revoke"]["commands"]["setfacl"] > 0
+        assert "id" not in results["check"]["commands"]
+    assert all(result["peak_mb"] > 0 for result in results.values())
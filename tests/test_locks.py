@@ -0,0 +1,87 @@
+import json
+import subprocess
+import sys
+from os import chdir, getcwd, makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import pytest
+
+import file_access_manager
+from file_access_manager.locks import PENDING_LOCK, RECORDS_LOCK, _lock
+from file_access_manager.project import LOCK_DIR, PENDING_FILE
+from file_access_manager.store import AccessStore
+
+MISSING_USER = "file_access_manager_missing_user"
+HOLD_LOCK = (
+    "import fcntl, sys; lock = open(sys.argv[1], 'w'); fcntl.flock(lock, fcntl.LOCK_EX); print(1, flush=True); input()"
+)
+
+
+def _hold(name: str) -> subprocess.Popen:
+    makedirs(LOCK_DIR, exist_ok=True)
+    holder = subprocess.Popen(
+        [sys.executable, "-c", HOLD_LOCK, join(LOCK_DIR, name + ".lock")],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    assert holder.stdout is not None
+    holder.stdout.readline()
+    return holder
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="fcntl locks not available")
+def test_locks():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"), auto_commit=False)
+        chdir(join(temp, "project"))
+        try:
+            # writers that loaded records before each other's changes keep both
+            first = AccessStore()
+            second = AccessStore()
+            first.upsert("user1", "user1", "/data/a", "rx", 1)
+            second.upsert("user2", "user2", "/data/b", "rx", 1)
+            first.flush()
+            second.flush()
+            assert [record.user for record in AccessStore()] == ["user1", "user2"]
+            second.delete("user2", "user2", "/data/b")
+            first.upsert("user3", "user3", "/data/c", "rx", 1)
+            first.flush()
+            second.flush()
+            assert [record.user for record in AccessStore()] == ["user1", "user3"]
+
+            # while another process is processing pending, records are not updated
+            location = join(temp, "data")
+            makedirs(location)
+            file_access_manager.set_permission(location, MISSING_USER)
+            file_access_manager.set_options(pending_expiry=1)
+            holder = _hold(PENDING_LOCK)
+            try:
+                with _lock(PENDING_LOCK, blocking=False) as locked:
+                    assert not locked
+            finally:
+                holder.communicate("\n")
+            with _lock(PENDING_LOCK, blocking=False) as locked:
+                assert locked
+
+            # waiting for a lock can time out, reporting its holder
+            file_access_manager.set_options(lock_timeout=1)
+            holder = _hold(RECORDS_LOCK)
+            try:
+                with pytest.raises(RuntimeError, match="timed out waiting for the records lock"):
+                    first.upsert("user4", "user4", "/data/d", "rx", 1)
+                    first.flush()
+            finally:
+                holder.communicate("\n")
+
+            # locks left by processes that exited while holding them are cleared
+            with open(join(LOCK_DIR, RECORDS_LOCK + ".lock"), "w", encoding="utf-8") as opened:
+                json.dump({"pid": 0, "host": "elsewhere", "time": 0}, opened)
+            with pytest.warns(UserWarning, match="stale records lock left by process 0 on elsewhere"):
+                first.flush()
+            assert [record.user for record in AccessStore()] == ["user1", "user3", "user4"]
+            assert [record.user for record in AccessStore(PENDING_FILE)] == [MISSING_USER]
+        finally:
+            chdir(initial_dir)
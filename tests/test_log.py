@@ -0,0 +1,64 @@
+import json
+from os import chdir, getcwd, listdir
+from os.path import getsize
+from tempfile import TemporaryDirectory
+
+import file_access_manager
+from file_access_manager import log
+from file_access_manager.project import LOG_FILE, LOG_INDEX_FILE
+
+
+def test_log():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(temp, auto_commit=False)
+        chdir(temp)
+        try:
+            file_access_manager.add_location("data", temp)
+
+            # entries are buffered until flushed
+            log._log("set permissions to /data/a for user1", action="grant", user="user1", location=temp + "/a")
+            log._log("added user2 to pending", action="pending", user="user2", group="user1", location="/other")
+            assert getsize(LOG_FILE) == 0
+            log._flush_log()
+            with open(LOG_FILE, encoding="utf-8") as opened:
+                entries = [json.loads(line) for line in opened]
+            assert [entry["action"] for entry in entries] == ["grant", "pending"]
+            assert "group" not in entries[0]
+
+            assert len(file_access_manager.query_log("user1", verbose=False)) == 2
+            assert len(file_access_manager.query_log(location="data", verbose=False)) == 1
+            assert len(file_access_manager.query_log(action="pending", verbose=False)) == 1
+            assert len(file_access_manager.query_log("user1", days=90, verbose=False)) == 2
+            assert not file_access_manager.query_log(since="2999-01-01", verbose=False)
+            assert not file_access_manager.query_log(until="2000-01-01", verbose=False)
+            assert not file_access_manager.query_log("user3", verbose=False)
+
+            # the index is kept up to date as entries are written
+            log._log("removed all permissions from user3", action="revoke", user="user3")
+            log._flush_log()
+            with open(LOG_INDEX_FILE, encoding="utf-8") as opened:
+                assert "user3" in json.load(opened)[LOG_FILE]["users"]
+
+            # full logs are compressed, and can still be queried
+            file_access_manager.set_options(log_max_size=1)
+            log._log("removed all permissions from user1", action="revoke", user="user1")
+            log._flush_log()
+            assert len(listdir("logs")) == 1
+            assert listdir("logs")[0].endswith(".jsonl.gz")
+            with open(LOG_FILE, encoding="utf-8") as opened:
+                assert len(opened.readlines()) == 1
+            assert [entry["action"] for entry in file_access_manager.query_log("user1", verbose=False)] == [
+                "grant",
+                "pending",
+                "revoke",
+            ]
+
+            # entries discarded by a failed session are not written
+            file_access_manager.set_options(log_max_size=0)
+            log._log("set permissions to /data/b for user4", action="grant", user="user4", location="/data/b")
+            log._discard_log()
+            log._flush_log()
+            assert not file_access_manager.query_log("user4", verbose=False)
+        finally:
+            chdir(initial_dir)
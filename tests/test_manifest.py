@@ -0,0 +1,47 @@
+from os import chdir, getcwd, makedirs, stat
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from file_access_manager import acl
+from file_access_manager.manifest import _apply_incremental, _get_manifest
+
+UID = "54321"
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_incremental():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        chdir(temp)
+        location = join(temp, "location")
+        makedirs(join(location, "sub"))
+        first_file = join(location, "sub", "first.txt")
+        with open(first_file, "w", encoding="utf-8") as opened:
+            opened.write("")
+        res = _apply_incremental(location, {UID: "rx"})
+        if res.returncode != 0:
+            chdir(initial_dir)
+            pytest.skip(res.stderr.decode("utf-8"))
+        assert acl._get_acl(first_file) == {UID: "r-x"}
+        assert first_file in _get_manifest(location)["files"]
+
+        # unchanged files are not touched
+        changed = stat(first_file).st_ctime_ns
+        second_file = join(location, "sub", "second.txt")
+        with open(second_file, "w", encoding="utf-8") as opened:
+            opened.write("")
+        assert _apply_incremental(location, {UID: "rx"}).returncode == 0
+        assert stat(first_file).st_ctime_ns == changed
+        assert acl._get_acl(second_file) == {UID: "r-x"}
+
+        # changed access is applied to everything
+        assert _apply_incremental(location, {UID: "rwx"}).returncode == 0
+        assert acl._get_acl(first_file) == {UID: "rwx"}
+
+        # externally changed files are reapplied
+        acl._modify_acl(second_file, [f"u:{UID}"], False, True)
+        assert _apply_incremental(location, {UID: "rwx"}).returncode == 0
+        assert acl._get_acl(second_file) == {UID: "rwx"}
+        chdir(initial_dir)
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from file_access_manager import metrics
+
+
+def test_metrics():
+    assert metrics._stop() == {}
+    metrics._start("check")
+    with metrics._measure("read_records"):
+        pass
+    assert (
+        metrics._measured("set_permissions", metrics._failed_process)(
+            lambda: subprocess.run([sys.executable, "-c", "import sys; sys.exit(1)"], check=False)
+        )().returncode
+        == 1
+    )
+    metrics._count_written(10)
+    result = metrics._stop()
+    assert result["command"] == "check"
+    assert result["succeeded"]
+    assert result["failures"] == 1
+    assert result["bytes_written"] == 10
+    assert result["operations"]["read_records"]["calls"] == 1
+    assert sum(result["operations"]["set_permissions"]["buckets"]) == 1
+    if sys.version_info >= (3, 8):
+        assert sum(result["subprocesses"].values()) == 1
+    assert "set_permissions" in metrics._summary(result)
+
+    # measuring stops with the run
+    metrics._measured("set_permissions")(lambda: None)()
+    assert metrics._stop() == {}
+
+    with TemporaryDirectory() as temp:
+        metrics._write_metrics(result, join(temp, "metrics.json"))
+        with open(join(temp, "metrics.json"), encoding="utf-8") as opened:
+            assert json.load(opened) == result
+        metrics._write_metrics(result, join(temp, "metrics.prom"))
+        with open(join(temp, "metrics.prom"), encoding="utf-8") as opened:
+            written = opened.read()
+        assert 'file_access_manager_run_failures{command="check"} 1' in written
+        labels = 'command="check",operation="set_permissions",le="+Inf"'
+        assert f"file_access_manager_operation_duration_seconds_bucket{{{labels}}} 1" in written
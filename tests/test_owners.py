@@ -0,0 +1,56 @@
+import os
+from os import chdir, getcwd, makedirs
+from os.path import join
+from pwd import getpwnam
+from tempfile import TemporaryDirectory
+
+import pytest
+
+import file_access_manager
+from file_access_manager import acl
+from file_access_manager.store import AccessStore
+
+USER = "daemon"
+
+
+@pytest.mark.skipif(
+    acl.ACL_BACKEND != "native" or os.getuid() != 0, reason="native ACLs, and files with other owners, not available"
+)
+def test_as_owner():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"), auto_commit=False)
+        chdir(join(temp, "project"))
+        location = join(temp, "data", "location")
+        makedirs(join(location, "other"))
+        for name in ["own.txt", join("other", "theirs.txt")]:
+            with open(join(location, name), "w", encoding="utf-8") as opened:
+                opened.write("")
+        if acl._modify_acl(location, [f"u:{USER}:rx"]).returncode != 0:
+            chdir(initial_dir)
+            pytest.skip("ACLs are not supported in the temporary directory")
+        acl._modify_acl(location, [f"u:{USER}"], remove=True)
+        uid = getpwnam(USER).pw_uid
+        for name in ["other", join("other", "theirs.txt")]:
+            os.chown(join(location, name), uid, -1)
+        access = AccessStore()
+        access.upsert(USER, USER, location, "rx", 0)
+        access.flush()
+
+        # before any owner applies access, each has outstanding work
+        assert file_access_manager.owner_summary(verbose=False) == {"root": {location: 2}, USER: {location: 2}}
+
+        # only the current user's files are changed
+        file_access_manager.check_access(pull=False, verbose=False, as_owner=True)
+        assert acl._get_acl(join(location, "own.txt")) == {USER: "r-x"}
+        assert acl._get_acl(join(location, "other", "theirs.txt")) == {}
+        assert file_access_manager.owner_summary(verbose=False) == {USER: {location: 2}}
+
+        # new files are listed once the location is scanned again
+        with open(join(location, "new.txt"), "w", encoding="utf-8") as opened:
+            opened.write("")
+        assert file_access_manager.owner_summary(scan=True, verbose=False) == {
+            "root": {location: 3},
+            USER: {location: 2},
+        }
+        chdir(initial_dir)
@@ -0,0 +1,91 @@
+import json
+import subprocess
+from os import chdir, getcwd, makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import time
+
+import file_access_manager
+from file_access_manager import access
+from file_access_manager.project import PENDING_FILE, PENDING_QUEUE_FILE
+from file_access_manager.store import AccessStore
+
+MISSING_USER = "file_access_manager_missing_user"
+SYSTEM_USER = "daemon"
+
+
+def _update_queue(**state: float):
+    with open(PENDING_QUEUE_FILE, encoding="utf-8") as opened:
+        queue = json.load(opened)
+    for entry in queue.values():
+        entry.update(state)
+    with open(PENDING_QUEUE_FILE, "w", encoding="utf-8") as opened:
+        json.dump(queue, opened)
+    return queue
+
+
+def test_pending_queue():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"), auto_commit=False)
+        chdir(join(temp, "project"))
+        location = join(temp, "data", "location")
+        makedirs(location)
+        file_access_manager.set_options(pending_backoff=3600, pending_expiry=30)
+        file_access_manager.set_permission(location, MISSING_USER)
+
+        # failed entries are scheduled again after a delay, so are not attempted until then
+        file_access_manager.check_pending(pull=False)
+        queue = _update_queue()
+        assert [entry["attempts"] for entry in queue.values()] == [1]
+        assert next(iter(queue.values()))["next"] > time() + 3000
+        file_access_manager.check_pending(pull=False)
+        assert [entry["attempts"] for entry in _update_queue().values()] == [1]
+
+        # the delay doubles with each attempt
+        _update_queue(next=0)
+        file_access_manager.check_pending(pull=False)
+        queue = _update_queue()
+        assert [entry["attempts"] for entry in queue.values()] == [2]
+        assert next(iter(queue.values()))["next"] > time() + 7000
+
+        # entries pending for a while are reported
+        _update_queue(first=time() - 10 * 86400)
+        assert not file_access_manager.pending_report(stuck=20, verbose=False)
+        report = file_access_manager.pending_report(verbose=False)
+        assert [(entry["user"], entry["attempts"]) for entry in report] == [(MISSING_USER, 2)]
+
+        # and removed once they expire
+        _update_queue(first=time() - 40 * 86400, next=0)
+        file_access_manager.check_pending(pull=False)
+        assert not len(AccessStore(PENDING_FILE))
+        assert not _update_queue()
+        assert [entry["action"] for entry in file_access_manager.query_log(MISSING_USER, verbose=False)] == [
+            "pending",
+            "expire",
+        ]
+        chdir(initial_dir)
+
+
+def test_failed_grant(monkeypatch):
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"), auto_commit=False)
+        chdir(join(temp, "project"))
+        location = join(temp, "data", "location")
+        makedirs(location)
+        file_access_manager.set_options(pending_backoff=3600)
+        pending = AccessStore(PENDING_FILE)
+        pending.upsert(SYSTEM_USER, SYSTEM_USER, location, "rx", 0)
+        pending.flush()
+
+        # grants that fail for existing users stay pending, and are scheduled again
+        def fail(path: str, permissions: "dict[str, str]"):
+            return subprocess.CompletedProcess(["setfacl", path, *permissions], 1, b"", b"setfacl: failed\n")
+
+        monkeypatch.setattr(access, "_set_permissions_many", fail)
+        file_access_manager.check_pending(pull=False)
+        assert not len(AccessStore())
+        assert [record.user for record in AccessStore(PENDING_FILE)] == [SYSTEM_USER]
+        assert [entry["attempts"] for entry in _update_queue().values()] == [1]
+        chdir(initial_dir)
@@ -0,0 +1,74 @@
+from os import chdir, getcwd, makedirs, stat
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import pytest
+
+import file_access_manager
+from file_access_manager import acl
+from file_access_manager.store import AccessStore
+
+UID = "54321"
+OTHER_UID = "54322"
+
+
+@pytest.mark.skipif(acl.ACL_BACKEND != "native", reason="native ACL backend is not available")
+def test_plan():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"))
+        chdir(join(temp, "project"))
+        location = join(temp, "data", "location")
+        makedirs(location)
+        file = join(location, "file.txt")
+        with open(file, "w", encoding="utf-8") as opened:
+            opened.write("")
+        access = AccessStore()
+        access.upsert(UID, UID, location, "rx", 1)
+        access.flush()
+
+        plan = file_access_manager.plan_access(verbose=False)
+        assert [entry["user"] for entry in plan["add"]] == [UID]
+        assert [entry["location"] for entry in plan["parents"]] == [join(temp, "data")]
+        assert not plan["change"] and not plan["remove"]
+        result = file_access_manager.apply_plan(plan, verbose=False)
+        if result["failed"]:
+            chdir(initial_dir)
+            pytest.skip("ACLs could not be set")
+        assert acl._get_acl(file) == {UID: "r-x"}
+        log = "\n".join(entry["message"] for entry in file_access_manager.query_log(UID, verbose=False))
+        assert f"set permissions to {location} for {UID}: rx" in log
+        assert f"set permissions to parent {join(temp, 'data')} for {UID}: rx" in log
+
+        # a converged system needs no changes, so nothing is written
+        changed = stat(file).st_ctime_ns
+        assert not any(file_access_manager.plan_access(verbose=False).values())
+        assert file_access_manager.apply_plan(verbose=False) == {"applied": [], "failed": []}
+        assert stat(file).st_ctime_ns == changed
+
+        # changed and unrecorded entries are planned, and can be applied from a file
+        access.upsert(UID, UID, location, "rwx", 1)
+        access.flush()
+        acl._modify_acl(location, [f"u:{OTHER_UID}:rx"])
+        plan = file_access_manager.plan_access(output="plan.json", verbose=False)
+        assert plan["change"] == [{"location": location, "user": UID, "permissions": "rwx", "current": "r-x"}]
+        assert [entry["user"] for entry in plan["remove"]] == [OTHER_UID]
+        assert len(file_access_manager.apply_plan("plan.json", verbose=False)["applied"]) == 2
+        assert file_access_manager.query_log(OTHER_UID, action="apply", verbose=False)[-1]["message"].startswith(
+            f"removed unrecorded permissions from {OTHER_UID}"
+        )
+        assert acl._get_acl(file) == {UID: "rwx"}
+
+        # removing an unrecorded entry keeps recorded access within the location
+        nested = join(location, "nested")
+        makedirs(nested)
+        access.upsert(OTHER_UID, OTHER_UID, nested, "rx", 0)
+        access.flush()
+        acl._modify_acl(location, [f"u:{OTHER_UID}:rx"], recursive=True)
+        plan = file_access_manager.plan_access(verbose=False)
+        assert plan["remove"] == [{"location": location, "user": OTHER_UID, "current": "r-x"}]
+        assert not file_access_manager.apply_plan(plan, verbose=False)["failed"]
+        assert acl._get_acl(file) == {UID: "rwx"}
+        assert acl._get_acl(nested) == {OTHER_UID: "r-x"}
+        assert not any(file_access_manager.plan_access(verbose=False).values())
+        chdir(initial_dir)
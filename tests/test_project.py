@@ -8,6 +8,7 @@ from shutil import rmtree, which
 from tempfile import TemporaryDirectory
 
 import pandas
+import pytest
 
 import file_access_manager
 
@@ -15,10 +16,12 @@ CLI_PATH = which("manage-access")
 USERADD_PATH = which("useradd")
 DELUSER_PATH = which("deluser")
 GETFACL_PATH = which("getfacl")
+GIT_PATH = which("git")
 
 LOCATION = "location_name"
 USER = "test_user"
 GROUP = "test_group"
+MISSING_USER = "file_access_manager_missing_user"
 
 IS_LINUX = system() == "Linux"
 
@@ -38,10 +41,11 @@ def test_functions():
                 ".git",
                 ".gitignore",
                 ".allowed_directories",
+                ".locks",
                 "access.csv",
                 "config.json",
                 "locations.json",
-                "log.txt",
+                "log.jsonl",
                 "pending_access.csv",
                 "README.md",
             ]
@@ -122,10 +126,11 @@ def test_cli():
             [
                 ".git",
                 ".gitignore",
+                ".locks",
                 "access.csv",
                 "config.json",
                 "locations.json",
-                "log.txt",
+                "log.jsonl",
                 "pending_access.csv",
                 "README.md",
             ]
@@ -181,3 +186,88 @@ def test_cli():
             assert json.load(opened)["defer"]
 
         chdir(initial_dir)
+
+
+def test_batch():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        project_dir = temp + "/access/"
+        file_access_manager.init_manager_project(project_dir)
+        chdir(project_dir)
+        test_dir = temp + "/dir_to_access"
+        makedirs(test_dir)
+        file_access_manager.add_location(LOCATION, test_dir)
+        commits = subprocess.run([GIT_PATH, "rev-list", "--count", "HEAD"], check=False, capture_output=True).stdout
+        with open("grants.jsonl", "w", encoding="utf-8") as opened:
+            opened.write(json.dumps({"location": LOCATION, "user": MISSING_USER, "group": GROUP}) + "\n")
+            opened.write(json.dumps({"location": test_dir, "user": MISSING_USER + "2", "permissions": "rwx"}) + "\n")
+        result = file_access_manager.set_permissions_batch("grants.jsonl")
+        assert len(result["pending"]) == 2
+        pending = pandas.read_csv("pending_access.csv")
+        assert pending["user"].to_list() == [MISSING_USER, MISSING_USER + "2"]
+        assert pending["permissions"].to_list() == ["rx", "rwx"]
+        assert (
+            int(subprocess.run([GIT_PATH, "rev-list", "--count", "HEAD"], check=False, capture_output=True).stdout)
+            == int(commits) + 1
+        )
+        chdir(initial_dir)
+
+
+def test_git_session():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        project_dir = temp + "/access/"
+        file_access_manager.init_manager_project(project_dir)
+        chdir(project_dir)
+        test_dir = temp + "/dir_to_access"
+        makedirs(test_dir)
+        file_access_manager.add_location(LOCATION, test_dir)
+        Path("notes.txt").touch()
+        commits = _count_commits()
+        with file_access_manager.git_session():
+            file_access_manager.set_permission(LOCATION, USER + "2")
+            file_access_manager.set_permission(LOCATION, USER + "3")
+            file_access_manager.set_options(missing_user_ttl=60)
+        assert _count_commits() == commits + 1
+        assert not subprocess.run([GIT_PATH, "ls-files", "notes.txt"], check=False, capture_output=True).stdout
+        assert not subprocess.run(
+            [GIT_PATH, "status", "--porcelain", "--", "*.csv"], check=False, capture_output=True
+        ).stdout
+
+        # changes are rolled back on failure
+        pending = Path("pending_access.csv").read_text()
+        with pytest.raises(RuntimeError), file_access_manager.git_session():
+            file_access_manager.set_permission(LOCATION, USER + "4")
+            file_access_manager.revoke_permissions(USER + "5")
+            file_access_manager.set_permission("not_a_location", USER)
+        assert Path("pending_access.csv").read_text() == pending
+        assert _count_commits() == commits + 1
+        chdir(initial_dir)
+
+
+def test_project_context():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(temp + "/access", allow_dirs=[temp + "/data/set"], auto_commit=False)
+        project = file_access_manager.Project(temp + "/access")
+        makedirs(temp + "/data/set/a")
+
+        # functions run within the project, from anywhere
+        file_access_manager.add_location(LOCATION, temp + "/data/set/a", project=project)
+        assert getcwd() == initial_dir
+        assert project.locations == {LOCATION: temp + "/data/set/a"}
+        file_access_manager.set_options(workers=2, project=project)
+        assert project.config["workers"] == 2
+
+        # allowed directories are matched by path component, rather than by prefix
+        assert project.allows(temp + "/data/set/a")
+        assert not project.allows(temp + "/data/set2")
+
+        # changes made outside of the package are picked up
+        with project:
+            Path("config.json").write_text(json.dumps({"workers": 3, "note": "changed"}))
+        assert project.config["workers"] == 3
+
+
+def _count_commits():
+    return int(subprocess.run([GIT_PATH, "rev-list", "--count", "HEAD"], check=False, capture_output=True).stdout)
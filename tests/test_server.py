@@ -0,0 +1,47 @@
+import threading
+from os import chdir, getcwd, makedirs, stat
+from os.path import exists
+from tempfile import TemporaryDirectory
+from time import sleep
+
+import file_access_manager
+from file_access_manager.project import PENDING_FILE, SOCKET_FILE
+from file_access_manager.server import _forward, _send
+from file_access_manager.store import AccessStore
+
+USER = "file_access_manager_missing_user"
+
+
+def test_server():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        project_dir = temp + "/access/"
+        file_access_manager.init_manager_project(project_dir)
+        chdir(project_dir)
+        makedirs(temp + "/location")
+        assert _forward([("grant", {"location": temp + "/location", "user": USER})]) is None
+        server = threading.Thread(target=file_access_manager.serve, daemon=True)
+        server.start()
+        for _ in range(100):
+            if exists(SOCKET_FILE):
+                break
+            sleep(0.05)
+        try:
+            assert stat(SOCKET_FILE).st_mode & 0o777 == 0o600
+            response = _forward([("grant", {"location": temp + "/location", "user": USER})])
+            assert response["error"] is None
+            assert [record.user for record in AccessStore(PENDING_FILE)] == [USER]
+            response = _forward([("check", {"pull": False, "reapply": False, "verbose": False})])
+            assert [record["user"] for record in response["results"][0][1]] == [USER]
+
+            # errors are returned, and leave the server running
+            response = _forward([("revoke", {"user": USER}), ("grant", {"location": "not_a_location", "user": USER})])
+            assert "does not exist" in response["error"]
+            assert len(AccessStore(PENDING_FILE)) == 1
+        finally:
+            stopped = _send(SOCKET_FILE, {"stop": True})
+            server.join(5)
+            chdir(initial_dir)
+        assert stopped["output"] == "stopped server\n"
+        assert not server.is_alive()
+        assert not exists(project_dir + SOCKET_FILE)
@@ -0,0 +1,15 @@
+import subprocess
+import sys
+
+
+def test_cli_avoids_pandas():
+    res = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; import file_access_manager.cli, file_access_manager.access; print('pandas' in sys.modules)",
+        ],
+        check=False,
+        capture_output=True,
+    )
+    assert res.stdout.decode("utf-8").strip() == "False"
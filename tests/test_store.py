@@ -0,0 +1,73 @@
+import sqlite3
+from os import chdir, getcwd
+from tempfile import TemporaryDirectory
+
+import pandas
+
+import file_access_manager
+from file_access_manager.project import PENDING_FILE
+from file_access_manager.store import AccessStore, SQLiteAccessStore
+
+
+def test_store():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(temp)
+        chdir(temp)
+        access = AccessStore()
+        assert access.upsert("user2", "user2", "/data/b", "rx", 1)
+        assert access.upsert("user1", "user1", "/data/a", "rx", 1)
+        assert not access.upsert("user1", "user1", "/data/a", "rx", 1)
+        assert access.upsert("user1", "user1", "/data/a", "rwx", 1)
+        assert [record.user for record in access.select(location="/data/a")] == ["user1"]
+        assert not access.delete("user3", "user3", "/data/a")
+        access.flush()
+        assert not access.changed
+        written = pandas.read_csv("access.csv")
+        assert written["user"].to_list() == ["user1", "user2"]
+        assert written["permissions"].to_list() == ["rwx", "rx"]
+
+        pending = AccessStore(PENDING_FILE)
+        pending.upsert("user1", "user1", "", "", 0)
+        pending.flush()
+        reloaded = AccessStore(PENDING_FILE)
+        assert reloaded.get("user1", "user1", "").permissions == ""
+        assert reloaded.delete("user1", "user1", "")
+        chdir(initial_dir)
+
+
+def test_sqlite_store(monkeypatch):
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(temp)
+        chdir(temp)
+        access = SQLiteAccessStore()
+        assert access.upsert("user2", "user2", "/data/b", "rx", 1)
+        assert access.upsert("user1", "user1", "/data/a", "rx", 1)
+        assert not access.upsert("user1", "user1", "/data/a", "rx", 1)
+        assert access.upsert("user1", "user1", "/data/b", "rwx", 0)
+        assert access.select_indexed(location="/data/b") == {
+            1: access.get("user1", "user1", "/data/b"),
+            2: access.get("user2", "user2", "/data/b"),
+        }
+        access.flush()
+        assert len(AccessStore()) == 3
+        written = pandas.read_csv("access.csv")
+        assert written["location"].to_list() == ["/data/a", "/data/b", "/data/b"]
+
+        # external changes to the file are picked up
+        csv_store = AccessStore()
+        csv_store.delete("user2", "user2", "/data/b")
+        csv_store.flush()
+        reloaded = SQLiteAccessStore()
+        assert reloaded.get("user2", "user2", "/data/b") is None
+        assert len(reloaded) == 2
+        assert reloaded.select_indexed() == AccessStore().select_indexed()
+
+        # versions of SQLite without window functions get the same positions
+        monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 24, 0))
+        assert reloaded.select_indexed() == AccessStore().select_indexed()
+        assert reloaded.select_indexed(location="/data/b") == AccessStore().select_indexed(location="/data/b")
+        reloaded.connection.close()
+        access.connection.close()
+        chdir(initial_dir)
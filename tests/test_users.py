@@ -0,0 +1,32 @@
+from os import chdir, getcwd
+from os.path import exists
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from file_access_manager import users
+
+MISSING_USER = "file_access_manager_missing_user"
+
+
+@pytest.mark.skipif(users.pwd is None, reason="user database is not available")
+def test_resolve_users(monkeypatch):
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        chdir(temp)
+        users._clear_cache()
+        existing = users.pwd.getpwuid(0).pw_name
+        assert users._resolve_users([existing, MISSING_USER, existing], 60) == {existing: True, MISSING_USER: False}
+        assert exists(users.MISSING_USERS_FILE)
+
+        # missing users are not looked up again within the ttl
+        def fail_lookup(user):
+            raise AssertionError(user)
+
+        monkeypatch.setattr(users.pwd, "getpwnam", fail_lookup)
+        users._clear_cache()
+        users._UIDS[existing] = 0
+        assert not users._user_exists(MISSING_USER, 60)
+        monkeypatch.undo()
+        assert not users._user_exists(MISSING_USER)
+        chdir(initial_dir)
@@ -0,0 +1,57 @@
+import sys
+import threading
+from os import chdir, getcwd, makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import sleep
+
+import pytest
+
+import file_access_manager
+from file_access_manager import acl
+from file_access_manager.store import AccessStore
+from file_access_manager.watch import _watch
+
+USER = "daemon"
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux") or acl.ACL_BACKEND != "native", reason="inotify or native ACLs not available"
+)
+def test_watch():
+    with TemporaryDirectory() as temp:
+        initial_dir = getcwd()
+        file_access_manager.init_manager_project(join(temp, "project"), auto_commit=False)
+        chdir(join(temp, "project"))
+        location = join(temp, "data", "location")
+        makedirs(location)
+        access = AccessStore()
+        access.upsert(USER, USER, location, "rx", 1)
+        access.flush()
+        res = acl._modify_acl(location, [f"u:{USER}:rx"])
+        if res.returncode != 0:
+            chdir(initial_dir)
+            pytest.skip(res.stderr.decode("utf-8"))
+        stop = threading.Event()
+        watcher = threading.Thread(target=_watch, args=(0.1, 0, False, stop), daemon=True)
+        watcher.start()
+        try:
+            sleep(0.5)
+            with open(join(location, "file.txt"), "w", encoding="utf-8") as opened:
+                opened.write("")
+            makedirs(join(location, "new", "nested"))
+            with open(join(location, "new", "nested", "file.txt"), "w", encoding="utf-8") as opened:
+                opened.write("")
+            sleep(1)
+            assert acl._get_acl(join(location, "file.txt")) == {USER: "r-x"}
+            assert acl._get_acl(join(location, "new", "nested", "file.txt")) == {USER: "r-x"}
+
+            # files in new directories are seen
+            with open(join(location, "new", "nested", "later.txt"), "w", encoding="utf-8") as opened:
+                opened.write("")
+            sleep(1)
+            assert acl._get_acl(join(location, "new", "nested", "later.txt")) == {USER: "r-x"}
+        finally:
+            stop.set()
+            watcher.join()
+            chdir(initial_dir)